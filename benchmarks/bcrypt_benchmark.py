@@ -0,0 +1,75 @@
+"""
+Password hashing benchmark: logins per second and login latency at each bcrypt cost
+
+Usage:
+    python benchmarks/bcrypt_benchmark.py [--rounds 10,11,12,13] [--logins 200]
+                                          [--concurrency 16] [--workers N]
+
+Simulates --concurrency request threads verifying --logins passwords at each cost:
+  - inline: bcrypt.checkpw on the request thread (every request thread can burn a core)
+  - hasher: PasswordHasher with --workers threads (default: half the CPU cores, as in
+    the app); other requests keep the remaining cores
+Pick security.bcrypt_rounds from the logins/s a deployment must sustain at peak.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from dependencies.password_hasher import PasswordHasher  # noqa: E402
+
+PASSWORD = 'correct horse battery staple'
+
+
+def measure(verify, logins: int, concurrency: int):
+    """(logins per second, p50 and p95 latency in ms) of verifying `logins` passwords"""
+    def login(_):
+        started = time.perf_counter()
+        if not verify():
+            raise RuntimeError('Password did not verify')
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as request_threads:
+        latencies = sorted(request_threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return logins / elapsed, statistics.median(latencies) * 1000, p95 * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', default='10,11,12,13', help='Comma-separated bcrypt costs')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous login requests')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.concurrency} concurrent logins, {args.workers} hasher workers")
+    print(f"{'rounds':>6} {'mode':>7} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+
+    for rounds in [int(value) for value in args.rounds.split(',')]:
+        hasher = PasswordHasher(rounds, args.workers, max_pending=args.concurrency, wait_timeout_seconds=600)
+        password_hash = hasher.hash(PASSWORD)
+        encoded_password, encoded_hash = PASSWORD.encode('utf-8'), password_hash.encode('utf-8')
+
+        modes = {
+            'inline': lambda: bcrypt.checkpw(encoded_password, encoded_hash),
+            'hasher': lambda: hasher.verify(PASSWORD, password_hash)
+        }
+        for mode, verify in modes.items():
+            rate, p50, p95 = measure(verify, args.logins, args.concurrency)
+            print(f"{rounds:>6} {mode:>7} {rate:>9.1f} {p50:>8.1f} {p95:>8.1f}")
+
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
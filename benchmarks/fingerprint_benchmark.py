@@ -0,0 +1,216 @@
+"""
+Fingerprint benchmark: throughput, index size per hour of audio and match scores
+
+Usage:
+    python benchmarks/fingerprint_benchmark.py [file.wav ...] [--tracks 20] [--seconds 180]
+                                               [--fan-out 5] [--database-url postgresql://...]
+
+Without files, synthetic tracks (random note sequences with harmonics) are used.
+Throughput covers WAV parsing, mono mix, resampling and fingerprinting, as in the
+worker (storage reads and ffmpeg decoding excluded). Every track is also "re-encoded"
+(band-limited to 8 kHz, resampled to 48 kHz, attenuated and trimmed by 0.7 s) to show
+the score of a near duplicate next to the best score against unrelated tracks.
+
+With --database-url, the landmarks are inserted into a scratch schema to measure the
+on-disk size of the audio_fingerprints table and its indexes per hour of audio, and
+the lookup latency of each near duplicate (the schema is dropped afterwards).
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import wave
+from collections import Counter, defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from dependencies.fingerprint import HOP_SIZE, SAMPLE_RATE, fingerprint  # noqa: E402
+from dependencies.preview import read_clip, resample  # noqa: E402
+from dependencies.waveform import iter_wav_blocks  # noqa: E402
+
+QUERY_SECONDS = 60
+
+
+def synthetic_track(seed: int, seconds: int, rate: int = 44100) -> np.ndarray:
+    """Quarter-second notes with a few decaying harmonics, plus a little noise"""
+    rng = np.random.default_rng(seed)
+    note_frames = rate // 4
+    envelope = np.exp(-np.arange(note_frames) / rate * 6)
+    t = np.arange(note_frames) / rate
+
+    notes = []
+    for _ in range(seconds * 4):
+        frequency = 110 * 2 ** (rng.integers(0, 36) / 12)
+        notes.append(sum(np.sin(2 * np.pi * frequency * n * t) / n for n in (1, 2, 3, 5)) * envelope)
+
+    signal = np.concatenate(notes) + rng.normal(0, 0.02, seconds * rate)
+    return (0.9 * signal / np.abs(signal).max()).astype(np.float32)
+
+
+def encode_wav(samples: np.ndarray, rate: int, channels: int = 2) -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        pcm = np.repeat(samples[:, None], channels, axis=1)
+        wav_file.writeframes((np.clip(pcm, -1, 1) * 32767).astype('<i2').tobytes())
+    return output.getvalue()
+
+
+def reencode(samples: np.ndarray, rate: int) -> bytes:
+    """A stand-in for a lossy re-encode: band-limited, resampled, quieter and trimmed"""
+    limited = resample(resample(samples, rate, 16000), 16000, 48000)
+    return encode_wav(0.8 * limited[int(0.7 * 48000):], 48000, channels=1)
+
+
+def fingerprint_wav(data: bytes, fan_out: int, max_seconds: float = 600):
+    rate, blocks = iter_wav_blocks(io.BytesIO(data), 65536)
+    samples = resample(read_clip(blocks, rate, 0, max_seconds), rate, SAMPLE_RATE)
+    return len(samples) / SAMPLE_RATE, fingerprint(samples, fan_out)
+
+
+def best_match(index, hashes, offsets, exclude=None):
+    """(track, time-aligned matches) of the best match in an in-memory inverted index"""
+    selected = offsets < QUERY_SECONDS * SAMPLE_RATE / HOP_SIZE
+    votes = Counter()
+    for landmark_hash, offset in zip(hashes[selected].tolist(), offsets[selected].tolist()):
+        for track, indexed_offset in index.get(landmark_hash, ()):
+            if track != exclude:
+                votes[track, indexed_offset - offset] += 1
+    if not votes:
+        return None, 0, int(selected.sum())
+    (track, _), matches = votes.most_common(1)[0]
+    return track, matches, int(selected.sum())
+
+
+def measure_database(url: str, fingerprints, queries) -> None:
+    from sqlalchemy import Column, Integer, MetaData, String, Table, bindparam, create_engine, desc, func, select, text
+    from sqlalchemy.dialects.postgresql import ARRAY
+
+    engine = create_engine(url)
+    metadata = MetaData(schema='fingerprint_benchmark')
+    table = Table(
+        'audio_fingerprints', metadata,
+        Column('hash', Integer, primary_key=True, autoincrement=False),
+        Column('content_hash', String(64), primary_key=True, index=True),
+        Column('time_offset', Integer, primary_key=True, autoincrement=False)
+    )
+
+    def landmarks(hashes, offsets):
+        return func.unnest(
+            bindparam('hashes', hashes.tolist(), type_=ARRAY(Integer)),
+            bindparam('offsets', offsets.tolist(), type_=ARRAY(Integer))
+        ).table_valued('hash', 'time_offset').render_derived(name='landmarks')
+
+    with engine.begin() as connection:
+        connection.execute(text('DROP SCHEMA IF EXISTS fingerprint_benchmark CASCADE'))
+        connection.execute(text('CREATE SCHEMA fingerprint_benchmark'))
+        metadata.create_all(connection)
+
+    try:
+        seconds = 0.0
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            for name, (duration, (hashes, offsets)) in fingerprints.items():
+                seconds += duration
+                rows = landmarks(hashes, offsets)
+                connection.execute(
+                    table.insert().from_select(['hash', 'time_offset', 'content_hash'],
+                                               select(rows.c.hash, rows.c.time_offset, bindparam('name', name)))
+                )
+        insert_seconds = time.perf_counter() - started
+
+        with engine.begin() as connection:
+            connection.execute(text('ANALYZE fingerprint_benchmark.audio_fingerprints'))
+            size = connection.execute(
+                text("SELECT pg_total_relation_size('fingerprint_benchmark.audio_fingerprints')")
+            ).scalar()
+
+            timings = []
+            for hashes, offsets in queries:
+                selected = offsets < QUERY_SECONDS * SAMPLE_RATE / HOP_SIZE
+                rows = landmarks(hashes[selected], offsets[selected])
+                started = time.perf_counter()
+                connection.execute(
+                    select(table.c.content_hash, func.count().label('matches'))
+                    .select_from(rows)
+                    .join(table, table.c.hash == rows.c.hash)
+                    .group_by(table.c.content_hash, table.c.time_offset - rows.c.time_offset)
+                    .order_by(desc('matches'))
+                    .limit(1)
+                ).first()
+                timings.append(time.perf_counter() - started)
+
+        hours = seconds / 3600
+        print(f"postgres: table + indexes {size / 1024 / 1024:.1f} MB = {size / 1024 / 1024 / hours:.1f} MB per hour "
+              f"of audio; insert {seconds / insert_seconds:.0f}x realtime; lookup "
+              f"median {1000 * np.median(timings):.1f} ms, max {1000 * max(timings):.1f} ms")
+
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text('DROP SCHEMA IF EXISTS fingerprint_benchmark CASCADE'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help='WAV files to index (default: synthetic tracks)')
+    parser.add_argument('--tracks', type=int, default=20, help='Synthetic tracks to generate')
+    parser.add_argument('--seconds', type=int, default=180, help='Length of each synthetic track')
+    parser.add_argument('--fan-out', type=int, default=5)
+    parser.add_argument('--database-url', help='Postgres URL to measure the on-disk index (uses a scratch schema)')
+    args = parser.parse_args()
+
+    if args.files:
+        tracks = {}
+        for path in args.files:
+            data = open(path, 'rb').read()
+            rate, blocks = iter_wav_blocks(io.BytesIO(data), 65536)
+            tracks[os.path.basename(path)] = (data, read_clip(blocks, rate, 0, 600), rate)
+    else:
+        tracks = {}
+        for seed in range(args.tracks):
+            samples = synthetic_track(seed, args.seconds)
+            tracks[f'synthetic-{seed}'] = (encode_wav(samples, 44100), samples, 44100)
+
+    fingerprints = {}
+    started = time.perf_counter()
+    for name, (data, _, _) in tracks.items():
+        fingerprints[name] = fingerprint_wav(data, args.fan_out)
+    elapsed = time.perf_counter() - started
+
+    seconds = sum(duration for duration, _ in fingerprints.values())
+    landmark_count = sum(len(hashes) for _, (hashes, _) in fingerprints.values())
+    print(f"{len(tracks)} track(s), {seconds / 60:.1f} min of audio: {len(tracks) / elapsed:.2f} files/s, "
+          f"{seconds / elapsed:.0f}x realtime, {landmark_count / seconds:.1f} landmarks/s "
+          f"({landmark_count / seconds * 3600 / 1e6:.2f} M per hour of audio)")
+
+    index = defaultdict(list)
+    for name, (_, (hashes, offsets)) in fingerprints.items():
+        for landmark_hash, offset in zip(hashes.tolist(), offsets.tolist()):
+            index[landmark_hash].append((name, offset))
+
+    near_scores, other_scores, found, queries = [], [], 0, []
+    for name, (_, samples, rate) in tracks.items():
+        _, (hashes, offsets) = fingerprint_wav(reencode(samples, rate), args.fan_out)
+        queries.append((hashes, offsets))
+
+        track, matches, looked_up = best_match(index, hashes, offsets)
+        found += track == name
+        near_scores.append(matches / max(looked_up, 1))
+
+        _, matches, looked_up = best_match(index, hashes, offsets, exclude=name)
+        other_scores.append(matches / max(looked_up, 1))
+
+    print(f"near duplicates found {found}/{len(tracks)}; score median {np.median(near_scores):.3f}, "
+          f"min {min(near_scores):.3f}; best unrelated score max {max(other_scores):.3f}")
+
+    if args.database_url:
+        measure_database(args.database_url, fingerprints, queries)
+
+
+if __name__ == '__main__':
+    main()
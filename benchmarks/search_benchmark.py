@@ -0,0 +1,160 @@
+"""
+File name search benchmark: latency percentiles of the search query on a large table
+
+Usage:
+    python benchmarks/search_benchmark.py --database-url postgresql://... [--rows 10000000]
+                                          [--users 100000] [--large-users 10 --large-user-files 20000]
+                                          [--queries 2000] [--keep]
+
+Fills a scratch schema with an audio_files-shaped table (user_id, filename,
+original_filename) and the same (user_id, name) trigram GIN indexes as the app
+(pg_trgm and btree_gin must be available), then times the first page of
+AudioService.search_user_files-shaped queries for random users and search terms
+(whole words, word pairs and word fragments). Half of the queries go to the large
+users, whose libraries are the slow case. Loading 10M rows and building the indexes
+takes several minutes: --keep leaves the schema in place for the next run.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from sqlalchemy import (
+    Column, Integer, MetaData, String, Table, Index, create_engine, func, or_, select, text
+)
+
+WORDS = [
+    'beat', 'drum', 'loop', 'vocal', 'mix', 'final', 'master', 'demo', 'take', 'bass', 'guitar', 'piano',
+    'synth', 'intro', 'outro', 'verse', 'chorus', 'bridge', 'live', 'session', 'podcast', 'episode',
+    'interview', 'ambient', 'field', 'recording', 'rain', 'forest', 'city', 'street', 'kick', 'snare',
+    'hihat', 'pad', 'lead', 'stem', 'edit', 'radio', 'club', 'remix', 'acoustic', 'electric', 'version',
+    'draft', 'rough', 'memo', 'voice', 'lecture', 'meeting', 'call'
+]
+SCHEMA = 'search_benchmark'
+
+
+def build_table(metadata: MetaData) -> Table:
+    return Table(
+        'audio_files', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, nullable=False),
+        Column('filename', String(255), nullable=False),
+        Column('original_filename', String(255), nullable=False)
+    )
+
+
+def build_indexes(table: Table):
+    """The (user_id, name) trigram GIN indexes of AudioFile"""
+    return [
+        Index(f'ix_search_user_{column}_trgm', table.c.user_id, table.c[column],
+              postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+        for column in ('filename', 'original_filename')
+    ]
+
+
+def load(engine, table: Table, rows: int, users: int, large_users: int, large_user_files: int) -> None:
+    """Generate rows in SQL: large users first (ids 1..large_users), the rest spread over the other users"""
+    words = "(ARRAY[" + ", ".join(f"'{word}'" for word in WORDS) + "])"
+    name = (f"{words}[1 + floor(random() * {len(WORDS)})::int] || '_' || "
+            f"{words}[1 + floor(random() * {len(WORDS)})::int] || '_' || "
+            f"lpad(floor(random() * 1000)::text, 3, '0') || '.wav'")
+    large_rows = min(rows, large_users * large_user_files)
+
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+        table.create(connection)
+
+        started = time.perf_counter()
+        connection.execute(text(
+            f"INSERT INTO {SCHEMA}.audio_files (id, user_id, filename, original_filename) "
+            f"SELECT n, CASE WHEN n <= {large_rows} THEN 1 + (n - 1) % {max(large_users, 1)} "
+            f"ELSE {large_users} + 1 + floor(random() * {users})::int END, fn, fn "
+            f"FROM (SELECT n, {name} AS fn FROM generate_series(1, {rows}) n) generated"
+        ))
+        print(f"loaded {rows} rows in {time.perf_counter() - started:.0f} s")
+
+        # Indexes are built after loading, which is much faster than maintaining them
+        started = time.perf_counter()
+        for index in build_indexes(table):
+            index.create(connection)
+        connection.execute(text(f'ANALYZE {SCHEMA}.audio_files'))
+        print(f"built indexes in {time.perf_counter() - started:.0f} s")
+
+
+def search_statement(table: Table, user_id: int, query: str, limit: int):
+    """Same shape as AudioService.search_user_files (first page)"""
+    pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    score = func.greatest(func.similarity(table.c.filename, query),
+                          func.similarity(table.c.original_filename, query)).label('score')
+    return (
+        select(table, score)
+        .where(table.c.user_id == user_id,
+               or_(table.c.filename.ilike(pattern), table.c.original_filename.ilike(pattern)))
+        .order_by(score.desc(), table.c.id.desc())
+        .limit(limit + 1)
+    )
+
+
+def random_query(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.4:
+        return rng.choice(WORDS)
+    if kind < 0.7:
+        return f'{rng.choice(WORDS)}_{rng.choice(WORDS)}'
+    word = rng.choice([word for word in WORDS if len(word) >= 5])
+    start = rng.randrange(0, len(word) - 3)
+    return word[start:start + rng.randint(3, len(word) - start)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=100_000, help='Regular users sharing the remaining rows')
+    parser.add_argument('--large-users', type=int, default=10)
+    parser.add_argument('--large-user-files', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--keep', action='store_true', help='Reuse the scratch schema if loaded, and keep it')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    table = build_table(MetaData(schema=SCHEMA))
+
+    with engine.begin() as connection:
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gin'))
+        loaded = connection.execute(text(f"SELECT to_regclass('{SCHEMA}.audio_files')")).scalar()
+
+    if not (args.keep and loaded):
+        load(engine, table, args.rows, args.users, args.large_users, args.large_user_files)
+
+    try:
+        rng = random.Random(0)
+        timings, results = [], []
+        with engine.connect() as connection:
+            for i in range(args.queries):
+                large = args.large_users and i % 2 == 0
+                if large:
+                    user_id = rng.randint(1, args.large_users)
+                else:
+                    user_id = args.large_users + 1 + rng.randrange(args.users)
+                started = time.perf_counter()
+                rows = connection.execute(search_statement(table, user_id, random_query(rng), args.limit)).all()
+                timings.append(time.perf_counter() - started)
+                results.append(len(rows))
+
+        milliseconds = np.array(timings) * 1000
+        print(f"{args.queries} searches: p50 {np.percentile(milliseconds, 50):.1f} ms, "
+              f"p95 {np.percentile(milliseconds, 95):.1f} ms, p99 {np.percentile(milliseconds, 99):.1f} ms, "
+              f"max {milliseconds.max():.1f} ms; {np.mean(results):.1f} rows per page on average")
+
+    finally:
+        if not args.keep:
+            with engine.begin() as connection:
+                connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+
+
+if __name__ == '__main__':
+    main()
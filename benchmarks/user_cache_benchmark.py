@@ -0,0 +1,113 @@
+"""
+User cache benchmark: logged-in users loaded per second from Postgres vs. the user cache
+
+Usage:
+    python benchmarks/user_cache_benchmark.py --database-url postgresql://... [--users 10000]
+                                              [--requests 20000] [--mongo-url mongodb://...]
+
+Creates a users table with --users rows in a scratch schema (dropped afterwards) and
+loads random users the way Flask-Login does on every request (one app context per
+load, so each database load checks out a pooled connection and runs a query):
+  - database: AuthService.get_user_by_id, i.e. without the cache
+  - local cache: AuthService.load_user with a warm per-process LRU
+  - shared store: AuthService.load_user with no local entries, so every load reads the
+    shared store (the in-memory stand-in, or MongoDB with --mongo-url)
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.schema import CreateTable  # noqa: E402
+
+import dependencies.user_cache as user_cache_module  # noqa: E402
+from dependencies.database import db  # noqa: E402
+from dependencies.user_cache import MemoryStore, MongoStore, UserCache  # noqa: E402
+from dbentities.user import User, UserRole  # noqa: E402
+from services.auth_service import AuthService  # noqa: E402
+
+SCHEMA = 'user_cache_benchmark'
+
+
+def create_users(app: Flask, count: int) -> None:
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+            connection.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+            # Only the table and its primary key: lookups are by ID
+            User.__table__.c.role.type.create(connection, checkfirst=True)
+            connection.execute(CreateTable(User.__table__))
+            connection.execute(User.__table__.insert(), [
+                {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+                 'password_hash': 'x' * 60, 'role': UserRole.USER, 'full_name': f'User {user_id}'}
+                for user_id in range(1, count + 1)
+            ])
+
+
+def measure(app: Flask, load, user_ids) -> float:
+    """Loads per second"""
+    started = time.perf_counter()
+    for user_id in user_ids:
+        with app.app_context():
+            user = load(user_id)
+            user.username
+    return len(user_ids) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--mongo-url', help='Use MongoDB as the shared store (a scratch collection)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'options': f'-csearch_path={SCHEMA}'}}
+    db.init_app(app)
+
+    rng = random.Random(0)
+    user_ids = [rng.randint(1, args.users) for _ in range(args.requests)]
+    create_users(app, args.users)
+
+    mongo_collection = None
+    if args.mongo_url:
+        from pymongo import MongoClient
+        mongo_collection = MongoClient(args.mongo_url)['user_cache_benchmark']['user_cache']
+        shared_store, store_name = MongoStore(mongo_collection), 'MongoDB'
+    else:
+        shared_store, store_name = MemoryStore(), 'in-memory stand-in'
+
+    try:
+        results = {'database': measure(app, AuthService.get_user_by_id, user_ids)}
+
+        user_cache_module._user_cache = UserCache(max_entries=args.users, ttl_seconds=3600)
+        measure(app, AuthService.load_user, range(1, args.users + 1))
+        results['local cache'] = measure(app, AuthService.load_user, user_ids)
+
+        # Fill the shared store, then keep nothing locally
+        user_cache_module._user_cache = UserCache(args.users, 3600, shared_store, 3600)
+        measure(app, AuthService.load_user, range(1, args.users + 1))
+        user_cache_module._user_cache.max_entries = 0
+        results[f'shared store ({store_name})'] = measure(app, AuthService.load_user, user_ids)
+
+        for name, rate in results.items():
+            print(f"{name:>40}: {rate:10.0f} users/s ({rate / results['database']:.1f}x)")
+
+    finally:
+        user_cache_module._user_cache = None
+        if mongo_collection is not None:
+            mongo_collection.database.client.drop_database('user_cache_benchmark')
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+
+
+if __name__ == '__main__':
+    main()
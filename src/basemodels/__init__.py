@@ -1,9 +1,9 @@
 from .auth import LoginRequest, SignupRequest, AuthResponse
 from .user import UserResponse, UserCreateRequest, UserUpdateRequest
-from .audio import AudioFileResponse
+from .audio import AudioFileResponse, UploadByHashRequest, UploadSessionCreateRequest, BulkDeleteRequest
 
 __all__ = [
     'LoginRequest', 'SignupRequest', 'AuthResponse',
     'UserResponse', 'UserCreateRequest', 'UserUpdateRequest',
-    'AudioFileResponse'
+    'AudioFileResponse', 'UploadByHashRequest', 'UploadSessionCreateRequest', 'BulkDeleteRequest'
 ]
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -10,8 +11,49 @@ class AudioFileResponse(BaseModel):
     original_filename: str
     content_type: str
     file_size: int
+    content_hash: Optional[str] = None
+    duration_seconds: Optional[float] = None
+    bitrate: Optional[int] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class UploadByHashRequest(BaseModel):
+    """Upload-by-hash request model (create a file from content the user already has a file of)"""
+    sha256: str = Field(..., pattern="^[0-9a-f]{64}$")
+    file_size: int = Field(..., ge=0)
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: Optional[str] = Field(None, max_length=100)
+
+
+class BulkDeleteRequest(BaseModel):
+    """Bulk delete request model"""
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+
+class UploadSessionCreateRequest(BaseModel):
+    """Resumable upload session creation request model"""
+    filename: str = Field(..., min_length=1, max_length=255)
+    file_size: int = Field(..., gt=0)
+    content_type: Optional[str] = Field(None, max_length=100)
+
+
+class FileListQuery(BaseModel):
+    """File listing query parameters (keyset pagination: pass back next_cursor as cursor)"""
+    q: Optional[str] = Field(None, max_length=255)  # Name search: results are ranked instead of sorted
+    sort: Literal['date', 'name', 'size'] = 'date'
+    order: Literal['asc', 'desc'] = 'desc'
+    cursor: Optional[str] = Field(None, max_length=1024)
+    limit: int = Field(50, ge=1, le=200)
+
+
+class FileSearchQuery(BaseModel):
+    """File name search query parameters"""
+    q: str = Field(..., min_length=1, max_length=255)
+    cursor: Optional[str] = Field(None, max_length=1024)
+    limit: int = Field(50, ge=1, le=200)
@@ -26,6 +26,13 @@ class UserCreateRequest(BaseModel):
     role: str = Field(default="USER", pattern="^(ADMIN|USER)$")
 
 
+class UserListQuery(BaseModel):
+    """Admin user listing query parameters (keyset pagination: pass back next_cursor as cursor)"""
+    q: Optional[str] = Field(None, max_length=120)  # Substring of the username or email
+    cursor: Optional[str] = Field(None, max_length=1024)
+    limit: int = Field(50, ge=1, le=200)
+
+
 class UserUpdateRequest(BaseModel):
     """User update request model"""
     email: Optional[EmailStr] = None
@@ -0,0 +1,27 @@
+from .upload_sessions import sweep_upload_sessions_command
+from .storage import migrate_storage_command
+from .blob_purge import purge_blobs_command
+from .reconcile import reconcile_storage_command
+from .audio_metadata import backfill_audio_metadata_command
+from .waveform import generate_peaks_command
+from .preview import generate_previews_command
+from .fingerprint import fingerprint_audio_command
+from .usage import repair_usage_command
+from .workers import run_workers_command, start_background_workers
+
+
+def register_commands(app) -> None:
+    """Register maintenance commands with the Flask CLI (flask --app src/main.py <command>)"""
+    app.cli.add_command(sweep_upload_sessions_command)
+    app.cli.add_command(migrate_storage_command)
+    app.cli.add_command(purge_blobs_command)
+    app.cli.add_command(reconcile_storage_command)
+    app.cli.add_command(backfill_audio_metadata_command)
+    app.cli.add_command(generate_peaks_command)
+    app.cli.add_command(generate_previews_command)
+    app.cli.add_command(fingerprint_audio_command)
+    app.cli.add_command(repair_usage_command)
+    app.cli.add_command(run_workers_command)
+
+
+__all__ = ['register_commands', 'start_background_workers']
@@ -0,0 +1,20 @@
+import click
+from flask.cli import with_appcontext
+
+from services.audio_metadata_service import AudioMetadataService
+
+
+@click.command('backfill-audio-metadata')
+@click.option('--batch-size', default=500, show_default=True, help='Blobs probed per batch (one commit each)')
+@click.option('--workers', default=8, show_default=True, help='Blobs probed in parallel')
+@click.option('--force', is_flag=True, help='Re-read metadata for all files, not only those missing it')
+@with_appcontext
+def backfill_audio_metadata_command(batch_size, workers, force):
+    """Fill duration, bitrate, sample rate and channels of existing files from their headers"""
+
+    def report(counts):
+        click.echo(f"{counts['blobs']} blob(s) probed, {counts['files']} file(s) updated...")
+
+    counts = AudioMetadataService.backfill(batch_size=batch_size, workers=workers, force=force, on_progress=report)
+    click.echo(f"Done: {counts['files']} file(s) updated from {counts['blobs']} blob(s), "
+               f"{counts['unknown']} blob(s) without readable metadata")
@@ -0,0 +1,23 @@
+import click
+from flask.cli import with_appcontext
+
+from dependencies.app_config import get_config
+from services.blob_purge_service import BlobPurgeService
+
+
+@click.command('purge-blobs')
+@click.option('--batch-size', default=None, type=int,
+              help='Blobs deleted per batch (default: storage.purge.batch_size)')
+@click.option('--interval', default=None, type=float,
+              help='Seconds to sleep when the queue is empty (default: storage.purge.interval_seconds)')
+@click.option('--once', is_flag=True, help='Exit once nothing is due instead of polling')
+@with_appcontext
+def purge_blobs_command(batch_size, interval, once):
+    """Delete queued blobs from storage (the deferred half of file deletes)"""
+    config = get_config()
+    batch_size = batch_size or config.get('storage.purge.batch_size', 100)
+    interval = interval or config.get('storage.purge.interval_seconds', 10)
+
+    totals = BlobPurgeService.run_worker(batch_size, interval, once=once)
+    click.echo(f"Purged {totals['purged']} blob(s), skipped {totals['skipped']} referenced again, "
+               f"{totals['failed']} failed (will be retried)")
@@ -0,0 +1,27 @@
+import click
+from flask.cli import with_appcontext
+
+from dependencies.app_config import get_config
+from services.fingerprint_service import FingerprintService
+
+
+@click.command('fingerprint-audio')
+@click.option('--batch-size', default=None, type=int,
+              help='Blobs fingerprinted per batch (default: fingerprint.batch_size)')
+@click.option('--interval', default=None, type=float,
+              help='Seconds to sleep when the queue is empty (default: fingerprint.interval_seconds)')
+@click.option('--once', is_flag=True, help='Exit once nothing is due instead of polling')
+@click.option('--backfill', is_flag=True, help='First queue every stored blob that has not been fingerprinted')
+@with_appcontext
+def fingerprint_audio_command(batch_size, interval, once, backfill):
+    """Fingerprint queued audio and link near duplicates (same recording, other encoding)"""
+    config = get_config()
+    batch_size = batch_size or config.get('fingerprint.batch_size', 5)
+    interval = interval or config.get('fingerprint.interval_seconds', 10)
+
+    if backfill:
+        click.echo(f"Queued {FingerprintService.enqueue_missing()} blob(s) without a fingerprint")
+
+    totals = FingerprintService.run_worker(batch_size, interval, once=once)
+    click.echo(f"Fingerprinted {totals['indexed']} blob(s) ({totals['near_duplicates']} near duplicate(s)), "
+               f"{totals['skipped']} skipped, {totals['failed']} failed (will be retried)")
@@ -0,0 +1,26 @@
+import click
+from flask.cli import with_appcontext
+
+from dependencies.app_config import get_config
+from services.preview_service import PreviewService
+
+
+@click.command('generate-previews')
+@click.option('--batch-size', default=None, type=int, help='Previews generated per batch (default: preview.batch_size)')
+@click.option('--interval', default=None, type=float,
+              help='Seconds to sleep when the queue is empty (default: preview.interval_seconds)')
+@click.option('--once', is_flag=True, help='Exit once nothing is due instead of polling')
+@click.option('--backfill', is_flag=True, help='First queue every stored blob that has no preview yet')
+@with_appcontext
+def generate_previews_command(batch_size, interval, once, backfill):
+    """Generate queued preview renditions (low-bitrate clips served with ?quality=preview)"""
+    config = get_config()
+    batch_size = batch_size or config.get('preview.batch_size', 5)
+    interval = interval or config.get('preview.interval_seconds', 10)
+
+    if backfill:
+        click.echo(f"Queued {PreviewService.enqueue_missing()} blob(s) without a preview")
+
+    totals = PreviewService.run_worker(batch_size, interval, once=once)
+    click.echo(f"Generated {totals['generated']} preview(s), {totals['skipped']} skipped, "
+               f"{totals['failed']} failed (will be retried)")
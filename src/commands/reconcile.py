@@ -0,0 +1,32 @@
+import click
+from flask.cli import with_appcontext
+
+from services.reconcile_service import ReconcileService
+
+
+@click.command('reconcile-storage')
+@click.option('--repair', is_flag=True, help='Queue orphaned blobs for purge and discard orphaned partial uploads')
+@click.option('--batch-size', default=1000, show_default=True, help='IDs fetched/repaired per batch')
+@click.option('--min-age-minutes', default=60, show_default=True,
+              help='Ignore storage objects younger than this (uploads still in flight)')
+@with_appcontext
+def reconcile_storage_command(repair, batch_size, min_age_minutes):
+    """Compare file metadata in Postgres with blob storage and report (or repair) orphans"""
+
+    def report_progress(report):
+        click.echo(f"{report['checked']} ID(s) checked...")
+
+    report = ReconcileService.reconcile(
+        repair=repair,
+        batch_size=batch_size,
+        min_age_minutes=min_age_minutes,
+        on_progress=report_progress
+    )
+
+    click.echo(f"Checked {report['checked']} ID(s)")
+    for category, samples in report['samples'].items():
+        click.echo(f"  {category}: {report[category]}" + (f" (e.g. {', '.join(samples[:5])})" if samples else ''))
+
+    if repair:
+        click.echo(f"Queued {report['repaired_blobs']} blob(s) for purge, "
+                   f"discarded {report['repaired_parts']} partial upload(s)")
@@ -0,0 +1,23 @@
+import click
+from flask.cli import with_appcontext
+
+from services.storage_migration_service import StorageMigrationService
+
+
+@click.command('migrate-storage')
+@click.option('--source', default='gridfs', show_default=True, help='Backend to copy blobs from')
+@click.option('--target', default='local', show_default=True, help='Backend to copy blobs to')
+@click.option('--workers', default=8, show_default=True, help='Blobs copied in parallel')
+@with_appcontext
+def migrate_storage_command(source, target, workers):
+    """Copy all blobs to another storage backend, keeping their IDs (switch storage.backend afterwards)"""
+    reported = [0]
+
+    def report(counts):
+        total = sum(counts.values())
+        if total // 1000 > reported[0]:
+            reported[0] = total // 1000
+            click.echo(f"{total} blob(s) processed: {counts}")
+
+    counts = StorageMigrationService.migrate(source, target, workers=workers, on_progress=report)
+    click.echo(f"Done: {counts}")
@@ -0,0 +1,13 @@
+import click
+from flask.cli import with_appcontext
+
+from services.upload_session_service import UploadSessionService
+
+
+@click.command('sweep-upload-sessions')
+@click.option('--batch-size', default=500, show_default=True, help='Sessions removed per transaction')
+@with_appcontext
+def sweep_upload_sessions_command(batch_size):
+    """Delete expired resumable upload sessions and their partial GridFS chunks"""
+    swept = UploadSessionService.sweep_expired(batch_size=batch_size)
+    click.echo(f"Swept {swept} expired upload session(s)")
@@ -0,0 +1,11 @@
+import click
+from flask.cli import with_appcontext
+
+from services.usage_service import UsageService
+
+
+@click.command('repair-usage')
+@with_appcontext
+def repair_usage_command():
+    """Recompute every user's storage usage counters from their files"""
+    click.echo(f"Corrected the usage counters of {UsageService.recompute()} user(s)")
@@ -0,0 +1,27 @@
+import click
+from flask.cli import with_appcontext
+
+from dependencies.app_config import get_config
+from services.waveform_service import WaveformService
+
+
+@click.command('generate-peaks')
+@click.option('--batch-size', default=None, type=int, help='Blobs decoded per batch (default: waveform.batch_size)')
+@click.option('--interval', default=None, type=float,
+              help='Seconds to sleep when the queue is empty (default: waveform.interval_seconds)')
+@click.option('--once', is_flag=True, help='Exit once nothing is due instead of polling')
+@click.option('--backfill', is_flag=True,
+              help='First queue every stored blob that has no peaks yet (and retry given-up ones)')
+@with_appcontext
+def generate_peaks_command(batch_size, interval, once, backfill):
+    """Generate queued waveform peaks (run several to decode in parallel)"""
+    config = get_config()
+    batch_size = batch_size or config.get('waveform.batch_size', 2)
+    interval = interval or config.get('waveform.interval_seconds', 10)
+
+    if backfill:
+        click.echo(f"Queued {WaveformService.enqueue_missing()} blob(s) without peaks")
+
+    totals = WaveformService.run_worker(batch_size, interval, once=once)
+    click.echo(f"Generated {totals['generated']} peaks file(s), {totals['skipped']} skipped, "
+               f"{totals['unsupported']} not decodable, {totals['failed']} failed (will be retried)")
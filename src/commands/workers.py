@@ -0,0 +1,47 @@
+import threading
+from typing import List
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from dependencies.app_config import get_config
+from services.blob_purge_service import BlobPurgeService
+from services.preview_service import PreviewService
+from services.fingerprint_service import FingerprintService
+from services.waveform_service import WaveformService
+
+
+def start_background_workers(app) -> List[threading.Thread]:
+    """Start a daemon thread for every queue whose in_app_worker setting is on"""
+    config = get_config()
+    threads = []
+
+    # Delete queued blobs (or run `flask purge-blobs` as a separate worker)
+    if config.get('storage.purge.in_app_worker', True):
+        threads.append(BlobPurgeService.start_background_worker(app))
+
+    # Generate waveform peaks (or run `flask generate-peaks`)
+    if config.get('waveform.in_app_worker', True):
+        threads.append(WaveformService.start_background_worker(app))
+
+    # Generate preview renditions (or run `flask generate-previews`)
+    if config.get('preview.in_app_worker', True):
+        threads.append(PreviewService.start_background_worker(app))
+
+    # Fingerprint new content for near-duplicate detection (or run `flask fingerprint-audio`)
+    if config.get('fingerprint.in_app_worker', True):
+        threads.append(FingerprintService.start_background_worker(app))
+
+    return threads
+
+
+@click.command('run-workers')
+@with_appcontext
+def run_workers_command():
+    """Run the in_app_worker background workers in the foreground (when serving through `flask run` or WSGI)"""
+    threads = start_background_workers(current_app._get_current_object())
+    click.echo(f"Started {len(threads)} worker(s): {', '.join(thread.name for thread in threads)}")
+
+    for thread in threads:
+        thread.join()
@@ -1,4 +1,14 @@
 from .user import User
 from .audio_file import AudioFile
+from .audio_blob import AudioBlob
+from .upload_session import UploadSession
+from .blob_purge import BlobPurge
+from .preview_job import PreviewJob
+from .audio_fingerprint import AudioFingerprint
+from .fingerprint_job import FingerprintJob
+from .user_usage import UserUsage
+from .waveform_job import WaveformJob
+from .legacy_peaks import LegacyPeaks
 
-__all__ = ['User', 'AudioFile']
+__all__ = ['User', 'AudioFile', 'AudioBlob', 'UploadSession', 'BlobPurge', 'PreviewJob', 'AudioFingerprint',
+           'FingerprintJob', 'UserUsage', 'WaveformJob', 'LegacyPeaks']
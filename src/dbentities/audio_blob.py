@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Float
+from dependencies.database import db
+
+
+class AudioBlob(db.Model):
+    """Content-addressed GridFS blob shared by every AudioFile with the same SHA-256"""
+    __tablename__ = 'audio_blobs'
+
+    content_hash = Column(String(64), primary_key=True)  # Hex SHA-256 of the file content
+    gridfs_file_id = Column(String(24), nullable=False, unique=True)  # MongoDB GridFS file ID
+    file_size = Column(BigInteger, nullable=False)  # Size in bytes
+    ref_count = Column(Integer, nullable=False, default=1)  # Number of AudioFile rows using this blob
+    storage_codec = Column(String(16), nullable=True)  # Compression codec of the stored bytes (None: raw)
+    peaks_file_id = Column(String(24), nullable=True, unique=True)  # Waveform peaks blob, once generated
+    # Short low-bitrate rendition for previews, once generated (see PreviewService)
+    preview_file_id = Column(String(24), nullable=True, unique=True)
+    preview_size = Column(BigInteger, nullable=True)
+    preview_content_type = Column(String(100), nullable=True)
+    # Acoustic fingerprint (see FingerprintService): when it was indexed, and the earlier
+    # blob it most likely duplicates (same recording in another encoding), if any
+    fingerprinted_at = Column(DateTime, nullable=True)
+    near_duplicate_of = Column(String(64), nullable=True, index=True)
+    near_duplicate_score = Column(Float, nullable=True)  # Share of landmarks matching near_duplicate_of
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<AudioBlob {self.content_hash} refs={self.ref_count}>'
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, ForeignKey, BigInteger, Float, Index
 from sqlalchemy.orm import relationship
 from dependencies.database import db
 
@@ -7,14 +7,34 @@ from dependencies.database import db
 class AudioFile(db.Model):
     """Audio file metadata model (actual file stored in MongoDB GridFS)"""
     __tablename__ = 'audio_files'
+    # Keyset pagination of a user's files by each sort key (see AudioService.list_user_files);
+    # user_id leads every index, so they also serve plain per-user lookups
+    __table_args__ = (
+        Index('ix_audio_files_user_created', 'user_id', 'created_at', 'id'),
+        Index('ix_audio_files_user_filename', 'user_id', 'filename', 'id'),
+        Index('ix_audio_files_user_size', 'user_id', 'file_size', 'id'),
+        # Name search (see AudioService.search_user_files): trigram GIN indexes, with user_id
+        # in the same index (btree_gin) so a search only visits the user's own entries
+        Index('ix_audio_files_user_filename_trgm', 'user_id', 'filename',
+              postgresql_using='gin', postgresql_ops={'filename': 'gin_trgm_ops'}),
+        Index('ix_audio_files_user_original_filename_trgm', 'user_id', 'original_filename',
+              postgresql_using='gin', postgresql_ops={'original_filename': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     filename = Column(String(255), nullable=False)
     original_filename = Column(String(255), nullable=False)
     content_type = Column(String(100), nullable=False)
     file_size = Column(BigInteger, nullable=False)  # Size in bytes
-    gridfs_file_id = Column(String(24), nullable=False, unique=True)  # MongoDB GridFS file ID
+    gridfs_file_id = Column(String(24), nullable=False, index=True)  # MongoDB GridFS file ID (may be shared)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the content, see AudioBlob
+    storage_codec = Column(String(16), nullable=True)  # Copy of AudioBlob.storage_codec (None: raw)
+    # Read from the file headers (see dependencies.audio_metadata); None if unknown or not yet extracted
+    duration_seconds = Column(Float, nullable=True, index=True)
+    bitrate = Column(Integer, nullable=True, index=True)  # Average bits per second
+    sample_rate = Column(Integer, nullable=True, index=True)
+    channels = Column(SmallInteger, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -34,6 +54,11 @@ class AudioFile(db.Model):
             'content_type': self.content_type,
             'file_size': self.file_size,
             'gridfs_file_id': self.gridfs_file_id,
+            'content_hash': self.content_hash,
+            'duration_seconds': self.duration_seconds,
+            'bitrate': self.bitrate,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String
+from dependencies.database import db
+
+
+class AudioFingerprint(db.Model):
+    """
+    Inverted index of landmark hashes (see dependencies.fingerprint): one row per
+    (hash, blob, anchor frame), so the primary key finds every blob sharing a hash
+    """
+    __tablename__ = 'audio_fingerprints'
+
+    hash = Column(Integer, primary_key=True, autoincrement=False)
+    content_hash = Column(String(64), primary_key=True, index=True)  # AudioBlob the landmark belongs to
+    time_offset = Column(Integer, primary_key=True, autoincrement=False)  # Anchor frame
+
+    def __repr__(self):
+        return f'<AudioFingerprint {self.hash} {self.content_hash}@{self.time_offset}>'
@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Text
+from dependencies.database import db
+
+
+class BlobPurge(db.Model):
+    """Stored blob waiting to be deleted by the purge worker (durable deletion queue)"""
+    __tablename__ = 'blob_purge_queue'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    gridfs_file_id = Column(String(24), nullable=False, unique=True)  # Blob to delete from storage
+    attempts = Column(Integer, nullable=False, default=0)  # Failed delete attempts so far
+    last_error = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<BlobPurge {self.gridfs_file_id} attempts={self.attempts}>'
@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from dependencies.database import db
+
+
+class FingerprintJob(db.Model):
+    """Audio blob waiting to be fingerprinted (durable work queue, see FingerprintService)"""
+    __tablename__ = 'fingerprint_jobs'
+
+    content_hash = Column(String(64), primary_key=True)  # AudioBlob to fingerprint
+    attempts = Column(Integer, nullable=False, default=0)  # Failed attempts so far
+    last_error = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<FingerprintJob {self.content_hash} attempts={self.attempts}>'
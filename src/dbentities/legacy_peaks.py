@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime
+from dependencies.database import db
+
+
+class LegacyPeaks(db.Model):
+    """Waveform peaks of a file stored before deduplication (it has no AudioBlob to hold peaks_file_id)"""
+    __tablename__ = 'legacy_peaks'
+
+    gridfs_file_id = Column(String(24), primary_key=True)  # The file's own audio blob
+    peaks_file_id = Column(String(24), nullable=False, unique=True)  # Waveform peaks blob
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<LegacyPeaks {self.gridfs_file_id}>'
@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from dependencies.database import db
+
+
+class UploadSession(db.Model):
+    """Resumable upload in progress (received chunks live in GridFS under gridfs_file_id)"""
+    __tablename__ = 'upload_sessions'
+
+    id = Column(String(32), primary_key=True)  # Random hex token used in the upload URL
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    file_size = Column(BigInteger, nullable=False)  # Declared total size in bytes
+    chunk_size = Column(Integer, nullable=False)  # GridFS chunk size the client must align to
+    offset = Column(BigInteger, nullable=False, default=0)  # Bytes durably received so far
+    gridfs_file_id = Column(String(24), nullable=False, unique=True)  # Pre-allocated GridFS file ID
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.offset}/{self.file_size}>'
+
+    def to_dict(self):
+        """Convert upload session object to dictionary"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'file_size': self.file_size,
+            'chunk_size': self.chunk_size,
+            'offset': self.offset,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask_login import UserMixin
-from sqlalchemy import Column, Integer, String, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Index, Enum as SQLEnum
 import enum
 
 
@@ -17,6 +17,13 @@ from dependencies.database import db
 class User(db.Model, UserMixin):
     """User database model"""
     __tablename__ = 'users'
+    # Substring search of the admin user listing (see UserService.list_users)
+    __table_args__ = (
+        Index('ix_users_username_trgm', 'username', postgresql_using='gin',
+              postgresql_ops={'username': 'gin_trgm_ops'}),
+        Index('ix_users_email_trgm', 'email', postgresql_using='gin',
+              postgresql_ops={'email': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String(80), unique=True, nullable=False, index=True)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, BigInteger, ForeignKey
+from dependencies.database import db
+
+
+class UserUsage(db.Model):
+    """Per-user storage counters, kept in step with audio_files by every write (see UsageService)"""
+    __tablename__ = 'user_usage'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    bytes_used = Column(BigInteger, nullable=False, default=0)  # Sum of the user's AudioFile.file_size
+    file_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<UserUsage user={self.user_id} bytes={self.bytes_used} files={self.file_count}>'
@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from dependencies.database import db
+
+
+class WaveformJob(db.Model):
+    """Audio blob waiting for its waveform peaks (durable work queue, see WaveformService)"""
+    __tablename__ = 'waveform_jobs'
+
+    # Blob to generate peaks for: an AudioBlob's, or the own blob of a file stored before deduplication
+    gridfs_file_id = Column(String(24), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)  # Failed attempts so far
+    last_error = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # None once given up (format not decodable here, or out of attempts), so views don't queue it again
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<WaveformJob {self.gridfs_file_id} attempts={self.attempts}>'
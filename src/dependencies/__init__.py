@@ -1,9 +1,13 @@
 from .app_config import load_config, get_config
 from .database import db, get_db_session, init_db, get_mongo_db, get_gridfs
-from .constants import ALLOWED_AUDIO_EXTENSIONS, MAX_FILE_SIZE_BYTES
+from .blob_cache import get_blob_cache
+from .storage import get_storage
+from .metrics import get_metrics
+from .constants import ALLOWED_AUDIO_EXTENSIONS, MAX_FILE_SIZE_BYTES, UPLOAD_CHUNK_SIZE_BYTES
 
 __all__ = [
     'load_config', 'get_config',
     'db', 'get_db_session', 'init_db', 'get_mongo_db', 'get_gridfs',
-    'ALLOWED_AUDIO_EXTENSIONS', 'MAX_FILE_SIZE_BYTES'
+    'get_blob_cache', 'get_metrics', 'get_storage',
+    'ALLOWED_AUDIO_EXTENSIONS', 'MAX_FILE_SIZE_BYTES', 'UPLOAD_CHUNK_SIZE_BYTES'
 ]
@@ -0,0 +1,432 @@
+import struct
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+
+# Bytes kept from the start and end of a file; enough for almost every header,
+# anything else (large ID3 tags, MP4 boxes mid-file) is fetched with range reads
+HEAD_SIZE = 64 * 1024
+TAIL_SIZE = 64 * 1024
+
+# Smallest range read issued for bytes outside the head/tail
+MIN_FETCH_SIZE = 16 * 1024
+
+# How far past the ID3 tag the first MP3 frame is searched for
+MP3_SYNC_SEARCH_SIZE = 16 * 1024
+
+
+class AudioMetadata(NamedTuple):
+    """Stream properties read from an audio file's headers (None where unknown)"""
+    duration_seconds: Optional[float] = None
+    bitrate: Optional[int] = None  # Average bits per second
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+
+    def to_columns(self):
+        """Values for the matching AudioFile columns"""
+        return self._asdict()
+
+
+class HeadTailCapture:
+    """
+    Pass-through reader that keeps the first HEAD_SIZE and last TAIL_SIZE bytes
+    of a stream, so an upload can be probed without reading it back from storage
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.length = 0
+
+    def feed(self, data: bytes) -> None:
+        if len(self.head) < HEAD_SIZE:
+            self.head += data[:HEAD_SIZE - len(self.head)]
+
+        if len(data) >= TAIL_SIZE:
+            self.tail[:] = data[-TAIL_SIZE:]
+        else:
+            self.tail += data
+            del self.tail[:-TAIL_SIZE]
+
+        self.length += len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.feed(data)
+        return data
+
+
+class RangeSource:
+    """
+    Random access to a file for the parsers: served from the head/tail when
+    possible, otherwise through read_range(start, stop) (counted in fetches)
+    """
+
+    def __init__(self, length: int, read_range: Callable[[int, int], bytes],
+                 head: bytes = b'', tail: bytes = b''):
+        self.length = length
+        self.read_range = read_range
+        self.fetches = 0
+
+        # Cached windows as (start, data): head, tail, and the last range fetched
+        self._head = (0, bytes(head))
+        self._tail = (length - len(tail), bytes(tail))
+        self._last = (0, b'')
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Up to size bytes at offset (fewer at the end of the file)"""
+        size = max(min(size, self.length - offset), 0)
+        if offset < 0 or size == 0:
+            return b''
+
+        for start, data in (self._head, self._tail, self._last):
+            if start <= offset and offset + size <= start + len(data):
+                return data[offset - start:offset - start + size]
+
+        self.fetches += 1
+        data = self.read_range(offset, min(offset + max(size, MIN_FETCH_SIZE), self.length))
+        self._last = (offset, data)
+        return data[:size]
+
+
+def _metadata(duration: Optional[float], bitrate: Optional[float], sample_rate: Optional[int],
+              channels: Optional[int]) -> AudioMetadata:
+    """Build AudioMetadata, discarding nonsense values"""
+    duration = round(duration, 3) if duration and duration > 0 else None
+    bitrate = int(round(bitrate)) if bitrate and bitrate > 0 else None
+    return AudioMetadata(duration, bitrate, sample_rate or None, channels or None)
+
+
+def _average_bitrate(audio_bytes: int, duration: Optional[float]) -> Optional[float]:
+    return audio_bytes * 8 / duration if duration else None
+
+
+def _id3v2_size(source: RangeSource, offset: int = 0) -> int:
+    """Size of an ID3v2 tag at offset (0 if there is none)"""
+    header = source.read(offset, 10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+
+    size = (header[6] & 0x7f) << 21 | (header[7] & 0x7f) << 14 | (header[8] & 0x7f) << 7 | (header[9] & 0x7f)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+# ---- WAV ----
+
+def parse_wav(source: RangeSource) -> AudioMetadata:
+    """RIFF/WAVE: fmt chunk for the format, data chunk size for the duration"""
+    offset = 12
+    byte_rate = sample_rate = channels = None
+
+    for _ in range(64):
+        header = source.read(offset, 8)
+        if len(header) < 8:
+            break
+
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+        if chunk_id == b'fmt ':
+            _, channels, sample_rate, byte_rate = struct.unpack('<HHII', source.read(offset + 8, 12))
+        elif chunk_id == b'data':
+            # Streamed WAVs may leave the size at 0/0xFFFFFFFF: the data runs to the end
+            if chunk_size in (0, 0xFFFFFFFF) or offset + 8 + chunk_size > source.length:
+                chunk_size = source.length - offset - 8
+
+            duration = chunk_size / byte_rate if byte_rate else None
+            return _metadata(duration, byte_rate * 8 if byte_rate else None, sample_rate, channels)
+
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+    return _metadata(None, byte_rate * 8 if byte_rate else None, sample_rate, channels)
+
+
+# ---- FLAC ----
+
+def _parse_streaminfo(data: bytes) -> Tuple[int, int, int]:
+    """(sample_rate, channels, total_samples) from a 34-byte STREAMINFO block"""
+    packed, = struct.unpack('>Q', data[10:18])
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    return sample_rate, channels, total_samples
+
+
+def parse_flac(source: RangeSource) -> AudioMetadata:
+    """Native FLAC: STREAMINFO is always the first metadata block"""
+    offset = _id3v2_size(source)
+    if source.read(offset, 4) != b'fLaC':
+        raise ValueError('Missing fLaC marker')
+
+    block_header = source.read(offset + 4, 4)
+    if block_header[0] & 0x7f != 0:
+        raise ValueError('First FLAC metadata block is not STREAMINFO')
+
+    sample_rate, channels, total_samples = _parse_streaminfo(source.read(offset + 8, 34))
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+    return _metadata(duration, _average_bitrate(source.length - offset, duration), sample_rate, channels)
+
+
+# ---- Ogg (Vorbis, Opus, FLAC) ----
+
+OGG_PAGE_HEADER = struct.Struct('<4sBBqII')  # capture, version, type, granule position, serial, sequence
+
+
+def _last_granule(source: RangeSource, serial: int) -> Optional[int]:
+    """Granule position of the last page of the stream (pages are < 64 KB, so it is in the tail)"""
+    start = max(source.length - TAIL_SIZE, 0)
+    tail = source.read(start, source.length - start)
+    position = len(tail)
+
+    while True:
+        position = tail.rfind(b'OggS', 0, position)
+        if position < 0:
+            return None
+
+        if position + OGG_PAGE_HEADER.size <= len(tail):
+            _, version, _, granule, page_serial, _ = OGG_PAGE_HEADER.unpack_from(tail, position)
+            if version == 0 and page_serial == serial and granule >= 0:
+                return granule
+
+
+def parse_ogg(source: RangeSource) -> AudioMetadata:
+    """Ogg: codec setup from the first packet, duration from the last page's granule position"""
+    header = source.read(0, 27 + 255)
+    capture, version, _, _, serial, _ = OGG_PAGE_HEADER.unpack_from(header)
+    if capture != b'OggS' or version != 0:
+        raise ValueError('Not an Ogg page')
+
+    segments = header[26]
+    packet = source.read(27 + segments, sum(header[27:27 + segments]))
+
+    if packet.startswith(b'\x01vorbis'):
+        channels, sample_rate, _, nominal_bitrate, _ = struct.unpack('<BIiii', packet[11:28])
+        granule_rate, pre_skip = sample_rate, 0
+    elif packet.startswith(b'OpusHead'):
+        channels, pre_skip, input_rate = struct.unpack('<BHI', packet[9:16])
+        # Opus always runs at 48 kHz internally; input_rate is the original rate, if known
+        granule_rate, sample_rate, nominal_bitrate = 48000, input_rate or 48000, 0
+    elif packet.startswith(b'\x7fFLAC') and packet[9:13] == b'fLaC':
+        sample_rate, channels, _ = _parse_streaminfo(packet[17:51])
+        granule_rate, pre_skip, nominal_bitrate = sample_rate, 0, 0
+    else:
+        raise ValueError('Unsupported Ogg codec')
+
+    granule = _last_granule(source, serial)
+    duration = (granule - pre_skip) / granule_rate if granule and granule_rate else None
+    bitrate = _average_bitrate(source.length, duration) or nominal_bitrate
+    return _metadata(duration, bitrate, sample_rate, channels)
+
+
+# ---- MP4 / M4A ----
+
+def _iter_boxes(source: RangeSource, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload start, box end) for the boxes in [start, end), reading only box headers"""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack('>I4s', source.read(offset, 8))
+        header_size = 8
+
+        if size == 1:
+            size, = struct.unpack('>Q', source.read(offset + 8, 8))
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header_size:
+            return
+
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+
+def _find_box(source: RangeSource, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for found_type, payload, box_end in _iter_boxes(source, start, end):
+        if found_type == box_type:
+            return payload, box_end
+    return None
+
+
+def _find_path(source: RangeSource, start: int, end: int, *path: bytes) -> Optional[Tuple[int, int]]:
+    """Payload range of the first box at the nested path (e.g. b'mdia', b'minf')"""
+    box = (start, end)
+    for box_type in path:
+        box = _find_box(source, box[0], box[1], box_type)
+        if box is None:
+            return None
+    return box
+
+
+def parse_mp4(source: RangeSource) -> AudioMetadata:
+    """MP4/M4A: duration from moov/mvhd, format from the sound track's sample description"""
+    moov = _find_box(source, 0, source.length, b'moov')
+    if moov is None:
+        raise ValueError('No moov box')
+
+    duration = sample_rate = channels = None
+
+    mvhd = _find_box(source, *moov, b'mvhd')
+    if mvhd is not None:
+        version = source.read(mvhd[0], 1)[0]
+        if version == 1:
+            timescale, length = struct.unpack('>IQ', source.read(mvhd[0] + 20, 12))
+        else:
+            timescale, length = struct.unpack('>II', source.read(mvhd[0] + 12, 8))
+        duration = length / timescale if timescale else None
+
+    for box_type, payload, box_end in _iter_boxes(source, *moov):
+        if box_type != b'trak':
+            continue
+
+        hdlr = _find_path(source, payload, box_end, b'mdia', b'hdlr')
+        if hdlr is None or source.read(hdlr[0] + 8, 4) != b'soun':
+            continue
+
+        stsd = _find_path(source, payload, box_end, b'mdia', b'minf', b'stbl', b'stsd')
+        if stsd is not None:
+            # Full box header (4) + entry count (4), then the first sample entry: size, format,
+            # reserved (6), data reference (2), version (2), revision (2), vendor (4), channels...
+            entry = source.read(stsd[0] + 8, 36)
+            channels, _, _, _, sample_rate = struct.unpack('>HHHHI', entry[24:36])
+            sample_rate >>= 16  # 16.16 fixed point
+        break
+
+    return _metadata(duration, _average_bitrate(source.length, duration), sample_rate, channels)
+
+
+# ---- MP3 ----
+
+MP3_BITRATES = {
+    # (MPEG-1, layer) and (MPEG-2/2.5, layer) bitrate tables in kbit/s, index 1-14
+    (1, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+
+class Mp3Frame(NamedTuple):
+    version: float  # 1, 2 or 2.5
+    layer: int
+    bitrate: int  # bits per second
+    sample_rate: int
+    channels: int
+    samples: int  # Samples per frame
+    length: int  # Frame length in bytes
+
+
+def _parse_mp3_frame(header: bytes) -> Optional[Mp3Frame]:
+    """Decode a 4-byte MPEG audio frame header, or None if it is not one"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+
+    version = {0: 2.5, 2: 2, 3: 1}.get((header[1] >> 3) & 0x03)
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version is None or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index - 1] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if header[3] >> 6 == 3 else 2
+
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 576 if layer == 3 and version != 1 else 1152
+        length = samples // 8 * bitrate // sample_rate + padding
+
+    return Mp3Frame(version, layer, bitrate, sample_rate, channels, samples, length)
+
+
+def _find_mp3_frame(source: RangeSource, start: int) -> Tuple[int, Mp3Frame]:
+    """First frame header at or after start that is followed by another valid header"""
+    data = source.read(start, MP3_SYNC_SEARCH_SIZE)
+    position = data.find(b'\xff')
+
+    while 0 <= position < len(data) - 4:
+        frame = _parse_mp3_frame(data[position:position + 4])
+        if frame is not None:
+            following = source.read(start + position + frame.length, 4)
+            if len(following) < 4 or _parse_mp3_frame(following) is not None:
+                return start + position, frame
+        position = data.find(b'\xff', position + 1)
+
+    raise ValueError('No MPEG audio frame found')
+
+
+def parse_mp3(source: RangeSource) -> AudioMetadata:
+    """MP3: first frame header, with frame/byte counts from a Xing/Info or VBRI header when present"""
+    offset, frame = _find_mp3_frame(source, _id3v2_size(source))
+
+    audio_end = source.length
+    if source.read(source.length - 128, 3) == b'TAG':  # ID3v1
+        audio_end -= 128
+    audio_bytes = audio_end - offset
+
+    side_info = (32 if frame.channels == 2 else 17) if frame.version == 1 else (17 if frame.channels == 2 else 9)
+    data = source.read(offset, 4 + 32 + 26)
+    frames = None
+
+    xing = data[4 + side_info:4 + side_info + 16]
+    if xing[:4] in (b'Xing', b'Info'):
+        flags, = struct.unpack('>I', xing[4:8])
+        fields = xing[8:]
+        if flags & 0x01:
+            frames, = struct.unpack('>I', fields[:4])
+            fields = fields[4:]
+        if flags & 0x02:
+            audio_bytes, = struct.unpack('>I', fields[:4])
+    elif data[36:40] == b'VBRI':
+        audio_bytes, frames = struct.unpack('>II', data[46:54])
+
+    if frames:
+        duration = frames * frame.samples / frame.sample_rate
+        bitrate = _average_bitrate(audio_bytes, duration)
+    else:
+        # No VBR header: constant bitrate, so the size gives the duration
+        duration = audio_bytes * 8 / frame.bitrate
+        bitrate = frame.bitrate
+
+    return _metadata(duration, bitrate, frame.sample_rate, frame.channels)
+
+
+PARSERS = {'wav': parse_wav, 'flac': parse_flac, 'ogg': parse_ogg, 'm4a': parse_mp4, 'mp3': parse_mp3}
+
+
+def detect_format(source: RangeSource, filename: Optional[str] = None) -> Optional[str]:
+    """Container format from the leading bytes, falling back to the file extension"""
+    head = source.read(0, 12)
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    if head[:4] == b'fLaC' or source.read(_id3v2_size(source), 4) == b'fLaC':
+        return 'flac'
+    if head[:3] == b'ID3' or _parse_mp3_frame(head[:4]) is not None:
+        return 'mp3'
+
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    return extension if extension in PARSERS else None
+
+
+def probe(source: RangeSource, filename: Optional[str] = None) -> AudioMetadata:
+    """
+    Read duration, bitrate, sample rate and channel count from a file's headers
+    Raises ValueError for unknown or malformed files
+    """
+    audio_format = detect_format(source, filename)
+    if audio_format is None:
+        raise ValueError('Unknown audio format')
+
+    try:
+        return PARSERS[audio_format](source)
+    except (struct.error, IndexError, ZeroDivisionError) as e:
+        raise ValueError(f'Malformed {audio_format} headers: {e}')
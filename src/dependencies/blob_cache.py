@@ -0,0 +1,158 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional
+from .app_config import get_config
+from .metrics import get_metrics
+
+
+class BlobCache:
+    """
+    Local disk LRU cache for GridFS blobs, keyed by gridfs_file_id
+
+    Blob IDs are never reused for different content, so entries only have to be
+    invalidated when a blob is deleted. Each worker process keeps its own LRU
+    index over the shared directory; a file evicted by another process is simply
+    treated as a miss.
+    """
+
+    TEMP_PREFIX = '.tmp-'
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()  # file_id -> size, least recent first
+        self._size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    def _path(self, file_id: str) -> str:
+        return os.path.join(self.directory, file_id)
+
+    def _load_existing(self) -> None:
+        """Index files left by earlier runs (oldest access first) and drop stale temp files"""
+        existing = []
+
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith(self.TEMP_PREFIX):
+                os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+            existing.append((stat.st_atime, entry.name, stat.st_size))
+
+        for _, file_id, size in sorted(existing):
+            self._entries[file_id] = size
+            self._size += size
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits its budget (lock held)"""
+        metrics = get_metrics()
+
+        while self._size > self.max_bytes and self._entries:
+            file_id, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.unlink(self._path(file_id))
+            except FileNotFoundError:
+                pass
+            metrics.increment('blob_cache.evictions')
+            metrics.increment('blob_cache.evicted_bytes', size)
+
+        metrics.set_gauge('blob_cache.bytes', self._size)
+        metrics.set_gauge('blob_cache.entries', len(self._entries))
+
+    def lookup(self, file_id: str) -> Optional[str]:
+        """Get the path of a cached blob (marking it recently used), or None on a miss"""
+        metrics = get_metrics()
+        path = self._path(file_id)
+
+        with self._lock:
+            if file_id in self._entries and os.path.exists(path):
+                self._entries.move_to_end(file_id)
+                metrics.increment('blob_cache.hits')
+                return path
+
+            # Unknown, or removed on disk by another process
+            size = self._entries.pop(file_id, None)
+            if size is not None:
+                self._size -= size
+
+        metrics.increment('blob_cache.misses')
+        return None
+
+    def fill(self, file_id: str, chunks: Iterator[bytes], size: int) -> Iterator[bytes]:
+        """
+        Pass chunks through while writing them to the cache
+        The entry is only published if the whole blob was written, so an aborted
+        response (e.g. client disconnect) never leaves a truncated file behind
+        """
+        if size > self.max_bytes:
+            yield from chunks
+            return
+
+        fd, temp_path = tempfile.mkstemp(prefix=self.TEMP_PREFIX, dir=self.directory)
+        written = 0
+
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+
+            if written == size:
+                os.replace(temp_path, self._path(file_id))
+                self._add(file_id, size)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def _add(self, file_id: str, size: int) -> None:
+        with self._lock:
+            self._size -= self._entries.pop(file_id, 0)
+            self._entries[file_id] = size
+            self._size += size
+            get_metrics().increment('blob_cache.fills')
+            self._evict()
+
+    def invalidate(self, file_id: str) -> None:
+        """Drop a blob from the cache (called when the blob is deleted)"""
+        with self._lock:
+            self._size -= self._entries.pop(file_id, 0)
+            try:
+                os.unlink(self._path(file_id))
+            except FileNotFoundError:
+                pass
+            get_metrics().set_gauge('blob_cache.bytes', self._size)
+            get_metrics().set_gauge('blob_cache.entries', len(self._entries))
+
+
+# Global cache instance (None when the cache is disabled)
+_blob_cache: Optional[BlobCache] = None
+
+
+def init_blob_cache() -> None:
+    """Initialize the blob cache from the storage.cache configuration"""
+    global _blob_cache
+    config = get_config()
+
+    if not config.get('storage.cache.enabled', False):
+        _blob_cache = None
+        return
+
+    _blob_cache = BlobCache(
+        directory=config.get('storage.cache.directory', '/tmp/audioapp-blob-cache'),
+        max_bytes=config.get('storage.cache.max_size_mb', 1024) * 1024 * 1024
+    )
+
+
+def get_blob_cache() -> Optional[BlobCache]:
+    """Get blob cache instance (None when disabled)"""
+    return _blob_cache
@@ -14,6 +14,9 @@ def get_max_file_size() -> int:
 
 MAX_FILE_SIZE_BYTES = get_max_file_size()
 
+# Uploads are copied into GridFS in pieces of this size (GridFS default chunk size)
+UPLOAD_CHUNK_SIZE_BYTES = 255 * 1024
+
 
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
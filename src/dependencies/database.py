@@ -1,9 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from pymongo import MongoClient
 from gridfs import GridFS
 from typing import Optional
 from .app_config import get_config
+from .blob_cache import init_blob_cache
+from .user_cache import init_user_cache
+from .password_hasher import init_password_hasher, get_password_hasher
+from .storage import init_storage
+from .pool_metrics import MeasuredQueuePool, MongoPoolMetrics, instrument_engine
+from .schema_migrations import (
+    migration_connection, migrate_columns, missing_seeded_tables, seed_tables, migrate_indexes
+)
 
 # SQLAlchemy instance
 db = SQLAlchemy()
@@ -33,24 +42,60 @@ def init_db(app) -> None:
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Connection pool (per process): pool_size kept open, up to max_overflow more under load
+    pool_size = config.get('database.postgres.pool.size', 5)
+    max_overflow = config.get('database.postgres.pool.max_overflow', 10)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': MeasuredQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': config.get('database.postgres.pool.timeout_seconds', 30),
+        'pool_pre_ping': config.get('database.postgres.pool.pre_ping', True),
+        'pool_recycle': config.get('database.postgres.pool.recycle_seconds', -1)
+    }
+
     # Initialize SQLAlchemy
     db.init_app(app)
 
     # Import models to register them with SQLAlchemy
     from dbentities.user import User
     from dbentities.audio_file import AudioFile
+    from dbentities.audio_blob import AudioBlob
+    from dbentities.upload_session import UploadSession
+    from dbentities.blob_purge import BlobPurge
+    from dbentities.preview_job import PreviewJob
+    from dbentities.audio_fingerprint import AudioFingerprint
+    from dbentities.fingerprint_job import FingerprintJob
+    from dbentities.user_usage import UserUsage
+    from dbentities.waveform_job import WaveformJob
+    from dbentities.legacy_peaks import LegacyPeaks
+
+    # Bounded bcrypt threads at the configured cost (also used for the default admin below)
+    init_password_hasher()
 
     # Create tables
     with app.app_context():
-        db.create_all()
+        instrument_engine(db.engine, pool_size + max_overflow)
+
+        # Trigram matching and GIN indexes over plain columns, for file name search
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gin'))
+        db.session.commit()
+
+        # New tables are created, existing ones migrated (see schema_migrations)
+        with migration_connection(db.engine) as connection:
+            migrate_columns(connection)
+            new_tables = missing_seeded_tables(connection)
+            db.create_all()
+            seed_tables(connection, new_tables)
+            migrate_indexes(connection)
         print("Database tables created successfully!")
 
         # Create default admin user if it doesn't exist
         from dbentities.user import UserRole
         admin_user = User.query.filter_by(username='Admin').first()
         if not admin_user:
-            import bcrypt
-            password_hash = bcrypt.hashpw('Admin1234'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            password_hash = get_password_hasher().hash('Admin1234')
             admin_user = User(
                 username='Admin',
                 email='admin@audioapp.com',
@@ -77,10 +122,25 @@ def init_db(app) -> None:
         f"@{mongo_config['host']}:{mongo_config['port']}"
     )
 
-    _mongo_client = MongoClient(mongo_uri)
+    max_pool_size = config.get('database.mongodb.pool.max_size', 100)
+    _mongo_client = MongoClient(
+        mongo_uri,
+        maxPoolSize=max_pool_size,
+        minPoolSize=config.get('database.mongodb.pool.min_size', 0),
+        waitQueueTimeoutMS=config.get('database.mongodb.pool.wait_queue_timeout_ms'),
+        readPreference=config.get('database.mongodb.read_preference', 'primary'),
+        event_listeners=[MongoPoolMetrics(max_pool_size)]
+    )
     _mongo_db = _mongo_client[mongo_config['database']]
     _gridfs = GridFS(_mongo_db)
 
+    # Blob storage backend (GridFS or local disk) and optional local disk cache
+    init_storage()
+    init_blob_cache()
+
+    # Cache of logged-in users (may use MongoDB as its shared store)
+    init_user_cache()
+
 
 def get_db_session() -> Session:
     """Get SQLAlchemy database session"""
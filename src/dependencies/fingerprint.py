@@ -0,0 +1,80 @@
+from typing import Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Landmark fingerprints: spectrogram peaks of the mono signal at SAMPLE_RATE, paired
+# into (f1, f2, dt) hashes anchored at the first peak's frame. Only the band below
+# 5.5 kHz is used, which survives re-encoding at any common bitrate
+SAMPLE_RATE = 11025
+FFT_SIZE = 1024
+HOP_SIZE = 512  # ~46 ms per frame
+FREQ_BITS = 9  # Bins 1..511 (the DC bin is dropped)
+DT_BITS = 6  # Pairs at most 63 frames (~2.9 s) apart
+HASH_VERSION = 1
+
+
+def spectrogram(samples: np.ndarray) -> np.ndarray:
+    """Log-magnitude STFT (Hann window) of mono samples, shape (frames, FFT_SIZE // 2)"""
+    if len(samples) < FFT_SIZE:
+        return np.empty((0, FFT_SIZE // 2), dtype=np.float32)
+
+    frames = sliding_window_view(samples.astype(np.float32), FFT_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE).astype(np.float32), axis=1))
+    return np.log(spectrum[:, 1:FFT_SIZE // 2 + 1] + 1e-6).astype(np.float32)
+
+
+def _max_filter(values: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """Running maximum over `size` neighbours along one axis (edges padded with -inf)"""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size // 2, size // 2)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    return sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+
+def find_peaks(spec: np.ndarray, time_size: int = 15, freq_size: int = 15,
+               min_prominence: float = 2.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Local maxima of a spectrogram within a time_size x freq_size neighbourhood that stand
+    min_prominence (natural log units) above the median level
+    Returns (frames, bins) sorted by frame, then bin
+    """
+    if not spec.size:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    # A rectangular max filter is separable: along time, then along frequency
+    neighbourhood = _max_filter(_max_filter(spec, time_size, axis=0), freq_size, axis=1)
+    frames, bins = np.nonzero((spec == neighbourhood) & (spec > np.median(spec) + min_prominence))
+    return frames.astype(np.int32), bins.astype(np.int32)
+
+
+def landmarks(frames: np.ndarray, bins: np.ndarray, fan_out: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair every peak with the next fan_out peaks in time order (within 1..63 frames)
+    Returns (hashes, anchor frames) as int32 arrays; a hash packs f1, f2 and dt
+    """
+    hashes, offsets = [], []
+    max_dt = (1 << DT_BITS) - 1
+
+    for k in range(1, fan_out + 1):
+        dt = frames[k:] - frames[:-k]
+        valid = (dt > 0) & (dt <= max_dt)
+        f1, f2 = bins[:-k][valid], bins[k:][valid]
+        hashes.append((f1 << (FREQ_BITS + DT_BITS)) | (f2 << DT_BITS) | dt[valid])
+        offsets.append(frames[:-k][valid])
+
+    if not hashes:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    return np.concatenate(hashes).astype(np.int32), np.concatenate(offsets).astype(np.int32)
+
+
+def fingerprint(samples: np.ndarray, fan_out: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Landmark hashes of mono float samples at SAMPLE_RATE, without repeated (hash, frame) pairs
+    Returns (hashes, anchor frames)
+    """
+    frames, bins = find_peaks(spectrogram(samples))
+    hashes, offsets = landmarks(frames, bins, fan_out)
+
+    pairs = np.unique(np.stack((hashes, offsets), axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
@@ -0,0 +1,48 @@
+import threading
+from typing import Dict, Any
+
+
+class Metrics:
+    """In-process metrics registry (counters, gauges and timing summaries)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add value to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation (e.g. a duration in seconds) in a summary"""
+        with self._lock:
+            summary = self._timings.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            summary['count'] += 1
+            summary['sum'] += value
+            summary['max'] = max(summary['max'], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a copy of all metrics"""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': {name: dict(summary) for name, summary in self._timings.items()}
+            }
+
+
+# Global metrics instance
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Get metrics registry instance"""
+    return _metrics
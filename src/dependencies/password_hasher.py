@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import bcrypt
+from .app_config import get_config
+from .metrics import get_metrics
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when every bcrypt slot stays taken for longer than the wait timeout"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, bounded pool of threads
+
+    bcrypt releases the GIL, so at most `workers` hashes use CPU at once however many
+    logins arrive together, leaving the remaining cores to other requests. Up to
+    `max_pending` more wait their turn; beyond that, callers wait up to
+    wait_timeout_seconds for a slot and then get PasswordHasherBusyError instead of
+    tying up their request thread indefinitely.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int, wait_timeout_seconds: float):
+        if not 4 <= rounds <= 31:
+            raise ValueError(f"bcrypt rounds must be between 4 and 31, got {rounds}")
+
+        self.rounds = rounds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _track(self, delta: int) -> None:
+        with self._lock:
+            self._in_flight += delta
+            get_metrics().set_gauge('auth.bcrypt.in_flight', self._in_flight)
+
+    def _run(self, operation: str, function, *args):
+        """Run function(*args) on the pool and wait for its result"""
+        metrics = get_metrics()
+
+        if not self._slots.acquire(timeout=self.wait_timeout_seconds):
+            metrics.increment('auth.bcrypt.rejected')
+            raise PasswordHasherBusyError('Too many password checks in progress')
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            metrics.observe('auth.bcrypt.queue_wait_seconds', started - submitted)
+            try:
+                return function(*args)
+            finally:
+                metrics.observe(f'auth.bcrypt.{operation}_seconds', time.perf_counter() - started)
+
+        self._track(1)
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            self._track(-1)
+            self._slots.release()
+            raise
+
+        def finished(_future) -> None:
+            self._track(-1)
+            self._slots.release()
+
+        future.add_done_callback(finished)
+        return future.result()
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured number of rounds"""
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run('hash', bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """Verify a password against its hash (at the cost the hash was made with)"""
+        return self._run('verify', bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a hash was made with a different number of rounds than configured"""
+        # $2b$<rounds>$<salt and hash>
+        parts = password_hash.split('$')
+        return len(parts) == 4 and parts[2].isdigit() and int(parts[2]) != self.rounds
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+# Global hasher instance
+_password_hasher: Optional[PasswordHasher] = None
+_init_lock = threading.Lock()
+
+
+def _create_password_hasher() -> PasswordHasher:
+    config = get_config()
+    # Half the cores by default, so a burst of logins can't take all of them
+    workers = config.get('security.bcrypt_workers') or max(1, (os.cpu_count() or 2) // 2)
+    return PasswordHasher(
+        rounds=config.get('security.bcrypt_rounds', 12),
+        workers=workers,
+        max_pending=config.get('security.bcrypt_max_pending', 64),
+        wait_timeout_seconds=config.get('security.bcrypt_wait_timeout_seconds', 5)
+    )
+
+
+def init_password_hasher() -> None:
+    """Initialize the password hasher from the security configuration"""
+    global _password_hasher
+
+    with _init_lock:
+        if _password_hasher is not None:
+            _password_hasher.shutdown()
+        _password_hasher = _create_password_hasher()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get the password hasher (initialized from the configuration on first use)"""
+    global _password_hasher
+
+    if _password_hasher is None:
+        with _init_lock:
+            if _password_hasher is None:
+                _password_hasher = _create_password_hasher()
+
+    return _password_hasher
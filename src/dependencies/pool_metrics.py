@@ -0,0 +1,126 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from .metrics import get_metrics
+
+
+class MeasuredQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waits (postgres.pool.checkout_seconds)
+    Pool events only fire once a checkout has succeeded, so the wait is timed around the
+    public Pool.connect() (what Engine.connect() calls), not the pool's internals
+    """
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            get_metrics().increment('postgres.pool.checkout_timeouts')
+            raise
+        finally:
+            # Includes opening a connection when the pool has none idle (see connections_opened)
+            # and the pre-ping, if enabled
+            get_metrics().observe('postgres.pool.checkout_seconds', time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine, capacity: int) -> None:
+    """
+    Publish SQLAlchemy pool activity through pool events: connections in use and their
+    share of capacity (pool size + max overflow) as gauges, checkouts and connections
+    opened / closed / invalidated (churn) as counters
+    """
+    metrics = get_metrics()
+    pool = engine.pool
+
+    def publish_usage(checked_out: int) -> None:
+        metrics.set_gauge('postgres.pool.checked_out', checked_out)
+        metrics.set_gauge('postgres.pool.utilization', checked_out / capacity if capacity else 0)
+
+    def on_checkout(*_) -> None:
+        metrics.increment('postgres.pool.checkouts')
+        publish_usage(pool.checkedout())
+
+    # checkin fires before the connection is back in the pool, so it still counts as checked out
+    event.listen(pool, 'checkout', on_checkout)
+    event.listen(pool, 'checkin', lambda *_: publish_usage(max(pool.checkedout() - 1, 0)))
+    event.listen(pool, 'connect', lambda *_: metrics.increment('postgres.pool.connections_opened'))
+    event.listen(pool, 'close', lambda *_: metrics.increment('postgres.pool.connections_closed'))
+    event.listen(pool, 'close_detached', lambda *_: metrics.increment('postgres.pool.connections_closed'))
+    # Pre-ping failures, recycled and broken connections
+    event.listen(pool, 'invalidate', lambda *_: metrics.increment('postgres.pool.connections_invalidated'))
+    event.listen(pool, 'soft_invalidate', lambda *_: metrics.increment('postgres.pool.connections_invalidated'))
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Publish pymongo connection pool activity: checkout wait time and failures, connections
+    in use and pool utilization per server, connections created / closed and pool clears
+    """
+
+    def __init__(self, max_pool_size: Optional[int]):
+        self._max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._in_use: Dict[Tuple, int] = {}
+        # A checkout completes on the thread that started it
+        self._checkout_started = threading.local()
+
+    def _publish_usage(self, address: Tuple, delta: int) -> None:
+        metrics = get_metrics()
+        with self._lock:
+            in_use = self._in_use[address] = max(self._in_use.get(address, 0) + delta, 0)
+        server = f'{address[0]}:{address[1]}'
+        metrics.set_gauge(f'mongodb.pool.{server}.checked_out', in_use)
+        if self._max_pool_size:
+            metrics.set_gauge(f'mongodb.pool.{server}.utilization', in_use / self._max_pool_size)
+
+    def _observe_wait(self) -> None:
+        started = getattr(self._checkout_started, 'value', None)
+        if started is not None:
+            get_metrics().observe('mongodb.pool.checkout_seconds', time.perf_counter() - started)
+            self._checkout_started.value = None
+
+    def connection_check_out_started(self, event) -> None:
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        self._observe_wait()
+        self._publish_usage(event.address, 1)
+
+    def connection_check_out_failed(self, event) -> None:
+        self._observe_wait()
+        metrics = get_metrics()
+        metrics.increment('mongodb.pool.checkout_failures')
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            metrics.increment('mongodb.pool.checkout_timeouts')
+
+    def connection_checked_in(self, event) -> None:
+        self._publish_usage(event.address, -1)
+
+    def connection_created(self, event) -> None:
+        get_metrics().increment('mongodb.pool.connections_created')
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        get_metrics().increment('mongodb.pool.connections_closed')
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        # All of the server's connections are dropped (e.g. after a network error)
+        get_metrics().increment('mongodb.pool.cleared')
+
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            self._in_use.pop(event.address, None)
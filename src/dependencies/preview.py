@@ -0,0 +1,126 @@
+import shutil
+import subprocess
+from itertools import chain
+from typing import Iterable, Optional
+import numpy as np
+from dependencies.app_config import get_config
+from dependencies.storage import get_storage, ChunkReader
+from dependencies.storage.codec import open_decoded_range
+from dependencies.waveform import iter_ffmpeg_blocks, iter_wav_blocks
+
+
+def read_clip(blocks: Iterable[np.ndarray], sample_rate: int, start_seconds: float, seconds: float) -> np.ndarray:
+    """
+    Mono mix of [start_seconds, start_seconds + seconds) from PCM blocks of shape
+    (frames, channels); blocks past the clip are never requested
+    """
+    first = int(start_seconds * sample_rate)
+    last = first + int(seconds * sample_rate)
+    parts = []
+    position = 0
+
+    for block in blocks:
+        end = position + len(block)
+        if end > first:
+            parts.append(block[max(first - position, 0):last - position].mean(axis=1))
+
+        position = end
+        if position >= last:
+            break
+
+    return np.concatenate(parts).astype(np.float32) if parts else np.empty(0, dtype=np.float32)
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """
+    Resample mono samples: a windowed-sinc low-pass below the new Nyquist frequency
+    (when downsampling), then linear interpolation at the new sample times
+    """
+    if from_rate == to_rate or not len(samples):
+        return samples
+
+    ratio = from_rate / to_rate
+
+    if ratio > 1:
+        cutoff = 0.5 / ratio  # In cycles per input sample
+        half_width = max(32, int(16 * ratio))
+        taps = np.arange(-half_width, half_width + 1)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode='same')
+
+    positions = np.arange(int(len(samples) / ratio)) * ratio
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def decode_clip(gridfs_file_id: str, storage_codec: Optional[str], sample_rate: int,
+                start_seconds: float, seconds: float) -> Optional[np.ndarray]:
+    """
+    Decode [start_seconds, start_seconds + seconds) of a stored blob to mono float samples
+    at sample_rate (WAV natively with NumPy, other formats with ffmpeg, see waveform.ffmpeg_path)
+    Only the blob's content up to the end of the clip is read
+    Returns None if the blob is missing or its format can't be decoded here
+    """
+    config = get_config()
+    block_frames = config.get('waveform.block_frames', 65536)
+
+    # Straight from storage: a partial read the blob cache couldn't keep anyway
+    storage = get_storage()
+    if storage_codec is None:
+        chunks = storage.open_range(gridfs_file_id, 0, None)
+    else:
+        chunks = open_decoded_range(storage, gridfs_file_id, storage_codec, 0, None)
+    if chunks is None:
+        return None
+
+    try:
+        first = next(chunks, b'')
+        content = chain([first], chunks)
+
+        if first[:4] == b'RIFF' and first[8:12] == b'WAVE':
+            source_rate, blocks = iter_wav_blocks(ChunkReader(content), block_frames)
+        else:
+            ffmpeg = shutil.which(config.get('waveform.ffmpeg_path', 'ffmpeg'))
+            if ffmpeg is None:
+                return None
+            # ffmpeg resamples while decoding
+            source_rate = sample_rate
+            blocks = iter_ffmpeg_blocks(content, ffmpeg, sample_rate, block_frames)
+
+        try:
+            clip = read_clip(blocks, source_rate, start_seconds, seconds)
+        finally:
+            blocks.close()
+
+    finally:
+        chunks.close()
+
+    return resample(clip, source_rate, sample_rate)
+
+
+# Preview encodings: format name -> (ffmpeg encoder, container, content type, file extension)
+PREVIEW_FORMATS = {
+    'mp3': ('libmp3lame', 'mp3', 'audio/mpeg', 'mp3'),
+    'opus': ('libopus', 'ogg', 'audio/ogg', 'opus'),
+}
+
+
+def encode_preview(samples: np.ndarray, sample_rate: int, ffmpeg_path: str, preview_format: str,
+                   bitrate_kbps: int) -> bytes:
+    """Encode mono float samples in [-1, 1] with ffmpeg, in one of PREVIEW_FORMATS at bitrate_kbps"""
+    if preview_format not in PREVIEW_FORMATS:
+        raise ValueError(f"Unknown preview format: {preview_format}")
+
+    encoder, container, _, _ = PREVIEW_FORMATS[preview_format]
+    pcm = np.clip(np.round(samples * 32767), -32768, 32767).astype('<i2')
+
+    # A clip is small enough to pass through memory in one go
+    result = subprocess.run(
+        [ffmpeg_path, '-v', 'error', '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+         '-c:a', encoder, '-b:a', f'{bitrate_kbps}k', '-f', container, 'pipe:1'],
+        input=pcm.tobytes(), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0 or not result.stdout:
+        error = result.stderr.decode('utf-8', 'replace').strip()[-200:]
+        raise ValueError(f'ffmpeg exited with status {result.returncode}: {error}')
+
+    return result.stdout
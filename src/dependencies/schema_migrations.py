@@ -0,0 +1,120 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# create_all() only creates missing tables: tables created by an earlier version are
+# brought up to date by these statements instead, on every start. Each one is idempotent.
+
+# Run before create_all() (IF EXISTS: nothing to do on a fresh database)
+COLUMN_MIGRATIONS: List[str] = [
+    # Blob deduplication: files reference shared AudioBlob content, so a GridFS file ID may repeat
+    'ALTER TABLE IF EXISTS audio_files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)',
+    'ALTER TABLE IF EXISTS audio_files ADD COLUMN IF NOT EXISTS storage_codec VARCHAR(16)',
+    'ALTER TABLE IF EXISTS audio_files DROP CONSTRAINT IF EXISTS audio_files_gridfs_file_id_key',
+    # Audio metadata read from file headers (filled in for existing rows by backfill-audio-metadata)
+    'ALTER TABLE IF EXISTS audio_files ADD COLUMN IF NOT EXISTS duration_seconds DOUBLE PRECISION',
+    'ALTER TABLE IF EXISTS audio_files ADD COLUMN IF NOT EXISTS bitrate INTEGER',
+    'ALTER TABLE IF EXISTS audio_files ADD COLUMN IF NOT EXISTS sample_rate INTEGER',
+    'ALTER TABLE IF EXISTS audio_files ADD COLUMN IF NOT EXISTS channels SMALLINT',
+]
+
+# Run after create_all(): (index name, what to index), built with CREATE INDEX CONCURRENTLY
+# so uploads and listings carry on while a large table is indexed
+INDEX_MIGRATIONS: List[Tuple[str, str]] = [
+    ('ix_audio_files_gridfs_file_id', 'audio_files (gridfs_file_id)'),
+    ('ix_audio_files_content_hash', 'audio_files (content_hash)'),
+    ('ix_audio_files_duration_seconds', 'audio_files (duration_seconds)'),
+    ('ix_audio_files_bitrate', 'audio_files (bitrate)'),
+    ('ix_audio_files_sample_rate', 'audio_files (sample_rate)'),
+    ('ix_audio_files_channels', 'audio_files (channels)'),
+    # Keyset pagination of a user's files by each sort key
+    ('ix_audio_files_user_created', 'audio_files (user_id, created_at, id)'),
+    ('ix_audio_files_user_filename', 'audio_files (user_id, filename, id)'),
+    ('ix_audio_files_user_size', 'audio_files (user_id, file_size, id)'),
+    # File name search (pg_trgm and btree_gin are created before the migrations run)
+    ('ix_audio_files_user_filename_trgm', 'audio_files USING gin (user_id, filename gin_trgm_ops)'),
+    ('ix_audio_files_user_original_filename_trgm',
+     'audio_files USING gin (user_id, original_filename gin_trgm_ops)'),
+    # Admin user search
+    ('ix_users_username_trgm', 'users USING gin (username gin_trgm_ops)'),
+    ('ix_users_email_trgm', 'users USING gin (email gin_trgm_ops)'),
+]
+
+# Run after create_all() for the tables it has just created: (table, statement filling it
+# from the data stored before it existed)
+TABLE_SEEDS: List[Tuple[str, str]] = [
+    # Usage counters of the files uploaded before usage was tracked
+    ('user_usage', 'INSERT INTO user_usage (user_id, bytes_used, file_count, updated_at) '
+                   'SELECT user_id, SUM(file_size), COUNT(*), now() FROM audio_files GROUP BY user_id '
+                   'ON CONFLICT (user_id) DO NOTHING'),
+]
+
+# Dropped (concurrently) once the indexes above exist
+OBSOLETE_INDEXES: List[str] = [
+    'ix_audio_files_user_id',  # Superseded by the per-user keyset indexes, which lead with user_id
+]
+
+# Arbitrary key of the advisory lock that lets one app process at a time migrate
+MIGRATION_LOCK_ID = 4711203
+
+
+@contextmanager
+def migration_connection(engine: Engine) -> Iterator[Connection]:
+    """
+    Autocommit connection (CREATE INDEX CONCURRENTLY can't run in a transaction) holding
+    the migration lock; other processes starting at the same time wait for it
+    """
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        # Polled rather than blocking: a session waiting inside pg_advisory_lock would in
+        # turn hold up the concurrent index builds of the process that has the lock
+        while not connection.execute(text('SELECT pg_try_advisory_lock(:id)'), {'id': MIGRATION_LOCK_ID}).scalar():
+            time.sleep(1)
+
+        try:
+            yield connection
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+
+
+def migrate_columns(connection: Connection) -> None:
+    """Add the columns (and drop the constraints) earlier versions of existing tables lack"""
+    for statement in COLUMN_MIGRATIONS:
+        connection.execute(text(statement))
+
+
+def missing_seeded_tables(connection: Connection) -> List[str]:
+    """Tables of TABLE_SEEDS that don't exist yet (to be called before create_all() creates them)"""
+    return [
+        table for table, _ in TABLE_SEEDS
+        if connection.execute(text('SELECT to_regclass(:name)'), {'name': table}).scalar() is None
+    ]
+
+
+def seed_tables(connection: Connection, tables: List[str]) -> None:
+    """Fill the given newly created tables from existing data"""
+    for table, statement in TABLE_SEEDS:
+        if table in tables:
+            print(f"Seeding {table}...")
+            connection.execute(text(statement))
+
+
+def migrate_indexes(connection: Connection) -> None:
+    """Build the indexes earlier versions of existing tables lack, then drop obsolete ones"""
+    for name, definition in INDEX_MIGRATIONS:
+        valid = connection.execute(
+            text('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'), {'name': name}
+        ).scalar()
+        if valid:
+            continue
+
+        if valid is False:
+            # Left behind by an interrupted concurrent build: IF NOT EXISTS would keep it
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+
+        print(f"Building index {name}...")
+        connection.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}'))
+
+    for name in OBSOLETE_INDEXES:
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
@@ -0,0 +1,41 @@
+from typing import Optional
+from ..app_config import get_config
+from ..constants import UPLOAD_CHUNK_SIZE_BYTES
+from .base import StorageBackend, BlobStat, ChunkReader
+from .gridfs_backend import GridFSBackend
+from .local_backend import LocalBackend
+
+# Configured storage backend
+_storage: Optional[StorageBackend] = None
+
+
+def create_backend(name: str) -> StorageBackend:
+    """Create a storage backend by name ('gridfs' or 'local') from the storage configuration"""
+    config = get_config()
+
+    if name == GridFSBackend.name:
+        from ..database import get_mongo_db
+        return GridFSBackend(get_mongo_db(), UPLOAD_CHUNK_SIZE_BYTES)
+
+    if name == LocalBackend.name:
+        return LocalBackend(config.get('storage.local.root', '/data/audio'), UPLOAD_CHUNK_SIZE_BYTES)
+
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+def init_storage() -> None:
+    """Initialize the storage backend selected by storage.backend (defaults to GridFS)"""
+    global _storage
+    config = get_config()
+    _storage = create_backend(config.get('storage.backend', GridFSBackend.name))
+
+
+def get_storage() -> StorageBackend:
+    """Get the configured storage backend"""
+    return _storage
+
+
+__all__ = [
+    'StorageBackend', 'BlobStat', 'ChunkReader', 'GridFSBackend', 'LocalBackend',
+    'create_backend', 'init_storage', 'get_storage'
+]
@@ -0,0 +1,153 @@
+import hashlib
+import io
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterator, List, NamedTuple, Optional
+
+
+class BlobStat(NamedTuple):
+    """Size and modification time of a stored blob"""
+    file_id: str
+    length: int
+    upload_date: Optional[datetime]
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file-like view over an iterator of byte chunks (e.g. another backend's open_range)"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class StorageBackend(ABC):
+    """
+    Interface for blob storage (audio bytes)
+
+    Blob IDs are 24-character hex strings (ObjectId format) for every backend, so
+    AudioFile.gridfs_file_id / AudioBlob.gridfs_file_id stay valid across backends
+    and a migration can keep IDs unchanged.
+    """
+
+    # Backend name as used in the storage.backend configuration
+    name: str = ''
+
+    # True when blobs are plain files on this host that can be served with sendfile
+    is_local: bool = False
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _copy_stream(stream: IO[bytes], write: Callable[[bytes], Any], piece_size: int,
+                     max_size: Optional[int]) -> Dict[str, Any]:
+        """
+        Copy stream into write() in fixed-size pieces, hashing as it goes
+        Stops as soon as max_size is exceeded (success False)
+        Returns dict with success status, file_size and sha256
+        """
+        file_size = 0
+        sha256 = hashlib.sha256()
+
+        while True:
+            piece = stream.read(piece_size)
+            if not piece:
+                break
+
+            file_size += len(piece)
+            if max_size is not None and file_size > max_size:
+                return {
+                    'success': False,
+                    'message': f'File too large. Maximum size: {max_size / (1024 * 1024)} MB'
+                }
+
+            sha256.update(piece)
+            write(piece)
+
+        return {
+            'success': True,
+            'file_size': file_size,
+            'sha256': sha256.hexdigest()
+        }
+
+    @abstractmethod
+    def put_stream(self, stream: IO[bytes], filename: Optional[str] = None, content_type: Optional[str] = None,
+                   max_size: Optional[int] = None, file_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a new blob read from stream in chunk_size pieces (never buffering it whole)
+        Aborts, removing partial data, once max_size is exceeded
+        Returns dict with success status, gridfs_file_id, file_size and sha256
+        """
+
+    @abstractmethod
+    def open_range(self, file_id: str, start: int = 0, stop: Optional[int] = None) -> Optional[Iterator[bytes]]:
+        """
+        Open a blob as a lazy iterator over bytes [start, stop)
+        Returns None if the blob does not exist
+        """
+
+    @abstractmethod
+    def delete(self, file_id: str) -> None:
+        """Delete a blob (deleting a missing blob is not an error)"""
+
+    def delete_many(self, file_ids: List[str]) -> None:
+        """Delete several blobs at once (missing blobs are ignored)"""
+        for file_id in file_ids:
+            self.delete(file_id)
+
+    @abstractmethod
+    def stat(self, file_id: str) -> Optional[BlobStat]:
+        """Get size information for a blob, or None if it does not exist"""
+
+    @abstractmethod
+    def iter_file_ids(self) -> Iterator[str]:
+        """Yield the IDs of all stored blobs in ascending order"""
+
+    def local_path(self, file_id: str) -> Optional[str]:
+        """Get the local filesystem path of a blob (for sendfile), if the backend has one"""
+        return None
+
+    # Resumable uploads: parts are written at chunk_size-aligned offsets and the
+    # blob only becomes visible through open_range/stat once completed
+
+    @abstractmethod
+    def write_part(self, file_id: str, offset: int, data: bytes) -> None:
+        """Write one piece of a partial upload at offset (a multiple of chunk_size)"""
+
+    @abstractmethod
+    def truncate_part(self, file_id: str, offset: int) -> None:
+        """Drop everything written to a partial upload at or after offset"""
+
+    @abstractmethod
+    def complete_part(self, file_id: str, length: int, filename: Optional[str] = None,
+                      content_type: Optional[str] = None) -> None:
+        """
+        Turn a fully written partial upload into a regular blob
+        Completing an already completed upload is a no-op, so a failed finalize can be retried
+        """
+
+    @abstractmethod
+    def discard_parts(self, file_ids: List[str]) -> None:
+        """Delete partial uploads that will never be completed"""
+
+    def iter_part_ids(self) -> Iterator[str]:
+        """
+        Yield the IDs that have partial-upload data, in ascending order
+        May include completed blobs where parts and blobs share storage (GridFS chunks)
+        """
+        return iter(())
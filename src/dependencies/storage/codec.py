@@ -0,0 +1,256 @@
+import hashlib
+import struct
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from itertools import accumulate
+from typing import IO, Iterator, List, NamedTuple, Optional
+from ..app_config import get_config
+from ..metrics import get_metrics
+from .base import StorageBackend
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, only needed for the zstd codec
+    zstandard = None
+
+
+class FileTooLargeError(Exception):
+    """Raised while encoding once the original data exceeds the upload size limit"""
+
+
+class Codec(ABC):
+    """Compresses/decompresses one frame at a time"""
+
+    name = ''
+
+    def __init__(self, level: Optional[int] = None):
+        self.level = level
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Compress one frame"""
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        """Decompress one frame produced by compress"""
+
+
+class ZlibCodec(Codec):
+    name = 'zlib'
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 6 if self.level is None else self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+
+    def compress(self, data: bytes) -> bytes:
+        # Compressor objects are not thread-safe, and cheap enough to create per frame
+        return zstandard.ZstdCompressor(level=3 if self.level is None else self.level).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+CODECS = {codec.name: codec for codec in (ZlibCodec, ZstdCodec)}
+
+
+def get_codec(name: str, level: Optional[int] = None) -> Codec:
+    """Get a codec by its storage_codec name"""
+    if name not in CODECS:
+        raise ValueError(f"Unknown storage codec: {name}")
+    if name == ZstdCodec.name and zstandard is None:
+        raise ValueError("The zstd storage codec requires the 'zstandard' package")
+    return CODECS[name](level)
+
+
+def get_upload_codec(filename: str) -> Optional[Codec]:
+    """Get the codec new uploads of filename are stored with (None: store as is)"""
+    config = get_config()
+    name = config.get('storage.compression.codec', 'none')
+    extensions = config.get('storage.compression.extensions', ['wav'])
+
+    if name in (None, 'none') or filename.rsplit('.', 1)[-1].lower() not in extensions:
+        return None
+
+    return get_codec(name, config.get('storage.compression.level'))
+
+
+# Blob layout: compressed frames of frame_size original bytes each, then the
+# compressed length of every frame (uint32) and a fixed-size trailer
+TRAILER = struct.Struct('<4sIIQ')  # magic, frame_size, frame_count, original length
+MAGIC = b'AFC1'
+
+
+class FrameEncoder:
+    """
+    Turns a stream into the compressed blob layout, frame by frame
+    The original data is hashed and measured on the way, as dedup and
+    file_size refer to the uncompressed content
+    """
+
+    def __init__(self, stream: IO[bytes], codec: Codec, frame_size: int, max_size: Optional[int] = None):
+        self.stream = stream
+        self.codec = codec
+        self.frame_size = frame_size
+        self.max_size = max_size
+        self.file_size = 0
+        self.sha256 = hashlib.sha256()
+
+    def _read_frame(self) -> bytes:
+        parts = []
+        remaining = self.frame_size
+
+        while remaining > 0:
+            part = self.stream.read(remaining)
+            if not part:
+                break
+            parts.append(part)
+            remaining -= len(part)
+
+        return b''.join(parts)
+
+    def frames(self) -> Iterator[bytes]:
+        """Yield the compressed frames followed by the frame index and trailer"""
+        metrics = get_metrics()
+        lengths: List[int] = []
+        compressed_size = 0
+        elapsed = 0.0
+
+        while True:
+            frame = self._read_frame()
+            if not frame:
+                break
+
+            self.file_size += len(frame)
+            if self.max_size is not None and self.file_size > self.max_size:
+                raise FileTooLargeError(f'File too large. Maximum size: {self.max_size / (1024 * 1024)} MB')
+
+            self.sha256.update(frame)
+
+            started = time.perf_counter()
+            compressed = self.codec.compress(frame)
+            elapsed += time.perf_counter() - started
+
+            lengths.append(len(compressed))
+            compressed_size += len(compressed)
+            yield compressed
+
+        metrics.increment('storage_codec.raw_bytes', self.file_size)
+        metrics.increment('storage_codec.compressed_bytes', compressed_size)
+        metrics.observe('storage_codec.compress_seconds', elapsed)
+
+        yield struct.pack(f'<{len(lengths)}I', *lengths) + \
+            TRAILER.pack(MAGIC, self.frame_size, len(lengths), self.file_size)
+
+
+class FrameIndex(NamedTuple):
+    """Where each frame of a compressed blob starts"""
+    frame_size: int
+    offsets: List[int]  # Compressed start offset of every frame, plus the end of the last one
+    length: int  # Original (uncompressed) length
+
+
+# Parsed indexes of recently read blobs (blob IDs are never reused, so entries never go stale)
+_index_cache: 'OrderedDict[str, FrameIndex]' = OrderedDict()
+_index_cache_lock = threading.Lock()
+INDEX_CACHE_SIZE = 1024
+
+# Bytes read from the end of a blob to get its trailer (and usually its whole index) at once
+TAIL_READ_SIZE = 64 * 1024
+
+
+def read_index(storage: StorageBackend, file_id: str) -> Optional[FrameIndex]:
+    """Get the frame index of a compressed blob, or None if the blob does not exist"""
+    with _index_cache_lock:
+        index = _index_cache.get(file_id)
+        if index is not None:
+            _index_cache.move_to_end(file_id)
+            return index
+
+    blob_stat = storage.stat(file_id)
+    if blob_stat is None:
+        return None
+
+    tail_size = min(blob_stat.length, TAIL_READ_SIZE)
+    tail = b''.join(storage.open_range(file_id, blob_stat.length - tail_size, blob_stat.length))
+
+    magic, frame_size, frame_count, length = TRAILER.unpack(tail[-TRAILER.size:])
+    if magic != MAGIC:
+        raise ValueError(f"Blob {file_id} is not in the compressed frame format")
+
+    index_size = 4 * frame_count
+    if index_size + TRAILER.size > len(tail):
+        tail = b''.join(storage.open_range(file_id, blob_stat.length - TRAILER.size - index_size, blob_stat.length))
+
+    lengths = struct.unpack(f'<{frame_count}I', tail[-TRAILER.size - index_size:-TRAILER.size])
+    index = FrameIndex(frame_size, list(accumulate(lengths, initial=0)), length)
+
+    with _index_cache_lock:
+        _index_cache[file_id] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+
+    return index
+
+
+def open_decoded_range(storage: StorageBackend, file_id: str, codec_name: str,
+                       start: int = 0, stop: Optional[int] = None) -> Optional[Iterator[bytes]]:
+    """
+    Open original bytes [start, stop) of a compressed blob as a lazy iterator
+    Only the frames overlapping the range are fetched and decompressed.
+    Returns None if the blob does not exist
+    """
+    index = read_index(storage, file_id)
+    if index is None:
+        return None
+
+    if stop is None or stop > index.length:
+        stop = index.length
+    if start >= stop:
+        return (piece for piece in ())
+
+    first = start // index.frame_size
+    last = (stop - 1) // index.frame_size
+    chunks = storage.open_range(file_id, index.offsets[first], index.offsets[last + 1])
+
+    return _decode_frames(chunks, get_codec(codec_name), index, first, last, start, stop)
+
+
+def _decode_frames(chunks: Iterator[bytes], codec: Codec, index: FrameIndex,
+                   first: int, last: int, start: int, stop: int) -> Iterator[bytes]:
+    """Split stored chunks into frames, decompress them and trim to [start, stop)"""
+    metrics = get_metrics()
+    buffer = bytearray()
+    frame = first
+    elapsed = 0.0
+    decoded = 0
+
+    try:
+        for chunk in chunks:
+            buffer += chunk
+
+            while frame <= last and len(buffer) >= index.offsets[frame + 1] - index.offsets[frame]:
+                frame_length = index.offsets[frame + 1] - index.offsets[frame]
+
+                started = time.perf_counter()
+                data = codec.decompress(bytes(buffer[:frame_length]))
+                elapsed += time.perf_counter() - started
+                del buffer[:frame_length]
+
+                frame_start = frame * index.frame_size
+                piece = data[max(start - frame_start, 0):stop - frame_start]
+                decoded += len(piece)
+                frame += 1
+                yield piece
+    finally:
+        chunks.close()
+        metrics.increment('storage_codec.decompressed_bytes', decoded)
+        metrics.observe('storage_codec.decompress_seconds', elapsed)
@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional
+from bson import ObjectId
+from gridfs import GridFS, GridOut
+from gridfs.errors import NoFile
+from pymongo import ASCENDING
+from .base import StorageBackend, BlobStat
+
+
+class GridFSBackend(StorageBackend):
+    """Blob storage in MongoDB GridFS (fs.files / fs.chunks)"""
+
+    name = 'gridfs'
+
+    def __init__(self, mongo_db, chunk_size: int):
+        super().__init__(chunk_size)
+        self._mongo_db = mongo_db
+        self._gridfs = GridFS(mongo_db)
+        self._files = mongo_db['fs.files']
+        self._chunks = mongo_db['fs.chunks']
+        self._chunks_indexed = False
+
+    def put_stream(self, stream: IO[bytes], filename: Optional[str] = None, content_type: Optional[str] = None,
+                   max_size: Optional[int] = None, file_id: Optional[str] = None) -> Dict[str, Any]:
+        options = {'filename': filename, 'content_type': content_type, 'chunk_size': self.chunk_size}
+        if file_id is not None:
+            options['_id'] = ObjectId(file_id)
+
+        grid_in = self._gridfs.new_file(**options)
+
+        try:
+            result = self._copy_stream(stream, grid_in.write, self.chunk_size, max_size)
+            if not result['success']:
+                grid_in.abort()
+                return result
+
+            grid_in.close()
+
+        except Exception:
+            grid_in.abort()
+            raise
+
+        result['gridfs_file_id'] = str(grid_in._id)
+        return result
+
+    def open_range(self, file_id: str, start: int = 0, stop: Optional[int] = None) -> Optional[Iterator[bytes]]:
+        try:
+            grid_out = self._gridfs.get(ObjectId(file_id))
+        except NoFile:
+            return None
+
+        if stop is None or stop > grid_out.length:
+            stop = grid_out.length
+
+        return self._iter_grid_out(grid_out, start, stop)
+
+    @staticmethod
+    def _iter_grid_out(grid_out: GridOut, start: int, stop: int) -> Iterator[bytes]:
+        """Yield the bytes of grid_out in [start, stop), one GridFS chunk at a time"""
+        try:
+            grid_out.seek(start)
+            remaining = stop - start
+
+            while remaining > 0:
+                chunk = grid_out.readchunk()
+                if not chunk:
+                    break
+
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            grid_out.close()
+
+    def delete(self, file_id: str) -> None:
+        self._gridfs.delete(ObjectId(file_id))
+
+    def delete_many(self, file_ids: List[str]) -> None:
+        # Two round trips for the whole batch instead of two per blob; files first
+        # so a half-finished delete never leaves a readable but truncated blob
+        object_ids = [ObjectId(file_id) for file_id in file_ids]
+        self._files.delete_many({'_id': {'$in': object_ids}})
+        self._chunks.delete_many({'files_id': {'$in': object_ids}})
+
+    def stat(self, file_id: str) -> Optional[BlobStat]:
+        document = self._files.find_one({'_id': ObjectId(file_id)}, {'length': 1, 'uploadDate': 1})
+        if document is None:
+            return None
+
+        return BlobStat(file_id, document['length'], document.get('uploadDate'))
+
+    def iter_file_ids(self) -> Iterator[str]:
+        cursor = self._files.find({}, {'_id': 1}).sort('_id', ASCENDING).batch_size(10000)
+        for document in cursor:
+            yield str(document['_id'])
+
+    def _ensure_chunks_index(self) -> None:
+        """Create the (files_id, n) index GridFS relies on (GridIn does this for normal uploads)"""
+        if not self._chunks_indexed:
+            keys = [('files_id', ASCENDING), ('n', ASCENDING)]
+            existing = [list(index['key']) for index in self._chunks.index_information().values()]
+            if keys not in existing:
+                self._chunks.create_index(keys, unique=True)
+            self._chunks_indexed = True
+
+    def write_part(self, file_id: str, offset: int, data: bytes) -> None:
+        self._ensure_chunks_index()
+        self._chunks.insert_one({'files_id': ObjectId(file_id), 'n': offset // self.chunk_size, 'data': data})
+
+    def truncate_part(self, file_id: str, offset: int) -> None:
+        self._chunks.delete_many({'files_id': ObjectId(file_id), 'n': {'$gte': offset // self.chunk_size}})
+
+    def complete_part(self, file_id: str, length: int, filename: Optional[str] = None,
+                      content_type: Optional[str] = None) -> None:
+        files_id = ObjectId(file_id)
+        self._files.replace_one({'_id': files_id}, {
+            '_id': files_id,
+            'length': length,
+            'chunkSize': self.chunk_size,
+            'uploadDate': datetime.utcnow(),
+            'filename': filename,
+            'contentType': content_type
+        }, upsert=True)
+
+    def discard_parts(self, file_ids: List[str]) -> None:
+        self._chunks.delete_many({'files_id': {'$in': [ObjectId(file_id) for file_id in file_ids]}})
+
+    def iter_part_ids(self) -> Iterator[str]:
+        # Every files_id that owns chunks; grouping is done server-side and spills to disk if needed
+        cursor = self._chunks.aggregate([
+            {'$group': {'_id': '$files_id'}},
+            {'$sort': {'_id': ASCENDING}}
+        ], allowDiskUse=True, batchSize=10000)
+        for document in cursor:
+            yield str(document['_id'])
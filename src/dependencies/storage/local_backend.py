@@ -0,0 +1,157 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional
+from bson import ObjectId
+from .base import StorageBackend, BlobStat
+
+
+class LocalBackend(StorageBackend):
+    """
+    Blob storage in a sharded directory tree on local or NFS disk
+
+    A blob with ID "65a1b2c3..." lives at <root>/65/a1/65a1b2c3.... The shard
+    levels are taken from the start of the ID, so walking the tree in name order
+    yields IDs in ascending order (see iter_file_ids).
+    """
+
+    name = 'local'
+    is_local = True
+
+    TEMP_DIR = '.tmp'
+    PARTIAL_DIR = '.partial'
+
+    def __init__(self, root: str, chunk_size: int):
+        super().__init__(chunk_size)
+        self.root = root
+        os.makedirs(os.path.join(root, self.TEMP_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, self.PARTIAL_DIR), exist_ok=True)
+
+    def _path(self, file_id: str) -> str:
+        return os.path.join(self.root, file_id[0:2], file_id[2:4], file_id)
+
+    def _partial_path(self, file_id: str) -> str:
+        return os.path.join(self.root, self.PARTIAL_DIR, file_id)
+
+    def _publish(self, source_path: str, file_id: str) -> None:
+        """Atomically move a fully written file into its shard"""
+        path = self._path(file_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def put_stream(self, stream: IO[bytes], filename: Optional[str] = None, content_type: Optional[str] = None,
+                   max_size: Optional[int] = None, file_id: Optional[str] = None) -> Dict[str, Any]:
+        file_id = file_id or str(ObjectId())
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, self.TEMP_DIR))
+
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                result = self._copy_stream(stream, temp_file.write, self.chunk_size, max_size)
+                if result['success']:
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+
+            if result['success']:
+                self._publish(temp_path, file_id)
+                result['gridfs_file_id'] = file_id
+
+            return result
+
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def open_range(self, file_id: str, start: int = 0, stop: Optional[int] = None) -> Optional[Iterator[bytes]]:
+        try:
+            blob_file = open(self._path(file_id), 'rb')
+        except FileNotFoundError:
+            return None
+
+        length = os.fstat(blob_file.fileno()).st_size
+        if stop is None or stop > length:
+            stop = length
+
+        return self._iter_file(blob_file, start, stop)
+
+    def _iter_file(self, blob_file, start: int, stop: int) -> Iterator[bytes]:
+        """Yield bytes [start, stop) of an open file in chunk_size pieces"""
+        try:
+            blob_file.seek(start)
+            remaining = stop - start
+
+            while remaining > 0:
+                piece = blob_file.read(min(self.chunk_size, remaining))
+                if not piece:
+                    break
+
+                remaining -= len(piece)
+                yield piece
+        finally:
+            blob_file.close()
+
+    def delete(self, file_id: str) -> None:
+        try:
+            os.unlink(self._path(file_id))
+        except FileNotFoundError:
+            pass
+
+    def stat(self, file_id: str) -> Optional[BlobStat]:
+        try:
+            stat = os.stat(self._path(file_id))
+        except FileNotFoundError:
+            return None
+
+        return BlobStat(file_id, stat.st_size, datetime.utcfromtimestamp(stat.st_mtime))
+
+    def local_path(self, file_id: str) -> Optional[str]:
+        path = self._path(file_id)
+        return path if os.path.exists(path) else None
+
+    def iter_file_ids(self) -> Iterator[str]:
+        for first in self._sorted_subdirs(self.root):
+            for second in self._sorted_subdirs(os.path.join(self.root, first)):
+                shard = os.path.join(self.root, first, second)
+                yield from sorted(entry.name for entry in os.scandir(shard) if entry.is_file())
+
+    @staticmethod
+    def _sorted_subdirs(path: str) -> List[str]:
+        """Shard directories below path (skipping .tmp/.partial) in name order"""
+        return sorted(
+            entry.name for entry in os.scandir(path)
+            if entry.is_dir() and not entry.name.startswith('.')
+        )
+
+    def write_part(self, file_id: str, offset: int, data: bytes) -> None:
+        fd = os.open(self._partial_path(file_id), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, data, offset)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def truncate_part(self, file_id: str, offset: int) -> None:
+        try:
+            os.truncate(self._partial_path(file_id), offset)
+        except FileNotFoundError:
+            pass
+
+    def complete_part(self, file_id: str, length: int, filename: Optional[str] = None,
+                      content_type: Optional[str] = None) -> None:
+        partial_path = self._partial_path(file_id)
+
+        # Published by an earlier attempt whose finalize failed after this step
+        if not os.path.exists(partial_path) and os.path.exists(self._path(file_id)):
+            return
+
+        self._publish(partial_path, file_id)
+
+    def iter_part_ids(self) -> Iterator[str]:
+        partial_dir = os.path.join(self.root, self.PARTIAL_DIR)
+        yield from sorted(entry.name for entry in os.scandir(partial_dir) if entry.is_file())
+
+    def discard_parts(self, file_ids: List[str]) -> None:
+        for file_id in file_ids:
+            try:
+                os.unlink(self._partial_path(file_id))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from .app_config import get_config
+from .metrics import get_metrics
+
+# User columns kept in the cache (everything current_user needs, never the password hash)
+CACHED_COLUMNS = ('id', 'username', 'email', 'role', 'full_name', 'created_at', 'updated_at')
+DATETIME_COLUMNS = ('created_at', 'updated_at')
+
+
+class SharedStore(ABC):
+    """Key/value store shared by every app process, with per-entry expiry"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Get the value stored under key, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        """Store value under key for ttl_seconds"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key (no error if missing)"""
+
+
+class MemoryStore(SharedStore):
+    """In-process stand-in for a shared store (tests, benchmarks and single-process deployments)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, float]] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[0]
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class MongoStore(SharedStore):
+    """Shared store in a MongoDB collection (expired documents are also removed by a TTL index)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def get(self, key: str) -> Optional[str]:
+        # The TTL monitor only runs once a minute: check expiry on read too
+        document = self.collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+        return document['value'] if document else None
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        self.collection.replace_one(
+            {'_id': key},
+            {'value': value, 'expires_at': datetime.utcnow() + timedelta(seconds=ttl_seconds)},
+            upsert=True
+        )
+
+    def delete(self, key: str) -> None:
+        self.collection.delete_one({'_id': key})
+
+
+class UserCache:
+    """
+    Cache of User column values by user ID: a TTL-bounded LRU in each process, optionally
+    backed by a shared store
+
+    Invalidation clears this process's entry and the shared one; other processes may keep
+    serving their local copy until it expires, so ttl_seconds bounds how long a changed
+    role or deleted account can be seen there. If the shared store fails, the cache carries
+    on with the local entries alone.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, shared_store: Optional[SharedStore] = None,
+                 shared_ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_store = shared_store
+        self.shared_ttl_seconds = shared_ttl_seconds or ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[int, Tuple[Dict[str, Any], float]]' = OrderedDict()  # least recent first
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f'user:{user_id}'
+
+    @staticmethod
+    def _dumps(values: Dict[str, Any]) -> str:
+        return json.dumps({
+            name: value.isoformat() if name in DATETIME_COLUMNS and value is not None else value
+            for name, value in values.items()
+        })
+
+    @staticmethod
+    def _loads(payload: str) -> Dict[str, Any]:
+        values = json.loads(payload)
+        for name in DATETIME_COLUMNS:
+            if values.get(name) is not None:
+                values[name] = datetime.fromisoformat(values[name])
+        return values
+
+    def _call_shared(self, method: str, *args) -> Any:
+        """Call a shared store method, logging failures (which then count as a miss)"""
+        try:
+            return getattr(self.shared_store, method)(*args)
+        except Exception as e:
+            get_metrics().increment('user_cache.shared_errors')
+            print(f"User cache shared store {method} failed: {str(e)}")
+            return None
+
+    def _put_local(self, user_id: int, values: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[user_id] = (values, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            get_metrics().set_gauge('user_cache.entries', len(self._entries))
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get the cached column values of a user (marking them recently used), or None on a miss"""
+        metrics = get_metrics()
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                metrics.increment('user_cache.hits')
+                return entry[0]
+            self._entries.pop(user_id, None)
+
+        if self.shared_store is not None:
+            payload = self._call_shared('get', self._key(user_id))
+            if payload is not None:
+                values = self._loads(payload)
+                self._put_local(user_id, values)
+                metrics.increment('user_cache.shared_hits')
+                return values
+
+        metrics.increment('user_cache.misses')
+        return None
+
+    def put(self, user_id: int, values: Dict[str, Any]) -> None:
+        """Cache the column values of a user loaded from the database"""
+        self._put_local(user_id, values)
+        if self.shared_store is not None:
+            self._call_shared('set', self._key(user_id), self._dumps(values), self.shared_ttl_seconds)
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user from the cache (called when the user is updated or deleted)"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            get_metrics().set_gauge('user_cache.entries', len(self._entries))
+        if self.shared_store is not None:
+            # If this fails, the shared entry is only dropped when it expires (shared_ttl_seconds)
+            self._call_shared('delete', self._key(user_id))
+
+
+# Global cache instance (None when the cache is disabled)
+_user_cache: Optional[UserCache] = None
+
+
+def create_shared_store(name: Optional[str]) -> Optional[SharedStore]:
+    """Create a shared store by name ('mongodb' or 'memory'), or None for 'none'"""
+    if name in (None, 'none'):
+        return None
+
+    if name == 'memory':
+        return MemoryStore()
+
+    if name == 'mongodb':
+        from .database import get_mongo_db
+        return MongoStore(get_mongo_db()['user_cache'])
+
+    raise ValueError(f"Unknown user cache shared store: {name}")
+
+
+def init_user_cache() -> None:
+    """Initialize the user cache from the user_cache configuration"""
+    global _user_cache
+    config = get_config()
+
+    if not config.get('user_cache.enabled', True):
+        _user_cache = None
+        return
+
+    _user_cache = UserCache(
+        max_entries=config.get('user_cache.max_entries', 10000),
+        ttl_seconds=config.get('user_cache.ttl_seconds', 30),
+        shared_store=create_shared_store(config.get('user_cache.shared_store', 'none')),
+        shared_ttl_seconds=config.get('user_cache.shared_ttl_seconds', 60)
+    )
+
+
+def get_user_cache() -> Optional[UserCache]:
+    """Get user cache instance (None when disabled)"""
+    return _user_cache
@@ -0,0 +1,239 @@
+import struct
+import subprocess
+import threading
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+# Peaks file layout (little endian): header, one (samples_per_peak, peak_count) entry
+# per level, then each level's (min, max) pairs as int8 or int16, finest level first
+PEAKS_MAGIC = b'AFPK'
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct('<4sBBBxIQ')  # magic, version, bits, level count, sample rate, frames
+PEAKS_LEVEL = struct.Struct('<II')  # samples per peak, peak count
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class Peaks(NamedTuple):
+    """Min/max envelope of a file at one zoom level (floats in [-1, 1])"""
+    samples_per_peak: int
+    mins: np.ndarray
+    maxs: np.ndarray
+
+
+def _read_exact(stream: IO[bytes], size: int) -> bytes:
+    """Read exactly size bytes (fewer only at the end of the stream)"""
+    parts = []
+    while size > 0:
+        part = stream.read(size)
+        if not part:
+            break
+        parts.append(part)
+        size -= len(part)
+    return b''.join(parts)
+
+
+def _skip(stream: IO[bytes], size: int) -> None:
+    while size > 0:
+        part = stream.read(min(size, 64 * 1024))
+        if not part:
+            break
+        size -= len(part)
+
+
+def _wav_dtype(format_tag: int, bits: int) -> Tuple[Optional[np.dtype], float]:
+    """numpy dtype and full-scale value of a WAV sample format (dtype None for 24-bit PCM)"""
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        return np.dtype(f'<f{bits // 8}'), 1.0
+    if format_tag == WAVE_FORMAT_PCM:
+        if bits == 8:
+            return np.dtype('u1'), 128.0  # 8-bit WAV is unsigned, centred on 128
+        if bits == 24:
+            return None, float(1 << 23)
+        if bits in (16, 32):
+            return np.dtype(f'<i{bits // 8}'), float(1 << (bits - 1))
+    raise ValueError(f'Unsupported WAV sample format {format_tag:#x} ({bits} bit)')
+
+
+def iter_wav_blocks(stream: IO[bytes], block_frames: int) -> Tuple[int, Iterator[np.ndarray]]:
+    """
+    Read a WAV header from stream, returning the sample rate and an iterator over
+    blocks of at most block_frames frames as float32 arrays of shape (frames, channels)
+    Only the data chunk is read after the header, one block at a time
+    """
+    header = _read_exact(stream, 12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise ValueError('Not a WAV file')
+
+    fmt = None
+    while True:
+        chunk_header = _read_exact(stream, 8)
+        if len(chunk_header) < 8:
+            raise ValueError('WAV file has no data chunk')
+
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+        if chunk_id == b'data':
+            break
+
+        if chunk_id == b'fmt ':
+            fmt = _read_exact(stream, chunk_size)
+            _skip(stream, chunk_size & 1)
+        else:
+            _skip(stream, chunk_size + (chunk_size & 1))
+
+    if fmt is None or len(fmt) < 16:
+        raise ValueError('WAV file has no fmt chunk before its data')
+
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag, = struct.unpack('<H', fmt[24:26])  # First two bytes of the sub-format GUID
+
+    dtype, full_scale = _wav_dtype(format_tag, bits)
+    if not channels or block_align != channels * bits // 8:
+        raise ValueError('Inconsistent WAV fmt chunk')
+
+    # Streamed WAVs may leave the data size at 0/0xFFFFFFFF: read to the end
+    remaining = None if chunk_size in (0, 0xFFFFFFFF) else chunk_size
+
+    def blocks() -> Iterator[np.ndarray]:
+        nonlocal remaining
+        while remaining is None or remaining > 0:
+            size = block_frames * block_align
+            if remaining is not None:
+                size = min(size, remaining)
+
+            data = _read_exact(stream, size)
+            data = data[:len(data) - len(data) % block_align]
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+
+            if dtype is None:
+                # 24-bit: assemble little-endian 3-byte samples and sign-extend
+                raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+                samples = np.where(samples & 0x800000, samples - (1 << 24), samples)
+            else:
+                samples = np.frombuffer(data, dtype=dtype)
+
+            samples = samples.astype(np.float32)
+            if dtype == np.uint8:
+                samples -= 128.0
+            yield (samples / full_scale).reshape(-1, channels)
+
+    return sample_rate, blocks()
+
+
+def iter_ffmpeg_blocks(chunks: Iterable[bytes], ffmpeg_path: str, sample_rate: int,
+                       block_frames: int) -> Iterator[np.ndarray]:
+    """
+    Decode any format ffmpeg understands to mono 16-bit PCM at sample_rate, yielding
+    float32 blocks of shape (frames, 1); the input is fed from a thread as it is read
+    """
+    process = subprocess.Popen(
+        [ffmpeg_path, '-v', 'error', '-i', 'pipe:0', '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+
+    def feed() -> None:
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg stopped reading (done or failed; its exit status tells)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='waveform-ffmpeg-feed', daemon=True)
+    feeder.start()
+
+    try:
+        while True:
+            data = _read_exact(process.stdout, block_frames * 2)
+            data = data[:len(data) - len(data) % 2]
+            if not data:
+                break
+            yield (np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0).reshape(-1, 1)
+
+        if process.wait() != 0:
+            raise ValueError(f'ffmpeg exited with status {process.returncode}')
+
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        feeder.join()
+
+
+def compute_peaks(blocks: Iterable[np.ndarray], levels: List[int]) -> Tuple[int, List[Peaks]]:
+    """
+    Compute min/max peaks at every zoom level (samples per peak, ascending multiples of
+    the first) from PCM blocks. Only the finest level is computed from the samples; the
+    coarser ones are reduced from it. Returns (total frames, peaks per level)
+    """
+    finest = levels[0]
+    if any(level % finest for level in levels):
+        raise ValueError('Peak levels must be multiples of the finest level')
+
+    mins: List[np.ndarray] = []
+    maxs: List[np.ndarray] = []
+    pending_low = pending_high = np.empty(0, dtype=np.float32)
+    frames = 0
+
+    for block in blocks:
+        frames += len(block)
+
+        # Envelope across channels per frame, then per window of `finest` frames
+        low = np.concatenate((pending_low, block.min(axis=1)))
+        high = np.concatenate((pending_high, block.max(axis=1)))
+        full = len(low) - len(low) % finest
+
+        mins.append(low[:full].reshape(-1, finest).min(axis=1))
+        maxs.append(high[:full].reshape(-1, finest).max(axis=1))
+        pending_low, pending_high = low[full:], high[full:]
+
+    if len(pending_low):
+        mins.append(pending_low.min(keepdims=True))
+        maxs.append(pending_high.max(keepdims=True))
+
+    level_mins = np.concatenate(mins) if mins else np.empty(0, dtype=np.float32)
+    level_maxs = np.concatenate(maxs) if maxs else np.empty(0, dtype=np.float32)
+
+    peaks = []
+    for level in levels:
+        factor = level // finest
+        if factor == 1 or not len(level_mins):
+            peaks.append(Peaks(level, level_mins, level_maxs))
+        else:
+            starts = np.arange(0, len(level_mins), factor)
+            peaks.append(Peaks(level, np.minimum.reduceat(level_mins, starts),
+                               np.maximum.reduceat(level_maxs, starts)))
+
+    return frames, peaks
+
+
+def pack_peaks(sample_rate: int, frames: int, peaks: List[Peaks], bits: int = 8) -> bytes:
+    """Quantize peaks to int8/int16 and serialize them in the peaks file layout"""
+    if bits not in (8, 16):
+        raise ValueError('Peaks can be stored with 8 or 16 bits')
+
+    scale = (1 << (bits - 1)) - 1
+    dtype = np.dtype('i1') if bits == 8 else np.dtype('<i2')
+
+    parts = [PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, bits, len(peaks), sample_rate, frames)]
+    parts.extend(PEAKS_LEVEL.pack(level.samples_per_peak, len(level.mins)) for level in peaks)
+
+    for level in peaks:
+        pairs = np.empty(2 * len(level.mins), dtype=np.float32)
+        pairs[0::2] = level.mins
+        pairs[1::2] = level.maxs
+        parts.append(np.clip(np.round(pairs * scale), -scale - 1, scale).astype(dtype).tobytes())
+
+    return b''.join(parts)
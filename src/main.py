@@ -10,6 +10,7 @@ from flask_login import LoginManager
 from dependencies.app_config import load_config, get_config
 from dependencies.database import init_db
 from routers import auth_bp, admin_bp, audio_bp
+from commands import register_commands, start_background_workers
 from services.auth_service import AuthService
 
 
@@ -38,13 +39,16 @@ def create_app():
     @login_manager.user_loader
     def load_user(user_id):
         """Load user by ID for Flask-Login"""
-        return AuthService.get_user_by_id(int(user_id))
+        return AuthService.load_user(int(user_id))
 
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(audio_bp)
 
+    # Register maintenance CLI commands
+    register_commands(app)
+
     # Root route - redirect to login or audio files
     @app.route('/')
     def index():
@@ -61,5 +65,10 @@ if __name__ == '__main__':
     port = config.get('app.port', 5000)
     debug = config.get('app.debug', False)
 
+    # Background workers run in the serving process only: not in CLI commands (which also
+    # call create_app), and not in the debug reloader's parent, which only watches for changes
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers(app)
+
     print(f"Starting Flask application on {host}:{port}")
     app.run(host=host, port=port, debug=debug)
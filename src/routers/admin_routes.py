@@ -4,7 +4,8 @@ from functools import wraps
 from pydantic import ValidationError
 
 from services.user_service import UserService
-from basemodels.user import UserCreateRequest, UserUpdateRequest
+from dependencies.metrics import get_metrics
+from basemodels.user import UserCreateRequest, UserListQuery, UserUpdateRequest
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -24,9 +25,24 @@ def admin_required(f):
 @admin_bp.route('/users')
 @admin_required
 def users():
-    """Admin page to view all users"""
-    all_users = UserService.get_all_users()
-    return render_template('admin_users.html', users=all_users)
+    """
+    Admin page to view users - one page at a time, by username
+    Query parameters: q (username/email search), cursor (next page) and limit
+    """
+    try:
+        query = UserListQuery(**request.args.to_dict())
+    except ValidationError:
+        flash('Invalid listing parameters', 'error')
+        return redirect(url_for('admin.users'))
+
+    result = UserService.list_users(query.q, query.limit, query.cursor)
+
+    if not result['success']:
+        flash(result['message'], 'error')
+        return redirect(url_for('admin.users', q=query.q))
+
+    return render_template('admin_users.html', users=result['users'], listing=query,
+                           next_cursor=result['next_cursor'])
 
 
 @admin_bp.route('/users/create', methods=['POST'])
@@ -128,3 +144,10 @@ def get_user(user_id):
         })
     else:
         return jsonify({'error': 'User not found'}), 404
+
+
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def metrics():
+    """Get in-process metrics (cache hit/miss counters etc.) as JSON"""
+    return jsonify(get_metrics().snapshot())
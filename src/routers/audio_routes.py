@@ -1,18 +1,277 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, jsonify
 from flask_login import login_required, current_user
-from io import BytesIO
+from pydantic import ValidationError
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Iterator, Optional
+from urllib.parse import quote
+from werkzeug.wsgi import wrap_file
+import mmap
+import unicodedata
 
 from services.audio_service import AudioService
+from dependencies.app_config import get_config
+from dependencies.constants import UPLOAD_CHUNK_SIZE_BYTES
+from dependencies.metrics import get_metrics
+from services.upload_session_service import UploadSessionService
+from services.bulk_upload_service import BulkUploadService
+from services.zip_export_service import ZipExportService
+from services.waveform_service import WaveformService, PEAKS_MIMETYPE
+from services.preview_service import PreviewService
+from services.fingerprint_service import FingerprintService
+from services.usage_service import UsageService
+from dependencies.waveform import PEAKS_VERSION
+from basemodels.audio import (
+    AudioFileResponse, UploadByHashRequest, UploadSessionCreateRequest, BulkDeleteRequest, FileListQuery,
+    FileSearchQuery
+)
 
 audio_bp = Blueprint('audio', __name__, url_prefix='/audio')
 
 
+def _validators(audio_file):
+    """
+    Get the (etag, last_modified) validators of an audio file version
+    The strong ETag is the content hash (or the blob ID for files stored before
+    deduplication), so it changes whenever the bytes do; Last-Modified is
+    truncated to the one-second resolution of HTTP dates
+    """
+    etag = audio_file.content_hash or audio_file.gridfs_file_id
+    last_modified = audio_file.updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+    return etag, last_modified
+
+
+def _is_not_modified(etag: str, last_modified: datetime) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since for the current request
+    If-Modified-Since is ignored when If-None-Match is present (RFC 9110 13.2.2)
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+
+    if request.if_none_match:
+        # Weak comparison, as required for If-None-Match
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+
+    return False
+
+
+def _if_range_matches(etag: str, last_modified: datetime) -> bool:
+    """Check the If-Range validator (if any) against the current file version"""
+    if_range = request.if_range
+
+    if if_range.etag is not None:
+        # If-Range needs a strong match (RFC 9110 13.1.5), so a weak validator never matches;
+        # werkzeug drops the W/ prefix when parsing, hence the raw header check
+        if request.headers.get('If-Range', '').lstrip().startswith('W/'):
+            return False
+        return if_range.etag == etag
+
+    if if_range.date is not None:
+        return if_range.date == last_modified
+
+    return True
+
+
+def _resolve_range(length: int, etag: str, last_modified: datetime):
+    """
+    Resolve the Range header of the current request against a file of `length` bytes
+    Returns (status_code, start, stop): 200 for the whole file, 206 for a single
+    satisfiable range and 416 (start/stop None) for an unsatisfiable one
+    """
+    byte_range = request.range
+
+    # Missing/invalid headers, multipart ranges and stale If-Range all get the full file
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return 200, 0, length
+
+    if not _if_range_matches(etag, last_modified):
+        return 200, 0, length
+
+    start, stop = byte_range.ranges[0]
+
+    if start < 0:
+        # Suffix range ("bytes=-N"): the last N bytes, or the whole file if N >= length
+        start = max(length + start, 0)
+        stop = length
+    elif stop is None or stop > length:
+        stop = length
+
+    if start >= stop:
+        return 416, None, None
+
+    return 206, start, stop
+
+
+def _content_disposition(filename: str) -> dict:
+    """Build Content-Disposition parameters, adding filename* for non-ASCII names"""
+    try:
+        filename.encode('ascii')
+        return {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='')}"}
+
+
+def _iter_mmap(local_file, start: int, stop: int) -> Iterator[bytes]:
+    """Yield bytes [start, stop) of a local file from a read-only memory map"""
+    try:
+        with mmap.mmap(local_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(start, stop, UPLOAD_CHUNK_SIZE_BYTES):
+                yield mapped[offset:min(offset + UPLOAD_CHUNK_SIZE_BYTES, stop)]
+    finally:
+        local_file.close()
+
+
+def _open_local(path: str, start: int, stop: int, length: int) -> Optional[Iterator[bytes]]:
+    """
+    Serve bytes from a blob on local disk (local storage backend or blob cache)
+    Ranges running to the end of the file go through the server's wsgi.file_wrapper
+    (os.sendfile under gunicorn); bounded ranges are sliced from an mmap
+    Returns None if the file disappeared in the meantime
+    """
+    try:
+        local_file = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    if stop == length:
+        local_file.seek(start)
+        return wrap_file(request.environ, local_file, buffer_size=UPLOAD_CHUNK_SIZE_BYTES)
+
+    return _iter_mmap(local_file, start, stop)
+
+
+def _stream_file(audio_file, as_attachment: bool, preview=None):
+    """
+    Build a streamed (optionally partial) response for an audio file, or for its
+    preview rendition if one is given (see PreviewService.get_preview)
+    Bytes are served from local disk when possible (local backend or blob cache),
+    otherwise they are read from storage one chunk at a time as the client consumes them
+    Conditional requests are answered with 304 from the metadata row alone
+    """
+    etag, last_modified = _validators(audio_file)
+    file_id, storage_codec = audio_file.gridfs_file_id, audio_file.storage_codec
+    length, content_type = audio_file.file_size, audio_file.content_type
+
+    if preview is not None:
+        etag = f'{etag}-preview'
+        file_id, storage_codec = preview.preview_file_id, None
+        length, content_type = preview.preview_size, preview.preview_content_type
+
+    cache_control = get_config().get('http.audio_cache_control', 'private, no-cache')
+
+    if _is_not_modified(etag, last_modified):
+        get_metrics().increment('http.audio_not_modified')
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    status, start, stop = _resolve_range(length, etag, last_modified)
+
+    if status == 416:
+        return Response(
+            status=416,
+            headers={
+                'Accept-Ranges': 'bytes',
+                'Content-Range': f'bytes */{length}'
+            }
+        )
+
+    chunks = None
+    local_path = AudioService.get_local_path(file_id, storage_codec)
+
+    if local_path is not None:
+        chunks = _open_local(local_path, start, stop, length)
+
+    if chunks is None:
+        chunks = AudioService.open_stream(file_id, start, stop, storage_codec)
+
+    if chunks is None:
+        flash('File data not found', 'error')
+        return redirect(url_for('audio.files'))
+
+    response = Response(
+        chunks,
+        status=status,
+        mimetype=content_type,
+        direct_passthrough=True
+    )
+    response.headers.set(
+        'Content-Disposition',
+        'attachment' if as_attachment else 'inline',
+        **_content_disposition(audio_file.filename)
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.content_length = stop - start
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+
+    return response
+
+
 @audio_bp.route('/files')
 @login_required
 def files():
-    """Audio files page - view all user's audio files"""
-    user_files = AudioService.get_user_files(current_user.id)
-    return render_template('audio_files.html', files=user_files)
+    """
+    Audio files page - one page of the user's audio files
+    Query parameters: q (name search, best matches first) or sort (date, name, size) and
+    order (asc, desc), cursor (next page) and limit
+    """
+    try:
+        query = FileListQuery(**request.args.to_dict())
+    except ValidationError:
+        flash('Invalid listing parameters', 'error')
+        return redirect(url_for('audio.files'))
+
+    if query.q and query.q.strip():
+        result = AudioService.search_user_files(current_user.id, query.q, query.limit, query.cursor)
+    else:
+        query.q = None
+        result = AudioService.list_user_files(current_user.id, query.sort, query.order == 'desc',
+                                              query.limit, query.cursor)
+
+    if not result['success']:
+        flash(result['message'], 'error')
+        return redirect(url_for('audio.files', q=query.q, sort=query.sort, order=query.order))
+
+    return render_template('audio_files.html', files=result['files'], listing=query,
+                           next_cursor=result['next_cursor'], usage=UsageService.get_usage(current_user.id))
+
+
+@audio_bp.route('/files/search')
+@login_required
+def search_files():
+    """
+    Search the user's files by name (JSON API)
+    Returns the best matches first with their similarity score, and next_cursor for the next page
+    """
+    try:
+        query = FileSearchQuery(**request.args.to_dict())
+    except ValidationError as e:
+        errors = [{'field': err['loc'][0], 'message': err['msg']} for err in e.errors()]
+        return jsonify({'error': 'Invalid request', 'details': errors}), 400
+
+    result = AudioService.search_user_files(current_user.id, query.q, query.limit, query.cursor)
+    if not result['success']:
+        return jsonify({'error': result['message']}), 400
+
+    return jsonify({
+        'files': [
+            dict(AudioFileResponse.model_validate(audio_file).model_dump(mode='json'), score=score)
+            for audio_file, score in zip(result['files'], result['scores'])
+        ],
+        'next_cursor': result['next_cursor']
+    })
 
 
 @audio_bp.route('/upload', methods=['POST'])
@@ -25,7 +284,7 @@ def upload():
 
     file = request.files['file']
 
-    result = AudioService.upload_file(file, current_user.id)
+    result = AudioService.upload_file(file, current_user.id, request.content_length)
 
     if result['success']:
         flash('File uploaded successfully!', 'success')
@@ -35,31 +294,183 @@ def upload():
     return redirect(url_for('audio.files'))
 
 
+@audio_bp.route('/upload/bulk', methods=['POST'])
+@login_required
+def upload_bulk():
+    """
+    Upload many files at once (JSON API)
+    Accepts multipart `files` fields and/or an `archive` field (zip or tar), or a raw
+    zip/tar request body. Returns a per-file report, or 413 if the upload is over the size limit
+    """
+    # Reject what is known to be too large before reading (and spooling) any of it
+    max_size = BulkUploadService.max_size(current_user.id)
+    if request.content_length is not None and request.content_length > max_size:
+        return jsonify({'error': f'Upload too large. Maximum size: {max_size / (1024 * 1024):.1f} MB'}), 413
+
+    if request.mimetype == 'multipart/form-data':
+        entries = BulkUploadService.iter_uploaded_files(request.files.getlist('files'))
+
+        archive = request.files.get('archive')
+        if archive is not None:
+            is_zip = BulkUploadService.is_zip(archive.filename, archive.mimetype)
+            entries = chain(entries, BulkUploadService.iter_archive(archive.stream, is_zip, max_size))
+    else:
+        # Raw archive body, read as it arrives (tar) or spooled to disk (zip)
+        is_zip = BulkUploadService.is_zip(None, request.mimetype)
+        entries = BulkUploadService.iter_archive(request.stream, is_zip, max_size)
+
+    result = BulkUploadService.bulk_upload(entries, current_user.id)
+
+    for file_result in result['results']:
+        if 'file' in file_result:
+            file_result['file'] = AudioFileResponse.model_validate(file_result['file']).model_dump(mode='json')
+
+    body = {key: result[key] for key in ('message', 'uploaded', 'failed', 'results')}
+    if result.get('too_large'):
+        return jsonify(body), 413
+    return jsonify(body), 200 if result['success'] else 400
+
+
+@audio_bp.route('/upload/by-hash', methods=['POST'])
+@login_required
+def upload_by_hash():
+    """
+    Create a file from content the user already has a file of (JSON API), e.g. a copy
+    Returns 201 with the new file, or 404 if the bytes have to be uploaded
+    """
+    try:
+        upload_data = UploadByHashRequest(**(request.get_json(silent=True) or request.form.to_dict()))
+    except ValidationError as e:
+        errors = [f"{error['loc'][0]}: {error['msg']}" for error in e.errors()]
+        return jsonify({'error': 'Invalid request', 'details': errors}), 400
+
+    result = AudioService.upload_by_hash(upload_data, current_user.id)
+
+    if result['success']:
+        return jsonify(AudioFileResponse.model_validate(result['file']).model_dump(mode='json')), 201
+    elif result.get('missing'):
+        return jsonify({'error': result['message']}), 404
+    else:
+        return jsonify({'error': result['message']}), 400
+
+
+@audio_bp.route('/uploads', methods=['POST'])
+@login_required
+def create_upload_session():
+    """
+    Start a resumable upload (JSON API)
+    Clients then PATCH the bytes in chunk_size-aligned pieces and finalize
+    """
+    try:
+        session_data = UploadSessionCreateRequest(**(request.get_json(silent=True) or request.form.to_dict()))
+    except ValidationError as e:
+        errors = [f"{error['loc'][0]}: {error['msg']}" for error in e.errors()]
+        return jsonify({'error': 'Invalid request', 'details': errors}), 400
+
+    result = UploadSessionService.create_session(session_data, current_user.id)
+
+    if not result['success']:
+        return jsonify({'error': result['message']}), 400
+
+    upload_session = result['session']
+    response = jsonify(upload_session.to_dict())
+    response.status_code = 201
+    response.headers['Location'] = url_for('audio.upload_session', session_id=upload_session.id)
+    response.headers['Upload-Offset'] = str(upload_session.offset)
+    return response
+
+
+@audio_bp.route('/uploads/<session_id>', methods=['GET', 'HEAD'])
+@login_required
+def upload_session(session_id):
+    """Get the current offset of a resumable upload"""
+    upload_session = UploadSessionService.get_session(session_id, current_user.id)
+
+    if not upload_session:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+    response = jsonify(upload_session.to_dict())
+    response.headers['Upload-Offset'] = str(upload_session.offset)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@audio_bp.route('/uploads/<session_id>', methods=['PATCH'])
+@login_required
+def upload_session_chunk(session_id):
+    """
+    Append bytes to a resumable upload
+    The raw request body is written at the offset given by the Upload-Offset header
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+
+    result = UploadSessionService.append_chunk(session_id, current_user.id, offset, request.stream)
+
+    if result['success']:
+        response = jsonify({'offset': result['offset']})
+        response.headers['Upload-Offset'] = str(result['offset'])
+        return response
+    elif result.get('conflict'):
+        response = jsonify({'error': result['message'], 'offset': result['offset']})
+        response.headers['Upload-Offset'] = str(result['offset'])
+        return response, 409
+    elif result.get('not_found'):
+        return jsonify({'error': result['message']}), 404
+    else:
+        return jsonify({'error': result['message']}), 400
+
+
+@audio_bp.route('/uploads/<session_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload_session(session_id):
+    """Complete a resumable upload and create the audio file"""
+    result = UploadSessionService.finalize(session_id, current_user.id)
+
+    if result['success']:
+        return jsonify(AudioFileResponse.model_validate(result['file']).model_dump(mode='json')), 201
+    elif result.get('not_found'):
+        return jsonify({'error': result['message']}), 404
+    else:
+        return jsonify({'error': result['message']}), 409
+
+
+@audio_bp.route('/uploads/<session_id>', methods=['DELETE'])
+@login_required
+def abort_upload_session(session_id):
+    """Cancel a resumable upload"""
+    result = UploadSessionService.abort_session(session_id, current_user.id)
+
+    if result['success']:
+        return '', 204
+    elif result.get('not_found'):
+        return jsonify({'error': result['message']}), 404
+    else:
+        return jsonify({'error': result['message']}), 400
+
+
 @audio_bp.route('/files/<int:file_id>/play')
 @login_required
 def play(file_id):
-    """Stream/play an audio file"""
+    """
+    Stream/play an audio file
+    With ?quality=preview the low-bitrate preview rendition is streamed instead,
+    falling back to the original until the preview has been generated
+    """
     audio_file = AudioService.get_file_by_id(file_id)
 
     if not audio_file or audio_file.user_id != current_user.id:
         flash('File not found or access denied', 'error')
         return redirect(url_for('audio.files'))
 
-    # Get file data from GridFS
-    file_data = AudioService.get_file_data(audio_file.gridfs_file_id)
+    preview = None
+    if request.args.get('quality') == 'preview':
+        preview = PreviewService.get_preview(audio_file)
+        get_metrics().increment('http.audio_preview_served' if preview is not None else 'http.audio_preview_fallback')
 
-    if not file_data:
-        flash('File data not found', 'error')
-        return redirect(url_for('audio.files'))
-
-    # Return file as streaming response
-    return Response(
-        BytesIO(file_data),
-        mimetype=audio_file.content_type,
-        headers={
-            'Content-Disposition': f'inline; filename="{audio_file.filename}"'
-        }
-    )
+    return _stream_file(audio_file, as_attachment=False, preview=preview)
 
 
 @audio_bp.route('/files/<int:file_id>/download')
@@ -72,20 +483,126 @@ def download(file_id):
         flash('File not found or access denied', 'error')
         return redirect(url_for('audio.files'))
 
-    # Get file data from GridFS
-    file_data = AudioService.get_file_data(audio_file.gridfs_file_id)
+    return _stream_file(audio_file, as_attachment=True)
 
-    if not file_data:
-        flash('File data not found', 'error')
+
+@audio_bp.route('/files/<int:file_id>/peaks')
+@login_required
+def peaks(file_id):
+    """
+    Get the waveform peaks of an audio file (binary, see dependencies.waveform)
+    Generated in the background: 202 with Retry-After until they are stored, 404 if the
+    file can't be decoded. URLs carrying the content version (?v=<ETag>) never change
+    and are cached for long, others are revalidated like the audio
+    """
+    audio_file = AudioService.get_file_by_id(file_id)
+
+    if not audio_file or audio_file.user_id != current_user.id:
+        return jsonify({'error': 'File not found'}), 404
+
+    version, last_modified = _validators(audio_file)
+    etag = f'{version}-peaks{PEAKS_VERSION}'
+
+    config = get_config()
+    if request.args.get('v') == version:
+        cache_control = config.get('waveform.cache_control', 'private, max-age=31536000, immutable')
+    else:
+        cache_control = config.get('http.audio_cache_control', 'private, no-cache')
+
+    if _is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        result = WaveformService.get_peaks(audio_file)
+        if result.get('pending'):
+            response = jsonify({'message': result['message']})
+            response.status_code = 202
+            response.headers['Retry-After'] = str(int(config.get('waveform.interval_seconds', 10)))
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+
+        if not result['success']:
+            return jsonify({'error': result['message']}), 404 if result.get('unsupported') else 500
+
+        response = Response(result['peaks'], mimetype=PEAKS_MIMETYPE)
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+@audio_bp.route('/files/<int:file_id>/duplicates')
+@login_required
+def duplicates(file_id):
+    """
+    List the user's other files with the same content ('exact') or the same recording
+    in another encoding ('near', found by acoustic fingerprint in the background)
+    """
+    audio_file = AudioService.get_file_by_id(file_id)
+
+    if not audio_file or audio_file.user_id != current_user.id:
+        return jsonify({'error': 'File not found'}), 404
+
+    return jsonify({
+        'duplicates': [
+            {
+                'file': AudioFileResponse.model_validate(duplicate['file']).model_dump(mode='json'),
+                'match': duplicate['match'],
+                'score': duplicate['score']
+            }
+            for duplicate in FingerprintService.find_duplicates(audio_file)
+        ]
+    })
+
+
+@audio_bp.route('/files/export', methods=['GET', 'POST'])
+@login_required
+def export_files():
+    """
+    Download several files as one ZIP archive, streamed as it is built
+    Takes `ids` (repeated or comma-separated); without ids, exports all of the user's files
+    """
+    try:
+        file_ids = [int(file_id) for value in request.values.getlist('ids') for file_id in value.split(',') if file_id]
+    except ValueError:
+        flash('Invalid file IDs', 'error')
+        return redirect(url_for('audio.files'))
+
+    audio_files = AudioService.get_user_files(current_user.id, file_ids or None)
+
+    if not audio_files:
+        flash('No files to export', 'error')
         return redirect(url_for('audio.files'))
 
-    # Return file as download
-    return send_file(
-        BytesIO(file_data),
-        mimetype=audio_file.content_type,
-        as_attachment=True,
-        download_name=audio_file.filename
+    response = Response(
+        ZipExportService.stream_zip(ZipExportService.export_entries(audio_files)),
+        mimetype='application/zip',
+        direct_passthrough=True
     )
+    response.headers.set('Content-Disposition', 'attachment', filename='audio-files.zip')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@audio_bp.route('/files/delete', methods=['POST'])
+@login_required
+def delete_bulk():
+    """
+    Delete several files at once (JSON API: {"ids": [...]})
+    Returns the deleted IDs and the IDs that were not found
+    """
+    try:
+        delete_data = BulkDeleteRequest(**(request.get_json(silent=True) or {'ids': request.form.getlist('ids')}))
+    except ValidationError as e:
+        errors = [f"{error['loc'][0]}: {error['msg']}" for error in e.errors()]
+        return jsonify({'error': 'Invalid request', 'details': errors}), 400
+
+    result = AudioService.delete_files(delete_data.ids, current_user.id)
+
+    if not result['success']:
+        return jsonify({'error': result['message']}), 500
+
+    return jsonify({key: result[key] for key in ('message', 'deleted', 'not_found')})
 
 
 @audio_bp.route('/files/<int:file_id>/update', methods=['POST'])
@@ -98,7 +615,7 @@ def update(file_id):
 
     file = request.files['file']
 
-    result = AudioService.update_file(file_id, current_user.id, file)
+    result = AudioService.update_file(file_id, current_user.id, file, request.content_length)
 
     if result['success']:
         flash('File updated successfully!', 'success')
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, current_user
 from pydantic import ValidationError
 
 from services.auth_service import AuthService
+from dependencies.password_hasher import PasswordHasherBusyError
 from basemodels.auth import LoginRequest, SignupRequest
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -47,6 +48,9 @@ def login():
         except ValidationError as e:
             flash('Invalid input data', 'error')
 
+        except PasswordHasherBusyError:
+            flash('Too many sign-ins right now, please try again in a moment', 'error')
+
     return render_template('login.html')
 
 
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import select, update, func, bindparam
+from dbentities.audio_file import AudioFile
+from dependencies.database import get_db_session
+from services.audio_service import AudioService
+
+
+class AudioMetadataService:
+    """Service for filling the header metadata columns (duration, bitrate, ...) of existing audio files"""
+
+    @staticmethod
+    def _probe(blob) -> Dict[str, Any]:
+        """Read the metadata of one blob (runs in a pool thread)"""
+        return AudioService.probe_metadata(blob.gridfs_file_id, blob.storage_codec, blob.filename, blob.file_size)
+
+    @staticmethod
+    def backfill(batch_size: int = 500, workers: int = 8, force: bool = False,
+                 on_progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """
+        Read header metadata for every blob with files still missing it (all files with force)
+        Batches are selected by blob ID, so files sharing a blob are probed once and the
+        run ends even if some blobs can't be parsed (those are retried on the next run)
+        Returns counts of probed blobs, updated files and blobs without usable metadata
+        """
+        db = get_db_session()
+        counts = {'blobs': 0, 'files': 0, 'unknown': 0}
+        last_file_id = ''
+
+        statement = update(AudioFile.__table__).where(
+            AudioFile.__table__.c.gridfs_file_id == bindparam('blob_id')
+        ).values(
+            duration_seconds=bindparam('duration_seconds'),
+            bitrate=bindparam('bitrate'),
+            sample_rate=bindparam('sample_rate'),
+            channels=bindparam('channels')
+        )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                query = select(
+                    AudioFile.gridfs_file_id,
+                    func.min(AudioFile.storage_codec).label('storage_codec'),
+                    func.min(AudioFile.filename).label('filename'),
+                    func.max(AudioFile.file_size).label('file_size'),
+                    func.count().label('files')
+                ).where(AudioFile.gridfs_file_id > last_file_id)
+
+                if not force:
+                    query = query.where(AudioFile.duration_seconds.is_(None))
+
+                blobs = db.execute(
+                    query.group_by(AudioFile.gridfs_file_id).order_by(AudioFile.gridfs_file_id).limit(batch_size)
+                ).all()
+
+                if not blobs:
+                    break
+
+                last_file_id = blobs[-1].gridfs_file_id
+                updates = []
+
+                # Blobs are probed in parallel; the rows are updated in one batch from here
+                for blob, metadata in zip(blobs, executor.map(AudioMetadataService._probe, blobs)):
+                    counts['blobs'] += 1
+                    if all(value is None for value in metadata.values()):
+                        counts['unknown'] += 1
+                        continue
+
+                    updates.append({'blob_id': blob.gridfs_file_id, **metadata})
+                    counts['files'] += blob.files
+
+                if updates:
+                    db.execute(statement, updates)
+                db.commit()
+
+                if on_progress is not None:
+                    on_progress(counts)
+
+        return counts
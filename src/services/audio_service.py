@@ -1,21 +1,336 @@
-from typing import List, Optional, Dict, Any
+import base64
+import json
+import time
+from typing import IO, Iterator, List, Optional, Dict, Any, Tuple
 from werkzeug.datastructures import FileStorage
-from bson import ObjectId
 from datetime import datetime
+from collections import Counter
+from sqlalchemy import (
+    update, delete, select, bindparam, any_, values, cast, column, func, or_, tuple_, String, Integer, REAL
+)
+from sqlalchemy.orm import load_only
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from dbentities.audio_file import AudioFile
-from dependencies.database import get_db_session, get_gridfs
+from dbentities.audio_blob import AudioBlob
+from dbentities.audio_fingerprint import AudioFingerprint
+from dbentities.legacy_peaks import LegacyPeaks
+from dbentities.waveform_job import WaveformJob
+from dependencies.database import get_db_session
+from dependencies.blob_cache import get_blob_cache
+from dependencies.metrics import get_metrics
+from dependencies.audio_metadata import AudioMetadata, HeadTailCapture, RangeSource, probe, HEAD_SIZE, TAIL_SIZE
+from dependencies.storage import get_storage, ChunkReader
+from dependencies.storage.codec import (
+    FileTooLargeError, FrameEncoder, get_upload_codec, open_decoded_range, read_index
+)
 from dependencies.constants import allowed_file, MAX_FILE_SIZE_BYTES
+from basemodels.audio import UploadByHashRequest
+from services.blob_purge_service import BlobPurgeService
+from services.preview_service import PreviewService
+from services.fingerprint_service import FingerprintService
+from services.waveform_service import WaveformService
+from services.usage_service import UsageService
+
+# Listing sort keys (see AudioService.list_user_files) and the only columns a listing loads
+LISTING_SORT_COLUMNS = {'date': AudioFile.created_at, 'name': AudioFile.filename, 'size': AudioFile.file_size}
+LISTING_COLUMNS = (
+    AudioFile.id, AudioFile.filename, AudioFile.file_size, AudioFile.duration_seconds,
+    AudioFile.content_hash, AudioFile.gridfs_file_id, AudioFile.created_at, AudioFile.updated_at
+)
 
 
 class AudioService:
-    """Service for audio file management using MongoDB GridFS"""
+    """Service for audio file management (bytes in the configured blob storage, GridFS by default)"""
+
+    @staticmethod
+    def store_stream(stream: IO[bytes], filename: str, content_type: Optional[str]) -> Dict[str, Any]:
+        """
+        Stream file content into blob storage in fixed-size pieces, hashing it on the way
+        Types selected by storage.compression are compressed frame by frame (see storage.codec)
+        Aborts (removing partial data) as soon as MAX_FILE_SIZE_BYTES is exceeded
+        Returns dict with success status, gridfs_file_id, file_size, sha256, storage_codec
+        and metadata (AudioFile column values read from the headers)
+        """
+        storage = get_storage()
+        content_type = content_type or 'audio/mpeg'
+        codec = get_upload_codec(filename)
+
+        # Keep the start and end of the content to read its headers without a round trip
+        stream = HeadTailCapture(stream)
+
+        if codec is None:
+            stored = storage.put_stream(stream, filename=filename, content_type=content_type,
+                                        max_size=MAX_FILE_SIZE_BYTES)
+            stored['storage_codec'] = None
+        else:
+            # Size limit, hash and file_size apply to the original bytes, not the compressed ones
+            encoder = FrameEncoder(stream, codec, storage.chunk_size, MAX_FILE_SIZE_BYTES)
+
+            try:
+                stored = storage.put_stream(ChunkReader(encoder.frames()), filename=filename,
+                                            content_type=content_type)
+            except FileTooLargeError as e:
+                return {
+                    'success': False,
+                    'message': str(e)
+                }
+
+            if stored['success']:
+                stored.update(file_size=encoder.file_size, sha256=encoder.sha256.hexdigest(),
+                              storage_codec=codec.name)
+
+        if stored['success']:
+            stored['metadata'] = AudioService.probe_metadata(
+                stored['gridfs_file_id'], stored['storage_codec'], filename, stored['file_size'],
+                stream.head, stream.tail
+            )
+
+        return stored
+
+    @staticmethod
+    def probe_metadata(gridfs_file_id: str, storage_codec: Optional[str], filename: Optional[str],
+                       file_size: int, head: Optional[bytes] = None, tail: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Read duration, bitrate, sample rate and channel count from a stored file's headers
+        Only the first/last few KB (read from storage unless given) and headers found
+        elsewhere in the file are fetched. Failures are logged, not raised
+        Returns dict of AudioFile column values (None where unknown)
+        """
+        metrics = get_metrics()
+        started = time.perf_counter()
+
+        def read_range(start: int, stop: int) -> bytes:
+            chunks = AudioService.open_stream(gridfs_file_id, start, stop, storage_codec)
+            if chunks is None:
+                raise ValueError(f'Blob {gridfs_file_id} not found')
+            try:
+                return b''.join(chunks)
+            finally:
+                chunks.close()
+
+        try:
+            if head is None:
+                # Small files are read in one go, larger ones as two windows
+                if file_size <= HEAD_SIZE + TAIL_SIZE:
+                    head, tail = read_range(0, file_size), b''
+                else:
+                    head, tail = read_range(0, HEAD_SIZE), read_range(file_size - TAIL_SIZE, file_size)
+
+            source = RangeSource(file_size, read_range, head, tail or b'')
+            metadata = probe(source, filename)
+            metrics.increment('audio_metadata.range_reads', source.fetches)
+
+        except Exception as e:
+            print(f"Could not read audio metadata of blob {gridfs_file_id} ({filename}): {e}")
+            metrics.increment('audio_metadata.failed')
+            metadata = AudioMetadata()
+
+        metrics.observe('audio_metadata.probe_seconds', time.perf_counter() - started)
+        return metadata.to_columns()
+
+    @staticmethod
+    def _store_upload(file: FileStorage) -> Dict[str, Any]:
+        """Stream an uploaded file into blob storage (see store_stream)"""
+        return AudioService.store_stream(file.stream, file.filename, file.content_type)
+
+    @staticmethod
+    def delete_blob(gridfs_file_id: str) -> None:
+        """
+        Delete a stored blob (and its cached copy) right away, logging (not raising) on failure
+        Only used to clean up after a failed write; committed deletes go through BlobPurgeService
+        """
+        blob_cache = get_blob_cache()
+        if blob_cache is not None:
+            blob_cache.invalidate(gridfs_file_id)
+
+        try:
+            storage = get_storage()
+            storage.delete(gridfs_file_id)
+        except Exception as e:
+            print(f"Error deleting file from storage: {e}")
+
+    @staticmethod
+    def _acquire_blobs(stored_files: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Take one reference per entry on the blob for its sha256, in a single statement
+        of the current transaction. New content registers the freshly written blob (the
+        first one, if a hash repeats), known content bumps the existing blob's refcount
+        Returns dict mapping each sha256 to the blob row (gridfs_file_id, storage_codec) to use
+        """
+        blobs: Dict[str, Dict[str, Any]] = {}
+        for stored in stored_files:
+            blob = blobs.setdefault(stored['sha256'], {
+                'content_hash': stored['sha256'],
+                'gridfs_file_id': stored['gridfs_file_id'],
+                'file_size': stored['file_size'],
+                'storage_codec': stored.get('storage_codec'),
+                'ref_count': 0
+            })
+            blob['ref_count'] += 1
+
+        # Rows in hash order, so concurrent batches lock blobs in the same order
+        db = get_db_session()
+        stmt = pg_insert(AudioBlob).values([blobs[content_hash] for content_hash in sorted(blobs)])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AudioBlob.content_hash],
+            set_={'ref_count': AudioBlob.ref_count + stmt.excluded.ref_count}
+        ).returning(AudioBlob.content_hash, AudioBlob.gridfs_file_id, AudioBlob.storage_codec)
+
+        acquired = {blob.content_hash: blob for blob in db.execute(stmt)}
+
+        # Blobs created here (not reused) get waveform peaks, a preview rendition and a fingerprint in the background
+        created = [
+            content_hash for content_hash, blob in acquired.items()
+            if blob.gridfs_file_id == blobs[content_hash]['gridfs_file_id']
+        ]
+        WaveformService.enqueue([acquired[content_hash].gridfs_file_id for content_hash in created])
+        PreviewService.enqueue(created)
+        FingerprintService.enqueue(created)
+
+        return acquired
+
+    @staticmethod
+    def _acquire_blob(stored: Dict[str, Any]):
+        """
+        Take a reference on the blob for stored['sha256'] in the current transaction
+        Returns the blob row (gridfs_file_id, storage_codec) to use
+        """
+        return AudioService._acquire_blobs([stored])[stored['sha256']]
+
+    @staticmethod
+    def _release_blobs(released: List[Tuple[str, Optional[str]]]) -> List[str]:
+        """
+        Drop the references (gridfs_file_id, content_hash) entries hold on their blobs
+        in the current transaction, with one statement per step for the whole batch
+        Returns the blob IDs nothing references any more, with their derived blobs (to be purged)
+        """
+        db = get_db_session()
+
+        # Files uploaded before deduplication own their blob (and their peaks) outright
+        orphaned = [gridfs_file_id for gridfs_file_id, content_hash in released if content_hash is None]
+        if orphaned:
+            legacy_param = bindparam('legacy_file_ids', sorted(orphaned), type_=ARRAY(String))
+            # Job first: waits for a worker attaching peaks to it, so its LegacyPeaks row is seen below
+            db.execute(delete(WaveformJob).where(WaveformJob.gridfs_file_id == any_(legacy_param)))
+            orphaned.extend(db.scalars(
+                delete(LegacyPeaks)
+                .where(LegacyPeaks.gridfs_file_id == any_(legacy_param))
+                .returning(LegacyPeaks.peaks_file_id)
+            ))
+
+        counts = Counter(content_hash for _, content_hash in released if content_hash is not None)
+
+        if not counts:
+            return orphaned
+
+        content_hashes = sorted(counts)
+        hashes_param = bindparam('content_hashes', content_hashes, type_=ARRAY(String))
+
+        # Lock the blobs in hash order (as _acquire_blobs does) before changing them
+        db.execute(
+            select(AudioBlob.content_hash)
+            .where(AudioBlob.content_hash == any_(hashes_param))
+            .order_by(AudioBlob.content_hash)
+            .with_for_update()
+        )
+
+        releases = values(
+            column('content_hash', String), column('count', Integer), name='releases'
+        ).data([(content_hash, counts[content_hash]) for content_hash in content_hashes])
+
+        db.execute(
+            update(AudioBlob)
+            .where(AudioBlob.content_hash == releases.c.content_hash)
+            .values(ref_count=AudioBlob.ref_count - releases.c.count)
+        )
+
+        deleted_hashes = []
+        deleted_file_ids = []
+        for content_hash, gridfs_file_id, *derived_file_ids in db.execute(
+            delete(AudioBlob)
+            .where(AudioBlob.content_hash == any_(hashes_param), AudioBlob.ref_count <= 0)
+            .returning(AudioBlob.content_hash, AudioBlob.gridfs_file_id, AudioBlob.peaks_file_id,
+                       AudioBlob.preview_file_id)
+        ):
+            deleted_hashes.append(content_hash)
+            deleted_file_ids.append(gridfs_file_id)
+            orphaned.extend(file_id for file_id in [gridfs_file_id] + derived_file_ids if file_id is not None)
+
+        if deleted_hashes:
+            # Waveform jobs (given-up ones are kept until now). A job a worker holds is skipped, not
+            # waited for (it locks the job before the blob): the worker drops it on finding the blob gone
+            db.execute(delete(WaveformJob).where(WaveformJob.gridfs_file_id.in_(
+                select(WaveformJob.gridfs_file_id)
+                .where(WaveformJob.gridfs_file_id == any_(
+                    bindparam('deleted_file_ids', deleted_file_ids, type_=ARRAY(String))
+                ))
+                .with_for_update(skip_locked=True)
+            )))
+
+            # Drop deleted content from the fingerprint index and near-duplicate links
+            deleted_param = bindparam('deleted_hashes', deleted_hashes, type_=ARRAY(String))
+            db.execute(delete(AudioFingerprint).where(AudioFingerprint.content_hash == any_(deleted_param)))
+            db.execute(
+                update(AudioBlob)
+                .where(AudioBlob.near_duplicate_of == any_(deleted_param))
+                .values(near_duplicate_of=None, near_duplicate_score=None)
+            )
+
+        return orphaned
+
+    @staticmethod
+    def _release_blob(audio_file: AudioFile) -> List[str]:
+        """
+        Drop the reference audio_file holds on its blob in the current transaction
+        Returns the blob IDs to purge (none if the blob is still referenced by other files)
+        """
+        return AudioService._release_blobs([(audio_file.gridfs_file_id, audio_file.content_hash)])
+
+    @staticmethod
+    def add_audio_files(uploads: List[Tuple[Dict[str, Any], str, Optional[str]]], user_id: int) -> List[AudioFile]:
+        """
+        Add AudioFile rows for (stored, filename, content_type) entries whose content is
+        already written to storage to the current transaction
+        If identical content was stored before, a row points at that blob instead and the
+        caller should purge stored['gridfs_file_id'] in the same transaction
+        """
+        db = get_db_session()
+        blobs = AudioService._acquire_blobs([stored for stored, _, _ in uploads])
+
+        audio_files = [
+            AudioFile(
+                user_id=user_id,
+                filename=filename,
+                original_filename=filename,
+                content_type=content_type or 'audio/mpeg',
+                file_size=stored['file_size'],
+                gridfs_file_id=blobs[stored['sha256']].gridfs_file_id,
+                content_hash=stored['sha256'],
+                storage_codec=blobs[stored['sha256']].storage_codec,
+                **stored.get('metadata', {})
+            )
+            for stored, filename, content_type in uploads
+        ]
+
+        db.add_all(audio_files)
+        return audio_files
 
     @staticmethod
-    def upload_file(file: FileStorage, user_id: int) -> Dict[str, Any]:
+    def add_audio_file(stored: Dict[str, Any], filename: str, content_type: Optional[str], user_id: int) -> AudioFile:
+        """Add a single AudioFile row to the current transaction (see add_audio_files)"""
+        return AudioService.add_audio_files([(stored, filename, content_type)], user_id)[0]
+
+    @staticmethod
+    def upload_file(file: FileStorage, user_id: int, request_length: Optional[int] = None) -> Dict[str, Any]:
         """
-        Upload an audio file to MongoDB GridFS
+        Upload an audio file to blob storage
+        request_length is the Content-Length of the whole request: browsers don't send a
+        size per multipart field, so it bounds the file's size for the early quota check
         Returns dict with success status and message
         """
+        gridfs_file_id = None
+
         try:
             # Validate file
             if not file or file.filename == '':
@@ -30,36 +345,130 @@ class AudioService:
                     'message': 'Invalid file type. Allowed types: mp3, wav, ogg, m4a, flac'
                 }
 
-            # Read file data
-            file_data = file.read()
-            file_size = len(file_data)
+            # Only an upper bound (multipart overhead included): the exact size is checked once stored
+            quota = UsageService.check_quota(user_id, file.content_length or request_length or 0)
+            if not quota['success']:
+                return quota
+
+            # Stream file into storage
+            stored = AudioService._store_upload(file)
+            if not stored['success']:
+                return stored
+
+            gridfs_file_id = stored['gridfs_file_id']
+
+            # Create metadata record in PostgreSQL (reusing an identical blob, if any)
+            db = get_db_session()
+            audio_file = AudioService.add_audio_file(stored, file.filename, file.content_type, user_id)
+
+            usage = UsageService.record(user_id, stored['file_size'], 1)
+            if not usage['success']:
+                db.rollback()
+                AudioService.delete_blob(gridfs_file_id)
+                return usage
+
+            # Identical content was already stored: drop the copy we just wrote
+            if audio_file.gridfs_file_id != gridfs_file_id:
+                BlobPurgeService.enqueue([gridfs_file_id])
+
+            db.commit()
+
+        except Exception as e:
+            db = get_db_session()
+            db.rollback()
+
+            # Don't leave an orphaned blob behind if the metadata insert failed
+            if gridfs_file_id is not None:
+                AudioService.delete_blob(gridfs_file_id)
+
+            return {
+                'success': False,
+                'message': f'An error occurred: {str(e)}'
+            }
+
+        # Committed: the blob is referenced from here on, so it must not be cleaned up, and
+        # the upload succeeded even if reloading the row fails
+        try:
+            db.refresh(audio_file)
+        except Exception as e:
+            db.rollback()
+            print(f"Could not reload uploaded file: {e}")
+
+        return {
+            'success': True,
+            'message': 'File uploaded successfully',
+            'file': audio_file
+        }
+
+    @staticmethod
+    def upload_by_hash(upload_data: UploadByHashRequest, user_id: int) -> Dict[str, Any]:
+        """
+        Create an audio file from content the user already has a file of, without any upload
+        Knowing a hash proves nothing, so content only other users have is treated as
+        unknown: it can't be claimed, and whether it is stored is not revealed
+        Returns dict with success status and message; 'missing' is True when the
+        client has to send the bytes through upload_file instead
+        """
+        db = get_db_session()
+
+        try:
+            if not allowed_file(upload_data.filename):
+                return {
+                    'success': False,
+                    'message': 'Invalid file type. Allowed types: mp3, wav, ogg, m4a, flac'
+                }
+
+            quota = UsageService.check_quota(user_id, upload_data.file_size)
+            if not quota['success']:
+                return quota
+
+            owned = select(AudioFile.id).where(
+                AudioFile.user_id == user_id,
+                AudioFile.content_hash == upload_data.sha256
+            ).exists()
+
+            blob = db.execute(
+                update(AudioBlob)
+                .where(
+                    AudioBlob.content_hash == upload_data.sha256,
+                    AudioBlob.file_size == upload_data.file_size,
+                    owned
+                )
+                .values(ref_count=AudioBlob.ref_count + 1)
+                .returning(AudioBlob.gridfs_file_id, AudioBlob.file_size, AudioBlob.storage_codec)
+            ).first()
 
-            if file_size > MAX_FILE_SIZE_BYTES:
+            if blob is None:
                 return {
                     'success': False,
-                    'message': f'File too large. Maximum size: {MAX_FILE_SIZE_BYTES / (1024 * 1024)} MB'
+                    'message': 'Content not found, upload the file instead',
+                    'missing': True
                 }
 
-            # Store file in GridFS
-            gridfs = get_gridfs()
-            gridfs_file_id = gridfs.put(
-                file_data,
-                filename=file.filename,
-                content_type=file.content_type or 'audio/mpeg'
-            )
+            # Same content, same headers: copy the metadata of the user's file that shares the blob
+            metadata = db.query(
+                AudioFile.duration_seconds, AudioFile.bitrate, AudioFile.sample_rate, AudioFile.channels
+            ).filter(AudioFile.user_id == user_id, AudioFile.content_hash == upload_data.sha256).first()
 
-            # Create metadata record in PostgreSQL
-            db = get_db_session()
             audio_file = AudioFile(
                 user_id=user_id,
-                filename=file.filename,
-                original_filename=file.filename,
-                content_type=file.content_type or 'audio/mpeg',
-                file_size=file_size,
-                gridfs_file_id=str(gridfs_file_id)
+                filename=upload_data.filename,
+                original_filename=upload_data.filename,
+                content_type=upload_data.content_type or 'audio/mpeg',
+                file_size=blob.file_size,
+                gridfs_file_id=blob.gridfs_file_id,
+                content_hash=upload_data.sha256,
+                storage_codec=blob.storage_codec,
+                **(metadata._asdict() if metadata is not None else {})
             )
 
             db.add(audio_file)
+
+            usage = UsageService.record(user_id, blob.file_size, 1)
+            if not usage['success']:
+                db.rollback()
+                return usage
+
             db.commit()
             db.refresh(audio_file)
 
@@ -70,7 +479,6 @@ class AudioService:
             }
 
         except Exception as e:
-            db = get_db_session()
             db.rollback()
             return {
                 'success': False,
@@ -78,62 +486,219 @@ class AudioService:
             }
 
     @staticmethod
-    def get_user_files(user_id: int) -> List[AudioFile]:
-        """Get all audio files for a specific user"""
+    def get_user_files(user_id: int, file_ids: Optional[List[int]] = None) -> List[AudioFile]:
+        """Get all audio files for a specific user (only those in file_ids, if given)"""
         db = get_db_session()
-        return db.query(AudioFile).filter(AudioFile.user_id == user_id).all()
+        query = db.query(AudioFile).filter(AudioFile.user_id == user_id)
+
+        if file_ids is not None:
+            query = query.filter(AudioFile.id.in_(file_ids))
+
+        return query.order_by(AudioFile.id).all()
 
     @staticmethod
-    def get_file_by_id(file_id: int) -> Optional[AudioFile]:
-        """Get audio file metadata by ID"""
-        db = get_db_session()
-        return db.query(AudioFile).filter(AudioFile.id == file_id).first()
+    def _encode_cursor(sort: str, value: Any, file_id: int) -> str:
+        """Opaque listing cursor: the sort key and (sort value, id) of the last file on a page"""
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps([sort, value, file_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
 
     @staticmethod
-    def get_file_data(gridfs_file_id: str) -> Optional[bytes]:
-        """Get actual file data from GridFS"""
+    def _decode_cursor(cursor: str, sort: str) -> Optional[Tuple[Any, int]]:
+        """(sort value, id) of a listing cursor, or None if it is invalid or for another sort key"""
         try:
-            gridfs = get_gridfs()
-            file_data = gridfs.get(ObjectId(gridfs_file_id))
-            return file_data.read()
-        except Exception:
+            cursor_sort, value, file_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if cursor_sort != sort or not isinstance(file_id, int):
+                return None
+            if sort == 'date':
+                value = datetime.fromisoformat(value)
+            elif sort == 'search':
+                value = float(value)
+            elif not isinstance(value, int if sort == 'size' else str):
+                return None
+            return value, file_id
+        except (ValueError, TypeError):
             return None
 
     @staticmethod
-    def delete_file(file_id: int, user_id: int) -> Dict[str, Any]:
+    def list_user_files(user_id: int, sort: str = 'date', descending: bool = True, limit: int = 50,
+                        cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        Delete an audio file (both metadata and GridFS data)
-        Returns dict with success status and message
+        Get one page of a user's files, sorted by date, name or size (ties broken by id)
+        Pages are read with a keyset condition on (sort value, id) from the cursor, backed by
+        a (user_id, sort value, id) index, so every page costs the same whatever its position
+        Returns dict with success status, message, files and next_cursor (None on the last page)
         """
         db = get_db_session()
+        sort_column = LISTING_SORT_COLUMNS[sort]
 
-        try:
-            audio_file = db.query(AudioFile).filter(
-                AudioFile.id == file_id,
-                AudioFile.user_id == user_id
-            ).first()
+        query = db.query(AudioFile).options(load_only(*LISTING_COLUMNS)).filter(AudioFile.user_id == user_id)
 
-            if not audio_file:
+        if cursor:
+            position = AudioService._decode_cursor(cursor, sort)
+            if position is None:
                 return {
                     'success': False,
-                    'message': 'File not found'
+                    'message': 'Invalid cursor'
                 }
 
-            # Delete from GridFS
-            try:
-                gridfs = get_gridfs()
-                gridfs.delete(ObjectId(audio_file.gridfs_file_id))
-            except Exception as e:
-                # Log error but continue with metadata deletion
-                print(f"Error deleting file from GridFS: {e}")
-
-            # Delete metadata from PostgreSQL
-            db.delete(audio_file)
+            key = tuple_(sort_column, AudioFile.id)
+            query = query.filter(key < tuple_(*position) if descending else key > tuple_(*position))
+
+        if descending:
+            query = query.order_by(sort_column.desc(), AudioFile.id.desc())
+        else:
+            query = query.order_by(sort_column, AudioFile.id)
+
+        # One extra row tells whether there is a next page
+        files = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(files) > limit:
+            last = files[limit - 1]
+            next_cursor = AudioService._encode_cursor(sort, getattr(last, sort_column.key), last.id)
+
+        return {
+            'success': True,
+            'message': 'Files found',
+            'files': files[:limit],
+            'next_cursor': next_cursor
+        }
+
+    @staticmethod
+    def search_user_files(user_id: int, text: str, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Search a user's files by (original) file name, best matches first
+        Files whose name contains the text are found through the (user_id, name) trigram
+        indexes and ranked by trigram similarity; pages follow a (score, id) cursor
+        Returns dict with success status, message, files, scores and next_cursor
+        """
+        db = get_db_session()
+        text = text.strip()
+        pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        score = func.greatest(
+            func.similarity(AudioFile.filename, text), func.similarity(AudioFile.original_filename, text)
+        ).label('score')
+
+        query = db.query(AudioFile, score).filter(
+            AudioFile.user_id == user_id,
+            or_(AudioFile.filename.ilike(pattern), AudioFile.original_filename.ilike(pattern))
+        )
+
+        if cursor:
+            position = AudioService._decode_cursor(cursor, 'search')
+            if position is None:
+                return {
+                    'success': False,
+                    'message': 'Invalid cursor'
+                }
+
+            # The score is a real, which reaches the cursor as its shortest decimal: compare as real
+            score_position, id_position = position
+            query = query.filter(tuple_(score, AudioFile.id) < tuple_(cast(score_position, REAL), id_position))
+
+        # One extra row tells whether there is a next page
+        rows = query.order_by(score.desc(), AudioFile.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            last, last_score = rows[limit - 1]
+            next_cursor = AudioService._encode_cursor('search', last_score, last.id)
+
+        return {
+            'success': True,
+            'message': 'Files found',
+            'files': [audio_file for audio_file, _ in rows[:limit]],
+            'scores': [row_score for _, row_score in rows[:limit]],
+            'next_cursor': next_cursor
+        }
+
+    @staticmethod
+    def get_file_by_id(file_id: int) -> Optional[AudioFile]:
+        """Get audio file metadata by ID"""
+        db = get_db_session()
+        return db.query(AudioFile).filter(AudioFile.id == file_id).first()
+
+    @staticmethod
+    def open_stream(gridfs_file_id: str, start: int = 0, stop: Optional[int] = None,
+                    storage_codec: Optional[str] = None, fill_cache: bool = True) -> Optional[Iterator[bytes]]:
+        """
+        Open a stored blob as a lazy iterator over its (decompressed) content
+        Only bytes in [start, stop) are yielded; chunks are fetched from storage
+        as the iterator is consumed. Returns None if the blob does not exist
+        fill_cache=False keeps bulk reads (e.g. exports) from evicting the cache's hot set
+        """
+        storage = get_storage()
+
+        if storage_codec is None:
+            chunks = storage.open_range(gridfs_file_id, start, stop)
+        else:
+            chunks = open_decoded_range(storage, gridfs_file_id, storage_codec, start, stop)
+
+        # Whole-file reads populate the local disk cache as they stream (for compressed
+        # blobs even on the local backend, as the cache holds the decompressed content)
+        blob_cache = get_blob_cache()
+        if fill_cache and chunks is not None and blob_cache is not None and start == 0 and \
+                (storage_codec is not None or not storage.is_local):
+            if storage_codec is None:
+                blob_stat = storage.stat(gridfs_file_id)
+                length = blob_stat.length if blob_stat is not None else None
+            else:
+                length = read_index(storage, gridfs_file_id).length
+
+            if length is not None and (stop is None or stop >= length):
+                chunks = blob_cache.fill(gridfs_file_id, chunks, length)
+
+        return chunks
+
+    @staticmethod
+    def get_local_path(gridfs_file_id: str, storage_codec: Optional[str] = None) -> Optional[str]:
+        """
+        Get a local disk path for a blob's content that can be served with sendfile/mmap
+        This is the blob itself for uncompressed blobs on the local backend,
+        otherwise its cached copy (if any)
+        """
+        storage = get_storage()
+        if storage.is_local and storage_codec is None:
+            return storage.local_path(gridfs_file_id)
+
+        blob_cache = get_blob_cache()
+        if blob_cache is None:
+            return None
+
+        return blob_cache.lookup(gridfs_file_id)
+
+    @staticmethod
+    def delete_files(file_ids: List[int], user_id: int) -> Dict[str, Any]:
+        """
+        Delete several audio files of one user in a single transaction
+        One DELETE ... RETURNING removes the metadata, blob references are dropped per
+        batch and unreferenced blobs are queued for the purge worker
+        Returns dict with success status, message, and the deleted / not_found file IDs
+        """
+        db = get_db_session()
+        file_ids = sorted(set(file_ids))
+
+        try:
+            deleted = db.execute(
+                delete(AudioFile)
+                .where(
+                    AudioFile.id == any_(bindparam('file_ids', file_ids, type_=ARRAY(Integer))),
+                    AudioFile.user_id == user_id
+                )
+                .returning(AudioFile.id, AudioFile.gridfs_file_id, AudioFile.content_hash, AudioFile.file_size)
+            ).all()
+
+            orphaned = AudioService._release_blobs([(row.gridfs_file_id, row.content_hash) for row in deleted])
+            BlobPurgeService.enqueue(orphaned)
+            UsageService.record(user_id, -sum(row.file_size for row in deleted), -len(deleted))
             db.commit()
 
+            deleted_ids = sorted(row.id for row in deleted)
             return {
                 'success': True,
-                'message': 'File deleted successfully'
+                'message': f'{len(deleted_ids)} file(s) deleted',
+                'deleted': deleted_ids,
+                'not_found': sorted(set(file_ids) - set(deleted_ids))
             }
 
         except Exception as e:
@@ -144,12 +709,37 @@ class AudioService:
             }
 
     @staticmethod
-    def update_file(file_id: int, user_id: int, new_file: FileStorage) -> Dict[str, Any]:
+    def delete_file(file_id: int, user_id: int) -> Dict[str, Any]:
+        """
+        Delete an audio file (metadata now, stored data through the purge queue)
+        Returns dict with success status and message
+        """
+        result = AudioService.delete_files([file_id], user_id)
+
+        if not result['success']:
+            return result
+
+        if not result['deleted']:
+            return {
+                'success': False,
+                'message': 'File not found'
+            }
+
+        return {
+            'success': True,
+            'message': 'File deleted successfully'
+        }
+
+    @staticmethod
+    def update_file(file_id: int, user_id: int, new_file: FileStorage,
+                    request_length: Optional[int] = None) -> Dict[str, Any]:
         """
         Update/replace an audio file
+        request_length bounds the new file's size for the early quota check (see upload_file)
         Returns dict with success status and message
         """
         db = get_db_session()
+        gridfs_file_id = None
 
         try:
             audio_file = db.query(AudioFile).filter(
@@ -176,49 +766,70 @@ class AudioService:
                     'message': 'Invalid file type'
                 }
 
-            # Delete old file from GridFS
-            try:
-                gridfs = get_gridfs()
-                gridfs.delete(ObjectId(audio_file.gridfs_file_id))
-            except Exception as e:
-                print(f"Error deleting old file from GridFS: {e}")
+            # Only growth counts, bounded as in upload_file: the exact delta is recorded once stored
+            bound = new_file.content_length or request_length or 0
+            quota = UsageService.check_quota(user_id, max(0, bound - audio_file.file_size), 0)
+            if not quota['success']:
+                return quota
 
-            # Upload new file to GridFS
-            file_data = new_file.read()
-            file_size = len(file_data)
+            # Stream new file into storage before touching the old one
+            stored = AudioService._store_upload(new_file)
+            if not stored['success']:
+                return stored
 
-            if file_size > MAX_FILE_SIZE_BYTES:
-                return {
-                    'success': False,
-                    'message': 'File too large'
-                }
+            gridfs_file_id = stored['gridfs_file_id']
 
-            gridfs_file_id = gridfs.put(
-                file_data,
-                filename=new_file.filename,
-                content_type=new_file.content_type or 'audio/mpeg'
-            )
+            # Reference the new content first so replacing a file with itself keeps the blob
+            blob = AudioService._acquire_blob(stored)
+            orphaned_file_ids = AudioService._release_blob(audio_file)
+
+            # Only growth counts against the quota (a smaller replacement frees space)
+            usage = UsageService.record(user_id, stored['file_size'] - audio_file.file_size, 0)
+            if not usage['success']:
+                db.rollback()
+                AudioService.delete_blob(gridfs_file_id)
+                return usage
 
             # Update metadata
             audio_file.filename = new_file.filename
             audio_file.original_filename = new_file.filename
             audio_file.content_type = new_file.content_type or 'audio/mpeg'
-            audio_file.file_size = file_size
-            audio_file.gridfs_file_id = str(gridfs_file_id)
+            audio_file.file_size = stored['file_size']
+            audio_file.gridfs_file_id = blob.gridfs_file_id
+            audio_file.storage_codec = blob.storage_codec
+            audio_file.content_hash = stored['sha256']
             audio_file.updated_at = datetime.utcnow()
+            for name, value in stored.get('metadata', AudioMetadata().to_columns()).items():
+                setattr(audio_file, name, value)
 
-            db.commit()
-            db.refresh(audio_file)
+            # Purge the copy we just wrote if identical content was already stored, and the
+            # old blob if nothing else uses it (only once the metadata points at the new one)
+            duplicate_file_id = gridfs_file_id if blob.gridfs_file_id != gridfs_file_id else None
+            BlobPurgeService.enqueue([duplicate_file_id] + orphaned_file_ids)
 
-            return {
-                'success': True,
-                'message': 'File updated successfully',
-                'file': audio_file
-            }
+            db.commit()
 
         except Exception as e:
             db.rollback()
+
+            if gridfs_file_id is not None:
+                AudioService.delete_blob(gridfs_file_id)
+
             return {
                 'success': False,
                 'message': f'An error occurred: {str(e)}'
             }
+
+        # Committed: the new blob is referenced from here on, so it must not be cleaned up, and
+        # the update succeeded even if reloading the row fails
+        try:
+            db.refresh(audio_file)
+        except Exception as e:
+            db.rollback()
+            print(f"Could not reload updated file: {e}")
+
+        return {
+            'success': True,
+            'message': 'File updated successfully',
+            'file': audio_file
+        }
@@ -1,8 +1,11 @@
-import bcrypt
 from typing import Optional, Dict, Any
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
 from dbentities.user import User, UserRole
 from dependencies.database import get_db_session
+from dependencies.metrics import get_metrics
+from dependencies.password_hasher import get_password_hasher
+from dependencies.user_cache import CACHED_COLUMNS, get_user_cache
 from basemodels.auth import SignupRequest
 
 
@@ -11,29 +14,39 @@ class AuthService:
 
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash a password using bcrypt"""
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
+        """Hash a password using bcrypt (on the password hasher's threads, at security.bcrypt_rounds)"""
+        return get_password_hasher().hash(password)
 
     @staticmethod
     def verify_password(password: str, password_hash: str) -> bool:
         """Verify a password against its hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        return get_password_hasher().verify(password, password_hash)
 
     @staticmethod
     def authenticate_user(username: str, password: str) -> Optional[User]:
         """
         Authenticate a user by username and password
+        A hash made with other than the configured rounds is replaced on success
         Returns User object if authentication successful, None otherwise
+        Raises PasswordHasherBusyError when too many password checks are in progress
         """
         db = get_db_session()
         user = db.query(User).filter(User.username == username).first()
 
-        if user and AuthService.verify_password(password, user.password_hash):
-            return user
+        if not user or not AuthService.verify_password(password, user.password_hash):
+            return None
 
-        return None
+        if get_password_hasher().needs_rehash(user.password_hash):
+            try:
+                user.password_hash = AuthService.hash_password(password)
+                db.commit()
+                get_metrics().increment('auth.password_rehashed')
+            except Exception as e:
+                # The old hash still works: try again on the next login
+                db.rollback()
+                print(f"Failed to rehash password of user {user.id}: {str(e)}")
+
+        return user
 
     @staticmethod
     def signup_user(signup_data: SignupRequest) -> Dict[str, Any]:
@@ -96,3 +109,34 @@ class AuthService:
         """Get user by ID"""
         db = get_db_session()
         return db.query(User).filter(User.id == user_id).first()
+
+    @staticmethod
+    def load_user(user_id: int) -> Optional[User]:
+        """
+        Get the logged-in user for Flask-Login, from the user cache when possible
+        A cached user is attached to the session without a query; columns that aren't
+        cached (the password hash) are loaded on first access
+        """
+        user_cache = get_user_cache()
+        if user_cache is None:
+            return AuthService.get_user_by_id(user_id)
+
+        values = user_cache.get(user_id)
+        if values is not None:
+            user = User(**dict(values, role=UserRole(values['role'])))
+            make_transient_to_detached(user)
+            return get_db_session().merge(user, load=False)
+
+        user = AuthService.get_user_by_id(user_id)
+        if user is not None:
+            values = {name: getattr(user, name) for name in CACHED_COLUMNS}
+            user_cache.put(user_id, dict(values, role=user.role.value))
+
+        return user
+
+    @staticmethod
+    def invalidate_cached_user(user_id: int) -> None:
+        """Drop a user from the user cache (after a committed update or deletion)"""
+        user_cache = get_user_cache()
+        if user_cache is not None:
+            user_cache.invalidate(user_id)
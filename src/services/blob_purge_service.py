@@ -0,0 +1,198 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dbentities.audio_blob import AudioBlob
+from dbentities.audio_file import AudioFile
+from dbentities.blob_purge import BlobPurge
+from dbentities.legacy_peaks import LegacyPeaks
+from dbentities.upload_session import UploadSession
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+from dependencies.blob_cache import get_blob_cache
+from dependencies.metrics import get_metrics
+from dependencies.storage import get_storage
+
+
+class BlobPurgeService:
+    """
+    Service for deferred blob deletion
+
+    Requests never delete blob data themselves: they enqueue the blob ID in the
+    blob_purge_queue table in the same transaction that removes the metadata, so
+    the delete is neither lost nor done early. A worker (purge-blobs command or
+    the in-app thread) deletes queued blobs in batches, retrying failures with
+    exponential backoff. Blobs that are referenced again by the time the worker
+    gets to them are dropped from the queue instead of deleted.
+    """
+
+    # Every column holding a blob ID that must keep its stored data
+    REFERENCE_COLUMNS = (
+        AudioFile.gridfs_file_id, AudioBlob.gridfs_file_id, AudioBlob.peaks_file_id, AudioBlob.preview_file_id,
+        LegacyPeaks.peaks_file_id, UploadSession.gridfs_file_id
+    )
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> timedelta:
+        """Backoff before the next attempt after `attempts` failures"""
+        config = get_config()
+        base = config.get('storage.purge.retry_base_seconds', 30)
+        maximum = config.get('storage.purge.retry_max_seconds', 3600)
+        return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+    @staticmethod
+    def referenced(file_ids: List[str]) -> Set[str]:
+        """The subset of file_ids that some row still references"""
+        db = get_db_session()
+        referenced = set()
+
+        for column in BlobPurgeService.REFERENCE_COLUMNS:
+            referenced.update(db.scalars(select(column).where(column.in_(file_ids))))
+
+        return referenced
+
+    @staticmethod
+    def enqueue(file_ids: List[Optional[str]]) -> None:
+        """
+        Queue blobs for deletion in the current transaction (None entries are ignored)
+        The caller commits; the blobs are deleted by the purge worker afterwards
+        """
+        file_ids = [file_id for file_id in file_ids if file_id is not None]
+        if not file_ids:
+            return
+
+        db = get_db_session()
+        db.execute(
+            pg_insert(BlobPurge)
+            .values([{'gridfs_file_id': file_id} for file_id in file_ids])
+            .on_conflict_do_nothing(index_elements=[BlobPurge.gridfs_file_id])
+        )
+
+        # Nothing references these blobs any more, free their cache space right away
+        blob_cache = get_blob_cache()
+        if blob_cache is not None:
+            for file_id in file_ids:
+                blob_cache.invalidate(file_id)
+
+    @staticmethod
+    def queue_depth() -> int:
+        """Number of blobs waiting to be purged (also published as a gauge)"""
+        db = get_db_session()
+        depth = db.query(func.count(BlobPurge.id)).scalar()
+        get_metrics().set_gauge('blob_purge.queue_depth', depth)
+        return depth
+
+    @staticmethod
+    def purge_batch(batch_size: int = 100) -> Dict[str, int]:
+        """
+        Delete up to batch_size due blobs from storage
+        Rows are claimed with SKIP LOCKED, so several workers can run side by side
+        Returns dict with purged, skipped (referenced again, left in storage) and failed counts
+        """
+        db = get_db_session()
+        metrics = get_metrics()
+        now = datetime.utcnow()
+
+        entries = db.query(BlobPurge).filter(
+            BlobPurge.next_attempt_at <= now
+        ).order_by(BlobPurge.next_attempt_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not entries:
+            db.rollback()
+            return {'purged': 0, 'skipped': 0, 'failed': 0}
+
+        storage = get_storage()
+        referenced = BlobPurgeService.referenced([entry.gridfs_file_id for entry in entries])
+        file_ids = [entry.gridfs_file_id for entry in entries if entry.gridfs_file_id not in referenced]
+        errors: Dict[str, str] = {}
+        started = time.monotonic()
+
+        for file_id in sorted(referenced):
+            print(f"Blob {file_id} is referenced again, dropping it from the purge queue")
+
+        try:
+            if file_ids:
+                storage.delete_many(file_ids)
+        except Exception:
+            # Retry one by one so a single bad blob doesn't hold back the whole batch
+            for file_id in file_ids:
+                try:
+                    storage.delete(file_id)
+                except Exception as e:
+                    errors[file_id] = str(e)
+
+        blob_cache = get_blob_cache()
+
+        for entry in entries:
+            if entry.gridfs_file_id in referenced:
+                db.delete(entry)
+                continue
+
+            error = errors.get(entry.gridfs_file_id)
+            if error is None:
+                if blob_cache is not None:
+                    blob_cache.invalidate(entry.gridfs_file_id)
+                db.delete(entry)
+                continue
+
+            print(f"Error purging blob {entry.gridfs_file_id} from storage: {error}")
+            entry.attempts += 1
+            entry.last_error = error
+            entry.next_attempt_at = now + BlobPurgeService._retry_delay(entry.attempts)
+
+        db.commit()
+
+        purged = len(file_ids) - len(errors)
+        metrics.increment('blob_purge.purged', purged)
+        metrics.increment('blob_purge.skipped', len(referenced))
+        metrics.increment('blob_purge.failed', len(errors))
+        metrics.observe('blob_purge.batch_seconds', time.monotonic() - started)
+
+        return {'purged': purged, 'skipped': len(referenced), 'failed': len(errors)}
+
+    @staticmethod
+    def run_worker(batch_size: int = 100, interval_seconds: float = 10, once: bool = False,
+                   stop_event: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        Purge due blobs batch after batch, sleeping `interval_seconds` whenever the queue is drained
+        With once=True, stops as soon as nothing is due. Returns total purged, skipped and failed counts
+        """
+        stop_event = stop_event or threading.Event()
+        totals = {'purged': 0, 'skipped': 0, 'failed': 0}
+
+        while not stop_event.is_set():
+            result = BlobPurgeService.purge_batch(batch_size)
+            for key in totals:
+                totals[key] += result[key]
+
+            if sum(result.values()) < batch_size:
+                BlobPurgeService.queue_depth()
+                get_db_session().rollback()
+
+                if once:
+                    break
+                stop_event.wait(interval_seconds)
+
+        return totals
+
+    @staticmethod
+    def start_background_worker(app) -> threading.Thread:
+        """Run the purge worker in a daemon thread of this process"""
+        config = get_config()
+        batch_size = config.get('storage.purge.batch_size', 100)
+        interval_seconds = config.get('storage.purge.interval_seconds', 10)
+
+        def work():
+            while True:
+                try:
+                    with app.app_context():
+                        BlobPurgeService.run_worker(batch_size, interval_seconds, once=True)
+                except Exception as e:
+                    print(f"Error in blob purge worker: {e}")
+                time.sleep(interval_seconds)
+
+        thread = threading.Thread(target=work, name='blob-purge-worker', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,334 @@
+import mimetypes
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from werkzeug.datastructures import FileStorage
+from dbentities.audio_file import AudioFile
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+from dependencies.constants import allowed_file, MAX_FILE_SIZE_BYTES, UPLOAD_CHUNK_SIZE_BYTES
+from services.audio_service import AudioService
+from services.blob_purge_service import BlobPurgeService
+from services.usage_service import UsageService
+
+# (filename, content_type, open) for one file of a bulk upload; open() returns a readable stream
+BulkEntry = Tuple[str, Optional[str], Callable[[], IO[bytes]]]
+
+
+class ArchiveTooLargeError(Exception):
+    """Raised while reading a bulk upload archive once it exceeds the size limit"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f'Archive too large. Maximum size: {max_size / (1024 * 1024):.1f} MB')
+
+
+class _LimitedStream:
+    """Read-only view of a stream that raises ArchiveTooLargeError past max_size bytes"""
+
+    def __init__(self, stream: IO[bytes], max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        piece = self.stream.read(size)
+        self.position += len(piece)
+        if self.position > self.max_size:
+            raise ArchiveTooLargeError(self.max_size)
+        return piece
+
+
+class BulkUploadService:
+    """
+    Service for uploading many audio files in one request
+
+    Files (individual uploads or members of a zip/tar archive) are written to
+    storage from a bounded thread pool, then all AudioFile rows are inserted in
+    a single transaction. Every file gets its own entry in the result report.
+    """
+
+    ZIP_MIMETYPES = {'application/zip', 'application/x-zip-compressed'}
+
+    @staticmethod
+    def iter_uploaded_files(files: Iterable[FileStorage]) -> Iterator[BulkEntry]:
+        """Bulk entries for files of a multipart request"""
+        for file in files:
+            yield file.filename or '', file.content_type, lambda file=file: file.stream
+
+    @staticmethod
+    def is_zip(filename: Optional[str], mimetype: Optional[str]) -> bool:
+        """Tell zip archives from tar archives by name/content type"""
+        return (filename or '').lower().endswith('.zip') or mimetype in BulkUploadService.ZIP_MIMETYPES
+
+    @staticmethod
+    def _member_filename(name: str) -> Optional[str]:
+        """Base name of an archive member, or None for directories and metadata files"""
+        filename = posixpath.basename(name.replace('\\', '/'))
+        if not filename or filename.startswith('.') or '__MACOSX/' in name:
+            return None
+        return filename
+
+    @staticmethod
+    def _spool(stream: IO[bytes]) -> IO[bytes]:
+        """Copy a stream into a temporary file, keeping at most MAX_FILE_SIZE_BYTES + 1 bytes"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=4 * UPLOAD_CHUNK_SIZE_BYTES)
+        remaining = MAX_FILE_SIZE_BYTES + 1  # One byte over is enough to reject the file later
+
+        while remaining > 0:
+            piece = stream.read(min(UPLOAD_CHUNK_SIZE_BYTES, remaining))
+            if not piece:
+                break
+            spooled.write(piece)
+            remaining -= len(piece)
+
+        spooled.seek(0)
+        return spooled
+
+    @staticmethod
+    def max_size(user_id: int) -> int:
+        """Largest bulk upload a user can send: the configured maximum or their remaining storage quota"""
+        config = get_config()
+        max_size = config.get('file_upload.bulk_upload_max_size_mb', 1024) * 1024 * 1024
+
+        usage = UsageService.get_usage(user_id)
+        if usage['max_bytes'] is not None:
+            max_size = min(max_size, max(usage['max_bytes'] - usage['bytes_used'], 0))
+
+        return max_size
+
+    @staticmethod
+    def iter_archive(stream: IO[bytes], is_zip: bool, max_size: int) -> Iterator[BulkEntry]:
+        """
+        Bulk entries for the regular files in a zip or tar archive
+        Tar archives (optionally compressed) are read strictly sequentially, straight
+        from the request body; zip archives need their central directory, so an
+        unseekable stream is first spooled to a temporary file. Raises
+        ArchiveTooLargeError as soon as more than max_size bytes of archive are read
+        """
+        if is_zip:
+            if stream.seekable():
+                # Already on disk (a multipart field): only its size needs checking
+                if stream.seek(0, 2) > max_size:
+                    raise ArchiveTooLargeError(max_size)
+                stream.seek(0)
+            else:
+                spooled = tempfile.TemporaryFile()
+                try:
+                    shutil.copyfileobj(_LimitedStream(stream, max_size), spooled, UPLOAD_CHUNK_SIZE_BYTES)
+                except ArchiveTooLargeError:
+                    spooled.close()
+                    raise
+                spooled.seek(0)
+                stream = spooled
+
+            with zipfile.ZipFile(stream) as archive:
+                for info in archive.infolist():
+                    filename = BulkUploadService._member_filename(info.filename)
+                    if info.is_dir() or filename is None:
+                        continue
+                    yield filename, mimetypes.guess_type(filename)[0], lambda info=info: archive.open(info)
+            return
+
+        with tarfile.open(fileobj=_LimitedStream(stream, max_size), mode='r|*') as archive:
+            for member in archive:
+                filename = BulkUploadService._member_filename(member.name)
+                if not member.isfile() or filename is None:
+                    continue
+                # The next member can only be read once this one is consumed, so its
+                # data is spooled here (in the reading thread) before it is handed off
+                yield filename, mimetypes.guess_type(filename)[0], \
+                    lambda member=member: BulkUploadService._spool(archive.extractfile(member))
+
+    @staticmethod
+    def _store(stream: IO[bytes], filename: str, content_type: Optional[str]) -> Dict[str, Any]:
+        """Write one file to storage (runs in a pool thread)"""
+        try:
+            return AudioService.store_stream(stream, filename, content_type)
+        finally:
+            stream.close()
+
+    @staticmethod
+    def _store_all(entries: Iterable[BulkEntry], results: List[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Write every valid entry to storage from a bounded thread pool
+        Appends one result per entry to results; returns (result index, stored) per stored file
+        """
+        config = get_config()
+        workers = config.get('file_upload.bulk_upload_workers', 4)
+        max_files = config.get('file_upload.bulk_upload_max_files', 2000)
+
+        stored_files: List[Tuple[int, Dict[str, Any]]] = []
+        futures = {}
+
+        def collect(done) -> None:
+            for future in done:
+                index = futures.pop(future)
+                try:
+                    stored = future.result()
+                except Exception as e:
+                    stored = {'success': False, 'message': f'An error occurred: {str(e)}'}
+
+                if stored['success']:
+                    stored_files.append((index, stored))
+                else:
+                    results[index].update(success=False, message=stored['message'])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for filename, content_type, open_stream in entries:
+                    if len(results) >= max_files:
+                        results.append({'filename': filename, 'success': False,
+                                        'message': f'Too many files, at most {max_files} per request'})
+                        break
+
+                    results.append({'filename': filename, 'content_type': content_type})
+
+                    if not filename or not allowed_file(filename):
+                        results[-1].update(success=False,
+                                           message='Invalid file type. Allowed types: mp3, wav, ogg, m4a, flac')
+                        continue
+
+                    # Bound the files in flight (spooled archive members use disk/memory)
+                    if len(futures) >= workers * 2:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+                    future = executor.submit(BulkUploadService._store, open_stream(), filename, content_type)
+                    futures[future] = len(results) - 1
+
+            except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError, ArchiveTooLargeError) as e:
+                failure = {'success': False, 'message': f'Invalid archive: {str(e)}'}
+                if isinstance(e, ArchiveTooLargeError):
+                    failure.update(message=str(e), too_large=True)
+
+                # The archive broke off while reading the current member, or before any member
+                if results and 'success' not in results[-1] and len(results) - 1 not in futures.values():
+                    results[-1].update(failure)
+                else:
+                    results.append(dict(failure, filename=None))
+
+            finally:
+                collect(wait(futures).done)
+
+        return stored_files
+
+    @staticmethod
+    def bulk_upload(entries: Iterable[BulkEntry], user_id: int) -> Dict[str, Any]:
+        """
+        Upload many audio files, committing all their metadata in one transaction
+        Returns dict with success status, message, uploaded/failed counts and a per-file
+        results list (filename, success, message and file for stored files, unless they couldn't
+        be reloaded after the commit); 'too_large'
+        is True when an archive was over the size limit and nothing was uploaded
+        """
+        quota = UsageService.check_quota(user_id)
+        if not quota['success']:
+            return dict(quota, uploaded=0, failed=0, results=[])
+
+        results: List[Dict[str, Any]] = []
+        stored_files = BulkUploadService._store_all(entries, results)
+        stored_files.sort(key=lambda item: item[0])
+
+        # An oversized archive rejects the whole request, including files stored before it
+        too_large = next((result for result in results if result.get('too_large')), None)
+        if too_large is not None:
+            for index, stored in stored_files:
+                AudioService.delete_blob(stored['gridfs_file_id'])
+                results[index].update(success=False, message=too_large['message'])
+
+            for result in results:
+                result.pop('content_type', None)
+                result.pop('too_large', None)
+
+            return {
+                'success': False,
+                'message': too_large['message'],
+                'too_large': True,
+                'uploaded': 0,
+                'failed': len(results),
+                'results': results
+            }
+
+        if stored_files:
+            db = get_db_session()
+            error = None
+
+            try:
+                audio_files = AudioService.add_audio_files(
+                    [(stored, results[index]['filename'], results[index]['content_type'])
+                     for index, stored in stored_files],
+                    user_id
+                )
+
+                # The batch is all or nothing: it fails as a whole if it doesn't fit in the quota
+                usage = UsageService.record(
+                    user_id, sum(stored['file_size'] for _, stored in stored_files), len(audio_files)
+                )
+
+                if not usage['success']:
+                    error = usage['message']
+                else:
+                    # Identical content was already stored: drop the copies we just wrote
+                    BlobPurgeService.enqueue([
+                        stored['gridfs_file_id']
+                        for (_, stored), audio_file in zip(stored_files, audio_files)
+                        if audio_file.gridfs_file_id != stored['gridfs_file_id']
+                    ])
+
+                    # Read the IDs before the commit expires the rows (each would be loaded on its own)
+                    db.flush()
+                    file_ids = [audio_file.id for audio_file in audio_files]
+
+                    db.commit()
+
+            except Exception as e:
+                error = f'An error occurred: {str(e)}'
+
+            if error is not None:
+                db.rollback()
+
+                # Don't leave orphaned blobs behind if the metadata insert failed
+                for index, stored in stored_files:
+                    AudioService.delete_blob(stored['gridfs_file_id'])
+                    results[index].update(success=False, message=error)
+            else:
+                # Committed: reload the rows in one query rather than one per file. The files are
+                # uploaded even if that fails; they are just reported without their details
+                try:
+                    db.query(AudioFile).filter(AudioFile.id.in_(file_ids)).all()
+                    reloaded = True
+                except Exception as e:
+                    db.rollback()
+                    print(f"Could not reload bulk uploaded files: {e}")
+                    reloaded = False
+
+                for (index, _), audio_file in zip(stored_files, audio_files):
+                    results[index].update(success=True, message='File uploaded successfully')
+                    if reloaded:
+                        results[index]['file'] = audio_file
+
+        for result in results:
+            result.pop('content_type', None)
+
+        uploaded = sum(1 for result in results if result['success'])
+
+        if not results:
+            return {
+                'success': False,
+                'message': 'No files provided',
+                'uploaded': 0,
+                'failed': 0,
+                'results': []
+            }
+
+        return {
+            'success': uploaded > 0,
+            'message': f'{uploaded} of {len(results)} file(s) uploaded',
+            'uploaded': uploaded,
+            'failed': len(results) - uploaded,
+            'results': results
+        }
@@ -0,0 +1,328 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import Integer, bindparam, desc, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dbentities.audio_blob import AudioBlob
+from dbentities.audio_file import AudioFile
+from dbentities.audio_fingerprint import AudioFingerprint
+from dbentities.fingerprint_job import FingerprintJob
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+from dependencies.metrics import get_metrics
+from dependencies.fingerprint import HOP_SIZE, SAMPLE_RATE, fingerprint
+from dependencies.preview import decode_clip
+
+
+class FingerprintService:
+    """
+    Service for acoustic fingerprints (near-duplicate detection across encodings)
+
+    New content is queued in the fingerprint_jobs table in the upload transaction; a
+    worker (fingerprint-audio command or the in-app thread) computes its landmark
+    hashes, looks them up in the audio_fingerprints inverted index (one primary key
+    probe per hash, so the cost doesn't grow with the number of indexed files) and
+    links the blob to the best time-aligned match before indexing it in turn.
+    """
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> timedelta:
+        """Backoff before the next attempt after `attempts` failures"""
+        config = get_config()
+        base = config.get('fingerprint.retry_base_seconds', 60)
+        maximum = config.get('fingerprint.retry_max_seconds', 3600)
+        return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+    @staticmethod
+    def enqueue(content_hashes: List[str]) -> None:
+        """Queue fingerprinting of blobs in the current transaction (the caller commits)"""
+        if not content_hashes or not get_config().get('fingerprint.enabled', True):
+            return
+
+        db = get_db_session()
+        db.execute(
+            pg_insert(FingerprintJob)
+            .values([{'content_hash': content_hash} for content_hash in sorted(set(content_hashes))])
+            .on_conflict_do_nothing(index_elements=[FingerprintJob.content_hash])
+        )
+
+    @staticmethod
+    def enqueue_missing() -> int:
+        """Queue every blob that has not been fingerprinted yet (for content stored before fingerprints existed)"""
+        db = get_db_session()
+        result = db.execute(
+            pg_insert(FingerprintJob)
+            .from_select(['content_hash'], select(AudioBlob.content_hash).where(AudioBlob.fingerprinted_at.is_(None)))
+            .on_conflict_do_nothing(index_elements=[FingerprintJob.content_hash])
+        )
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def compute(gridfs_file_id: str, storage_codec: Optional[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Fingerprint the first fingerprint.max_seconds of a stored file
+        Returns (hashes, anchor frames), or None if the format can't be decoded here
+        """
+        config = get_config()
+        samples = decode_clip(gridfs_file_id, storage_codec, SAMPLE_RATE, 0, config.get('fingerprint.max_seconds', 600))
+        if samples is None:
+            return None
+
+        return fingerprint(samples, config.get('fingerprint.fan_out', 5))
+
+    @staticmethod
+    def _landmarks_param(hashes: np.ndarray, offsets: np.ndarray):
+        """(hash, time_offset) rows as a single unnest() of two array parameters"""
+        return func.unnest(
+            bindparam('hashes', hashes.tolist(), type_=ARRAY(Integer)),
+            bindparam('offsets', offsets.tolist(), type_=ARRAY(Integer))
+        ).table_valued('hash', 'time_offset').render_derived(name='landmarks')
+
+    @staticmethod
+    def lookup(hashes: np.ndarray, offsets: np.ndarray, exclude: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the indexed blob sharing the most landmarks with the given ones at a constant
+        time shift (a plain hash overlap would also match unrelated audio)
+        Only landmarks in the first fingerprint.query_seconds are looked up
+        Returns dict with content_hash, matches and score (share of looked-up landmarks), or None
+        """
+        config = get_config()
+        query_frames = int(config.get('fingerprint.query_seconds', 60) * SAMPLE_RATE / HOP_SIZE)
+        selected = offsets < query_frames
+        hashes, offsets = hashes[selected], offsets[selected]
+        if not len(hashes):
+            return None
+
+        db = get_db_session()
+        landmarks = FingerprintService._landmarks_param(hashes, offsets)
+        shift = AudioFingerprint.time_offset - landmarks.c.time_offset
+
+        stmt = (
+            select(AudioFingerprint.content_hash, func.count().label('matches'))
+            .select_from(landmarks)
+            .join(AudioFingerprint, AudioFingerprint.hash == landmarks.c.hash)
+            .group_by(AudioFingerprint.content_hash, shift)
+            .order_by(desc('matches'), AudioFingerprint.content_hash)
+            .limit(1)
+        )
+        if exclude is not None:
+            stmt = stmt.where(AudioFingerprint.content_hash != exclude)
+
+        best = db.execute(stmt).first()
+        if best is None:
+            return None
+
+        return {
+            'content_hash': best.content_hash,
+            'matches': best.matches,
+            'score': best.matches / len(hashes)
+        }
+
+    @staticmethod
+    def _index(content_hash: str, hashes: np.ndarray, offsets: np.ndarray, match: Optional[Dict[str, Any]]) -> bool:
+        """
+        Record a blob's fingerprint and near-duplicate link in the current transaction
+        The blob row is updated (and so locked) first: if it is gone, nothing is indexed
+        Returns whether the blob was indexed
+        """
+        db = get_db_session()
+        indexed = db.execute(
+            update(AudioBlob)
+            .where(AudioBlob.content_hash == content_hash, AudioBlob.fingerprinted_at.is_(None))
+            .values(
+                fingerprinted_at=datetime.utcnow(),
+                near_duplicate_of=match['content_hash'] if match else None,
+                near_duplicate_score=match['score'] if match else None
+            )
+            .returning(AudioBlob.content_hash)
+        ).first()
+
+        if indexed is None or not len(hashes):
+            return indexed is not None
+
+        landmarks = FingerprintService._landmarks_param(hashes, offsets)
+        db.execute(
+            pg_insert(AudioFingerprint)
+            .from_select(['hash', 'time_offset', 'content_hash'],
+                         select(landmarks.c.hash, landmarks.c.time_offset, literal(content_hash)))
+            .on_conflict_do_nothing()
+        )
+        return True
+
+    @staticmethod
+    def process_batch(batch_size: int = 5) -> Dict[str, int]:
+        """
+        Fingerprint up to batch_size due jobs
+        Jobs are claimed with SKIP LOCKED, so several workers can run side by side, and each
+        one runs in its own savepoint, so a failing job is still rescheduled
+        Returns dict with indexed, near_duplicates, skipped (not decodable / blob gone) and failed counts
+        """
+        db = get_db_session()
+        config = get_config()
+        metrics = get_metrics()
+        now = datetime.utcnow()
+        max_attempts = config.get('fingerprint.max_attempts', 5)
+        min_matches = config.get('fingerprint.min_matches', 20)
+        min_score = config.get('fingerprint.min_score', 0.1)
+        counts = {'indexed': 0, 'near_duplicates': 0, 'skipped': 0, 'failed': 0}
+
+        jobs = db.query(FingerprintJob).filter(
+            FingerprintJob.next_attempt_at <= now
+        ).order_by(FingerprintJob.next_attempt_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not jobs:
+            db.rollback()
+            return counts
+
+        blobs = {
+            blob.content_hash: blob for blob in db.execute(
+                select(AudioBlob.content_hash, AudioBlob.gridfs_file_id, AudioBlob.storage_codec,
+                       AudioBlob.fingerprinted_at)
+                .where(AudioBlob.content_hash.in_([job.content_hash for job in jobs]))
+            )
+        }
+
+        for job in jobs:
+            blob = blobs.get(job.content_hash)
+            started = time.perf_counter()
+
+            try:
+                with db.begin_nested():
+                    indexed, match = False, None
+                    landmarks = None
+                    if blob is not None and blob.fingerprinted_at is None:
+                        landmarks = FingerprintService.compute(blob.gridfs_file_id, blob.storage_codec)
+
+                    if landmarks is not None:
+                        hashes, offsets = landmarks
+                        lookup_started = time.perf_counter()
+                        match = FingerprintService.lookup(hashes, offsets, exclude=job.content_hash)
+                        metrics.observe('fingerprint.lookup_seconds', time.perf_counter() - lookup_started)
+
+                        if match is not None and (match['matches'] < min_matches or match['score'] < min_score):
+                            match = None
+
+                        indexed = FingerprintService._index(job.content_hash, hashes, offsets, match)
+
+                    db.delete(job)
+
+                if indexed:
+                    counts['indexed'] += 1
+                    counts['near_duplicates'] += int(match is not None)
+                    metrics.increment('fingerprint.landmarks', len(hashes))
+                    metrics.observe('fingerprint.seconds', time.perf_counter() - started)
+                else:
+                    counts['skipped'] += 1
+
+            except Exception as e:
+                print(f"Error fingerprinting {job.content_hash}: {e}")
+                counts['failed'] += 1
+                job.attempts += 1
+                job.last_error = str(e)
+
+                if job.attempts >= max_attempts:
+                    db.delete(job)
+                else:
+                    job.next_attempt_at = now + FingerprintService._retry_delay(job.attempts)
+
+        db.commit()
+
+        for name, count in counts.items():
+            metrics.increment(f'fingerprint.{name}', count)
+
+        return counts
+
+    @staticmethod
+    def queue_depth() -> int:
+        """Number of blobs waiting to be fingerprinted (also published as a gauge)"""
+        db = get_db_session()
+        depth = db.query(func.count(FingerprintJob.content_hash)).scalar()
+        get_metrics().set_gauge('fingerprint.queue_depth', depth)
+        return depth
+
+    @staticmethod
+    def run_worker(batch_size: int = 5, interval_seconds: float = 10, once: bool = False,
+                   stop_event: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        Process due jobs batch after batch, sleeping `interval_seconds` whenever the queue is drained
+        With once=True, stops as soon as nothing is due. Returns total counts
+        """
+        stop_event = stop_event or threading.Event()
+        totals = {'indexed': 0, 'near_duplicates': 0, 'skipped': 0, 'failed': 0}
+
+        while not stop_event.is_set():
+            result = FingerprintService.process_batch(batch_size)
+            for name, count in result.items():
+                totals[name] += count
+
+            if result['indexed'] + result['skipped'] + result['failed'] < batch_size:
+                FingerprintService.queue_depth()
+                get_db_session().rollback()
+
+                if once:
+                    break
+                stop_event.wait(interval_seconds)
+
+        return totals
+
+    @staticmethod
+    def start_background_worker(app) -> threading.Thread:
+        """Run the fingerprint worker in a daemon thread of this process"""
+        config = get_config()
+        batch_size = config.get('fingerprint.batch_size', 5)
+        interval_seconds = config.get('fingerprint.interval_seconds', 10)
+
+        def work():
+            while True:
+                try:
+                    with app.app_context():
+                        FingerprintService.run_worker(batch_size, interval_seconds, once=True)
+                except Exception as e:
+                    print(f"Error in fingerprint worker: {e}")
+                time.sleep(interval_seconds)
+
+        thread = threading.Thread(target=work, name='fingerprint-worker', daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def find_duplicates(audio_file: AudioFile) -> List[Dict[str, Any]]:
+        """
+        Get the other files of the same user with identical content or content linked to
+        this file's as a near duplicate (in either direction)
+        Returns list of dicts with file, match ('exact' or 'near') and score
+        """
+        if audio_file.content_hash is None:
+            return []
+
+        db = get_db_session()
+        linked = {audio_file.content_hash: 1.0}
+
+        blob = db.get(AudioBlob, audio_file.content_hash)
+        if blob is not None and blob.near_duplicate_of is not None:
+            linked[blob.near_duplicate_of] = blob.near_duplicate_score
+
+        for content_hash, score in db.execute(
+            select(AudioBlob.content_hash, AudioBlob.near_duplicate_score)
+            .where(AudioBlob.near_duplicate_of == audio_file.content_hash)
+        ):
+            linked[content_hash] = max(score, linked.get(content_hash, 0))
+
+        files = db.query(AudioFile).filter(
+            AudioFile.user_id == audio_file.user_id,
+            AudioFile.id != audio_file.id,
+            AudioFile.content_hash.in_(list(linked))
+        ).order_by(AudioFile.id).all()
+
+        return [
+            {
+                'file': file,
+                'match': 'exact' if file.content_hash == audio_file.content_hash else 'near',
+                'score': linked[file.content_hash]
+            }
+            for file in files
+        ]
@@ -0,0 +1,273 @@
+import io
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dbentities.audio_blob import AudioBlob
+from dbentities.audio_file import AudioFile
+from dbentities.preview_job import PreviewJob
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+from dependencies.metrics import get_metrics
+from dependencies.storage import get_storage
+from dependencies.preview import PREVIEW_FORMATS, decode_clip, encode_preview
+from services.blob_purge_service import BlobPurgeService
+
+
+class PreviewService:
+    """
+    Service for preview renditions (short, mono, downsampled clips for mobile listeners)
+
+    New content is queued in the preview_jobs table in the upload transaction; a
+    worker (generate-previews command or the in-app thread) decodes the start of
+    the file, resamples it with NumPy, encodes the clip at a low bitrate with ffmpeg
+    and stores it as a blob next to the audio blob (AudioBlob.preview_file_id).
+    Failures are retried with backoff.
+    """
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> timedelta:
+        """Backoff before the next attempt after `attempts` failures"""
+        config = get_config()
+        base = config.get('preview.retry_base_seconds', 60)
+        maximum = config.get('preview.retry_max_seconds', 3600)
+        return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+    @staticmethod
+    def enqueue(content_hashes: List[str]) -> None:
+        """Queue preview generation for blobs in the current transaction (the caller commits)"""
+        if not content_hashes or not get_config().get('preview.enabled', True):
+            return
+
+        db = get_db_session()
+        db.execute(
+            pg_insert(PreviewJob)
+            .values([{'content_hash': content_hash} for content_hash in sorted(set(content_hashes))])
+            .on_conflict_do_nothing(index_elements=[PreviewJob.content_hash])
+        )
+
+    @staticmethod
+    def enqueue_missing() -> int:
+        """Queue every blob that has no preview yet (for content stored before previews existed)"""
+        db = get_db_session()
+        result = db.execute(
+            pg_insert(PreviewJob)
+            .from_select(['content_hash'], select(AudioBlob.content_hash).where(AudioBlob.preview_file_id.is_(None)))
+            .on_conflict_do_nothing(index_elements=[PreviewJob.content_hash])
+        )
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def render(gridfs_file_id: str, storage_codec: Optional[str], original_bitrate: Optional[int],
+               preview_format: str) -> Optional[bytes]:
+        """
+        Build the preview of a stored file: the configured clip, mixed down to mono,
+        resampled (WAV natively with NumPy, other formats decoded by ffmpeg at the target
+        rate) and encoded in preview_format at preview.bitrate_kbps
+        Returns None if ffmpeg is missing, the format can't be decoded here, or the preview
+        would not stream at well below the original's bitrate (when that is known)
+        """
+        config = get_config()
+        sample_rate = config.get('preview.sample_rate', 22050)
+        bitrate_kbps = config.get('preview.bitrate_kbps', 64)
+        max_bitrate = original_bitrate * config.get('preview.max_bitrate_ratio', 0.5) if original_bitrate else None
+
+        # Already low-bitrate originals: not worth a second blob (or decoding anything)
+        if max_bitrate is not None and bitrate_kbps * 1000 > max_bitrate:
+            return None
+
+        ffmpeg = shutil.which(config.get('waveform.ffmpeg_path', 'ffmpeg'))
+        if ffmpeg is None:
+            return None
+
+        clip = decode_clip(gridfs_file_id, storage_codec, sample_rate,
+                           config.get('preview.start_seconds', 0), config.get('preview.seconds', 30))
+        if clip is None or not len(clip):
+            return None
+
+        preview = encode_preview(clip, sample_rate, ffmpeg, preview_format, bitrate_kbps)
+
+        # The encoder's real rate, container overhead included
+        if max_bitrate is not None and len(preview) * 8 / (len(clip) / sample_rate) > max_bitrate:
+            return None
+
+        return preview
+
+    @staticmethod
+    def _attach(content_hash: str, preview: bytes, preview_format: str) -> None:
+        """
+        Store a preview and attach it to its AudioBlob in the current transaction
+        If the blob is gone (or already has a preview) the new copy is queued for purge
+        """
+        db = get_db_session()
+        _, _, content_type, extension = PREVIEW_FORMATS[preview_format]
+        storage = get_storage()
+        stored = storage.put_stream(io.BytesIO(preview), filename=f'{content_hash}.preview.{extension}',
+                                    content_type=content_type)
+
+        try:
+            attached = db.execute(
+                update(AudioBlob)
+                .where(AudioBlob.content_hash == content_hash, AudioBlob.preview_file_id.is_(None))
+                .values(
+                    preview_file_id=stored['gridfs_file_id'],
+                    preview_size=stored['file_size'],
+                    preview_content_type=content_type
+                )
+                .returning(AudioBlob.content_hash)
+            ).first()
+
+            if attached is None:
+                BlobPurgeService.enqueue([stored['gridfs_file_id']])
+
+        except Exception:
+            storage.delete(stored['gridfs_file_id'])
+            raise
+
+    @staticmethod
+    def process_batch(batch_size: int = 5) -> Dict[str, int]:
+        """
+        Generate previews for up to batch_size due jobs
+        Jobs are claimed with SKIP LOCKED, so several workers can run side by side, and each
+        one runs in its own savepoint, so a failing job is still rescheduled
+        Returns dict with generated, skipped (not decodable / not worth it / blob gone) and failed counts
+        """
+        db = get_db_session()
+        metrics = get_metrics()
+        now = datetime.utcnow()
+        config = get_config()
+        max_attempts = config.get('preview.max_attempts', 5)
+        preview_format = config.get('preview.format', 'mp3')
+        counts = {'generated': 0, 'skipped': 0, 'failed': 0}
+
+        jobs = db.query(PreviewJob).filter(
+            PreviewJob.next_attempt_at <= now
+        ).order_by(PreviewJob.next_attempt_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not jobs:
+            db.rollback()
+            return counts
+
+        # Every file of a blob has the same content, hence the same header bitrate (if read)
+        original_bitrate = (
+            select(func.max(AudioFile.bitrate))
+            .where(AudioFile.content_hash == AudioBlob.content_hash)
+            .correlate(AudioBlob)
+            .scalar_subquery()
+        )
+        blobs = {
+            blob.content_hash: blob for blob in db.execute(
+                select(AudioBlob.content_hash, AudioBlob.gridfs_file_id, AudioBlob.storage_codec,
+                       AudioBlob.preview_file_id, original_bitrate.label('bitrate'))
+                .where(AudioBlob.content_hash.in_([job.content_hash for job in jobs]))
+            )
+        }
+
+        for job in jobs:
+            blob = blobs.get(job.content_hash)
+            started = time.perf_counter()
+
+            try:
+                with db.begin_nested():
+                    preview = None
+                    if blob is not None and blob.preview_file_id is None:
+                        preview = PreviewService.render(blob.gridfs_file_id, blob.storage_codec, blob.bitrate,
+                                                        preview_format)
+
+                    if preview is not None:
+                        PreviewService._attach(job.content_hash, preview, preview_format)
+
+                    db.delete(job)
+
+                if preview is not None:
+                    counts['generated'] += 1
+                    metrics.observe('preview.generate_seconds', time.perf_counter() - started)
+                else:
+                    counts['skipped'] += 1
+
+            except Exception as e:
+                print(f"Error generating preview of {job.content_hash}: {e}")
+                counts['failed'] += 1
+                job.attempts += 1
+                job.last_error = str(e)
+
+                if job.attempts >= max_attempts:
+                    db.delete(job)
+                else:
+                    job.next_attempt_at = now + PreviewService._retry_delay(job.attempts)
+
+        db.commit()
+
+        for name, count in counts.items():
+            metrics.increment(f'preview.{name}', count)
+
+        return counts
+
+    @staticmethod
+    def queue_depth() -> int:
+        """Number of blobs waiting for a preview (also published as a gauge)"""
+        db = get_db_session()
+        depth = db.query(func.count(PreviewJob.content_hash)).scalar()
+        get_metrics().set_gauge('preview.queue_depth', depth)
+        return depth
+
+    @staticmethod
+    def run_worker(batch_size: int = 5, interval_seconds: float = 10, once: bool = False,
+                   stop_event: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        Process due jobs batch after batch, sleeping `interval_seconds` whenever the queue is drained
+        With once=True, stops as soon as nothing is due. Returns total counts
+        """
+        stop_event = stop_event or threading.Event()
+        totals = {'generated': 0, 'skipped': 0, 'failed': 0}
+
+        while not stop_event.is_set():
+            result = PreviewService.process_batch(batch_size)
+            for name, count in result.items():
+                totals[name] += count
+
+            if sum(result.values()) < batch_size:
+                PreviewService.queue_depth()
+                get_db_session().rollback()
+
+                if once:
+                    break
+                stop_event.wait(interval_seconds)
+
+        return totals
+
+    @staticmethod
+    def start_background_worker(app) -> threading.Thread:
+        """Run the preview worker in a daemon thread of this process"""
+        config = get_config()
+        batch_size = config.get('preview.batch_size', 5)
+        interval_seconds = config.get('preview.interval_seconds', 10)
+
+        def work():
+            while True:
+                try:
+                    with app.app_context():
+                        PreviewService.run_worker(batch_size, interval_seconds, once=True)
+                except Exception as e:
+                    print(f"Error in preview worker: {e}")
+                time.sleep(interval_seconds)
+
+        thread = threading.Thread(target=work, name='preview-worker', daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def get_preview(audio_file: AudioFile) -> Optional[Any]:
+        """Get the (preview_file_id, preview_size, preview_content_type) of a file's content, if generated"""
+        if audio_file.content_hash is None:
+            return None
+
+        db = get_db_session()
+        return db.execute(
+            select(AudioBlob.preview_file_id, AudioBlob.preview_size, AudioBlob.preview_content_type)
+            .where(AudioBlob.content_hash == audio_file.content_hash, AudioBlob.preview_file_id.isnot(None))
+        ).first()
@@ -0,0 +1,184 @@
+import heapq
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from bson import ObjectId
+from sqlalchemy import select, literal, func, distinct, union_all
+from dbentities.audio_file import AudioFile
+from dbentities.audio_blob import AudioBlob
+from dbentities.legacy_peaks import LegacyPeaks
+from dbentities.upload_session import UploadSession
+from dbentities.blob_purge import BlobPurge
+from dependencies.database import db, get_db_session
+from dependencies.storage import get_storage
+from services.blob_purge_service import BlobPurgeService
+
+# Where a blob ID was seen: Postgres tables referencing it (DERIVED: blobs generated
+# from an audio blob, such as waveform peaks and previews)...
+FILE, BLOB, DERIVED, SESSION, PURGE = 'file', 'blob', 'derived', 'session', 'purge'
+REFERENCE_SOURCES = {FILE, BLOB, DERIVED, SESSION, PURGE}
+# ...or storage holding a completed blob / partial-upload data for it
+STORED, PART = 'stored', 'part'
+
+
+class ReconcileService:
+    """
+    Service for reconciling Postgres metadata with blob storage
+
+    Both sides are streamed as ID-sorted sequences (a server-side cursor ordered by
+    COLLATE "C" on Postgres, the backend's ordered listings on the storage side)
+    and merge-joined, so memory use stays constant regardless of the number of files.
+    """
+
+    SAMPLE_SIZE = 20
+
+    @staticmethod
+    def _iter_referenced_ids(connection, fetch_size: int) -> Iterator[Tuple[str, Set[str]]]:
+        """Yield (blob ID, tables referencing it) for every ID known to Postgres, in byte order"""
+        references = union_all(
+            select(AudioFile.gridfs_file_id.label('file_id'), literal(FILE).label('source')),
+            select(AudioBlob.gridfs_file_id, literal(BLOB)),
+            select(AudioBlob.peaks_file_id, literal(DERIVED)).where(AudioBlob.peaks_file_id.isnot(None)),
+            select(AudioBlob.preview_file_id, literal(DERIVED)).where(AudioBlob.preview_file_id.isnot(None)),
+            select(LegacyPeaks.peaks_file_id, literal(DERIVED)),
+            select(UploadSession.gridfs_file_id, literal(SESSION)),
+            select(BlobPurge.gridfs_file_id, literal(PURGE))
+        ).subquery()
+
+        # Byte order, matching Python string comparison and ObjectId order in MongoDB
+        file_id = references.c.file_id.collate('C')
+        stmt = select(file_id, func.array_agg(distinct(references.c.source))).group_by(file_id).order_by(file_id)
+
+        result = connection.execution_options(stream_results=True, yield_per=fetch_size).execute(stmt)
+        for row in result:
+            yield row[0], set(row[1])
+
+    @staticmethod
+    def _ensure_sorted(file_ids: Iterator[str], name: str) -> Iterator[str]:
+        """Pass IDs through, failing loudly if a source is not in ascending order (the merge relies on it)"""
+        previous = None
+        for file_id in file_ids:
+            if previous is not None and file_id < previous:
+                raise ValueError(f'{name} IDs are not sorted ({previous!r} before {file_id!r})')
+            previous = file_id
+            yield file_id
+
+    @staticmethod
+    def _merge(referenced: Iterator[Tuple[str, Set[str]]], stored: Iterator[str],
+               parts: Iterator[str]) -> Iterator[Tuple[str, Set[str]]]:
+        """Merge-join the sorted sources into (blob ID, everywhere it was seen)"""
+        tagged = heapq.merge(
+            referenced,
+            ((file_id, {STORED}) for file_id in ReconcileService._ensure_sorted(stored, 'Stored blob')),
+            ((file_id, {PART}) for file_id in ReconcileService._ensure_sorted(parts, 'Partial upload')),
+            key=lambda item: item[0]
+        )
+
+        for file_id, group in groupby(tagged, key=lambda item: item[0]):
+            seen = set()
+            for _, sources in group:
+                seen |= sources
+            yield file_id, seen
+
+    @staticmethod
+    def _is_older_than(file_id: str, cutoff: datetime) -> bool:
+        """Check an ID's creation time (embedded in the ObjectId) against cutoff"""
+        if not ObjectId.is_valid(file_id):
+            return True
+        return ObjectId(file_id).generation_time < cutoff
+
+    @staticmethod
+    def _unreferenced(file_ids: List[str]) -> List[str]:
+        """Re-check a batch against the current data, dropping IDs that gained a reference meanwhile"""
+        referenced = BlobPurgeService.referenced(file_ids)
+        return [file_id for file_id in file_ids if file_id not in referenced]
+
+    @staticmethod
+    def _repair_blobs(file_ids: List[str]) -> int:
+        """Queue orphaned blobs for the purge worker; returns how many were queued"""
+        file_ids = ReconcileService._unreferenced(file_ids)
+        BlobPurgeService.enqueue(file_ids)
+        get_db_session().commit()
+        return len(file_ids)
+
+    @staticmethod
+    def _repair_parts(file_ids: List[str]) -> int:
+        """Delete orphaned partial-upload data; returns how many IDs were discarded"""
+        file_ids = ReconcileService._unreferenced(file_ids)
+        get_db_session().rollback()
+        if file_ids:
+            get_storage().discard_parts(file_ids)
+        return len(file_ids)
+
+    @staticmethod
+    def reconcile(repair: bool = False, batch_size: int = 1000, min_age_minutes: int = 60,
+                  on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Compare every blob ID in Postgres with storage and report (optionally repair) mismatches
+
+        - orphan_blobs: stored blobs nothing references (repair: queue for purge)
+        - orphan_parts: partial-upload data without a session or blob (repair: discard)
+        - dangling_files / dangling_blobs: audio_files / audio_blobs rows whose blob is
+          missing from storage (reported only, the data cannot be recovered)
+
+        Storage objects younger than min_age_minutes are skipped, as their metadata
+        may not be committed yet. Returns dict with counts and sample IDs per category
+        """
+        storage = get_storage()
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=min_age_minutes)
+        categories = ('orphan_blobs', 'orphan_parts', 'dangling_files', 'dangling_blobs')
+
+        report: Dict[str, Any] = {'checked': 0, 'repaired_blobs': 0, 'repaired_parts': 0}
+        report.update({category: 0 for category in categories})
+        report['samples'] = {category: [] for category in categories}
+
+        pending = {'orphan_blobs': [], 'orphan_parts': []}
+        repairers = {'orphan_blobs': ('repaired_blobs', ReconcileService._repair_blobs),
+                     'orphan_parts': ('repaired_parts', ReconcileService._repair_parts)}
+
+        def record(category: str, file_id: str) -> None:
+            report[category] += 1
+            if len(report['samples'][category]) < ReconcileService.SAMPLE_SIZE:
+                report['samples'][category].append(file_id)
+
+            if repair and category in pending:
+                pending[category].append(file_id)
+                if len(pending[category]) >= batch_size:
+                    flush(category)
+
+        def flush(category: str) -> None:
+            if pending[category]:
+                counter, repairer = repairers[category]
+                report[counter] += repairer(pending[category])
+                pending[category] = []
+
+        with db.engine.connect() as connection:
+            merged = ReconcileService._merge(
+                ReconcileService._iter_referenced_ids(connection, batch_size),
+                storage.iter_file_ids(),
+                storage.iter_part_ids()
+            )
+
+            for file_id, seen in merged:
+                report['checked'] += 1
+
+                if not seen & REFERENCE_SOURCES:
+                    if ReconcileService._is_older_than(file_id, cutoff):
+                        if STORED in seen:
+                            record('orphan_blobs', file_id)
+                        elif PART in seen:
+                            record('orphan_parts', file_id)
+
+                elif STORED not in seen:
+                    if FILE in seen:
+                        record('dangling_files', file_id)
+                    elif BLOB in seen:
+                        record('dangling_blobs', file_id)
+
+                if on_progress is not None and report['checked'] % 100000 == 0:
+                    on_progress(report)
+
+        for category in pending:
+            flush(category)
+
+        return report
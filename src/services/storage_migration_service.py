@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Optional
+from dependencies.storage import StorageBackend, ChunkReader, create_backend
+
+
+class StorageMigrationService:
+    """Service for copying blobs between storage backends (e.g. GridFS to local disk)"""
+
+    @staticmethod
+    def _copy_blob(source: StorageBackend, target: StorageBackend, file_id: str) -> str:
+        """
+        Copy one blob, keeping its ID
+        Returns 'copied', 'skipped' (already present with the same size) or 'missing'
+        """
+        source_stat = source.stat(file_id)
+        if source_stat is None:
+            return 'missing'
+
+        target_stat = target.stat(file_id)
+        if target_stat is not None:
+            if target_stat.length == source_stat.length:
+                return 'skipped'
+            target.delete(file_id)
+
+        chunks = source.open_range(file_id)
+        if chunks is None:
+            return 'missing'
+
+        result = target.put_stream(ChunkReader(chunks), file_id=file_id)
+        if not result['success'] or result['file_size'] != source_stat.length:
+            target.delete(file_id)
+            raise IOError(f"Copied {result.get('file_size')} of {source_stat.length} bytes")
+
+        return 'copied'
+
+    @staticmethod
+    def migrate(source_name: str, target_name: str, workers: int = 8,
+                on_progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """
+        Copy every blob from the source backend to the target backend in parallel
+        At most workers * 4 copies are queued at a time, so memory stays flat for any
+        number of blobs. Safe to re-run: blobs already copied are skipped
+        Returns counts of copied, skipped, missing and failed blobs
+        """
+        source = create_backend(source_name)
+        target = create_backend(target_name)
+        counts = {'copied': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                file_id = pending.pop(future)
+                try:
+                    counts[future.result()] += 1
+                except Exception as e:
+                    counts['failed'] += 1
+                    print(f"Error copying blob {file_id}: {e}")
+
+            if on_progress is not None:
+                on_progress(counts)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for file_id in source.iter_file_ids():
+                if len(pending) >= workers * 4:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+                future = executor.submit(StorageMigrationService._copy_blob, source, target, file_id)
+                pending[future] = file_id
+
+            done, _ = wait(pending)
+            collect(done)
+
+        return counts
@@ -0,0 +1,361 @@
+import hashlib
+import uuid
+from typing import Dict, Any, IO, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dbentities.upload_session import UploadSession
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+from dependencies.storage import ChunkReader, get_storage
+from dependencies.storage.codec import get_upload_codec
+from dependencies.audio_metadata import HeadTailCapture
+from dependencies.constants import allowed_file, MAX_FILE_SIZE_BYTES
+from basemodels.audio import UploadSessionCreateRequest
+from services.audio_service import AudioService
+from services.blob_purge_service import BlobPurgeService
+from services.usage_service import UsageService
+
+
+class UploadSessionService:
+    """
+    Service for resumable (chunked) uploads
+
+    Each session pre-allocates a blob ID and received bytes are written straight
+    into storage as they arrive (fs.chunks for GridFS, a .partial file for the
+    local backend). The blob only becomes visible on finalize, so a partial
+    upload never shows up as a stored file.
+    """
+
+    @staticmethod
+    def _session_ttl() -> timedelta:
+        """Idle time after which an unfinished session is swept"""
+        config = get_config()
+        return timedelta(minutes=config.get('file_upload.resumable_session_ttl_minutes', 1440))
+
+    @staticmethod
+    def _get_locked_session(session_id: str, user_id: int) -> Optional[UploadSession]:
+        """Get a session owned by user_id, locking its row for the rest of the transaction"""
+        db = get_db_session()
+        return db.query(UploadSession).filter(
+            UploadSession.id == session_id,
+            UploadSession.user_id == user_id
+        ).with_for_update().first()
+
+    @staticmethod
+    def _read_exact(stream: IO[bytes], size: int) -> bytes:
+        """Read up to `size` bytes, only returning fewer if the stream is exhausted"""
+        parts = []
+        remaining = size
+
+        while remaining > 0:
+            part = stream.read(remaining)
+            if not part:
+                break
+            parts.append(part)
+            remaining -= len(part)
+
+        return b''.join(parts)
+
+    @staticmethod
+    def create_session(session_data: UploadSessionCreateRequest, user_id: int) -> Dict[str, Any]:
+        """
+        Start a resumable upload
+        Returns dict with success status, message and the new session
+        """
+        db = get_db_session()
+
+        try:
+            if not allowed_file(session_data.filename):
+                return {
+                    'success': False,
+                    'message': 'Invalid file type. Allowed types: mp3, wav, ogg, m4a, flac'
+                }
+
+            if session_data.file_size > MAX_FILE_SIZE_BYTES:
+                return {
+                    'success': False,
+                    'message': f'File too large. Maximum size: {MAX_FILE_SIZE_BYTES / (1024 * 1024)} MB'
+                }
+
+            quota = UsageService.check_quota(user_id, session_data.file_size)
+            if not quota['success']:
+                return quota
+
+            upload_session = UploadSession(
+                id=uuid.uuid4().hex,
+                user_id=user_id,
+                filename=session_data.filename,
+                content_type=session_data.content_type or 'audio/mpeg',
+                file_size=session_data.file_size,
+                chunk_size=get_storage().chunk_size,
+                offset=0,
+                gridfs_file_id=str(ObjectId()),
+                expires_at=datetime.utcnow() + UploadSessionService._session_ttl()
+            )
+
+            db.add(upload_session)
+            db.commit()
+            db.refresh(upload_session)
+
+            return {
+                'success': True,
+                'message': 'Upload session created',
+                'session': upload_session
+            }
+
+        except Exception as e:
+            db.rollback()
+            return {
+                'success': False,
+                'message': f'An error occurred: {str(e)}'
+            }
+
+    @staticmethod
+    def get_session(session_id: str, user_id: int) -> Optional[UploadSession]:
+        """Get an upload session owned by user_id"""
+        db = get_db_session()
+        return db.query(UploadSession).filter(
+            UploadSession.id == session_id,
+            UploadSession.user_id == user_id
+        ).first()
+
+    @staticmethod
+    def append_chunk(session_id: str, user_id: int, offset: int, stream: IO[bytes]) -> Dict[str, Any]:
+        """
+        Write bytes starting at `offset` into the session's partial blob
+        The body is consumed in chunk_size pieces; a trailing partial piece is only
+        kept when it completes the file, so the returned offset is always where the
+        client should resume. Returns dict with success status, message and offset
+        ('conflict' is True when `offset` does not match the server's offset)
+        """
+        db = get_db_session()
+
+        try:
+            upload_session = UploadSessionService._get_locked_session(session_id, user_id)
+
+            if not upload_session:
+                return {
+                    'success': False,
+                    'message': 'Upload session not found',
+                    'not_found': True
+                }
+
+            if offset != upload_session.offset:
+                db.rollback()
+                return {
+                    'success': False,
+                    'message': f'Offset mismatch, expected {upload_session.offset}',
+                    'conflict': True,
+                    'offset': upload_session.offset
+                }
+
+            storage = get_storage()
+            chunk_size = upload_session.chunk_size
+
+            # Data past the committed offset is left over from an interrupted request
+            storage.truncate_part(upload_session.gridfs_file_id, offset)
+
+            while offset < upload_session.file_size:
+                piece = UploadSessionService._read_exact(
+                    stream, min(chunk_size, upload_session.file_size - offset)
+                )
+
+                # A short piece means the body ended mid-chunk; drop it unless it ends the file
+                if not piece or (len(piece) < chunk_size and offset + len(piece) != upload_session.file_size):
+                    break
+
+                storage.write_part(upload_session.gridfs_file_id, offset, piece)
+                offset += len(piece)
+
+            upload_session.offset = offset
+            upload_session.expires_at = datetime.utcnow() + UploadSessionService._session_ttl()
+            db.commit()
+
+            return {
+                'success': True,
+                'message': 'Chunk received',
+                'offset': offset
+            }
+
+        except Exception as e:
+            db.rollback()
+            return {
+                'success': False,
+                'message': f'An error occurred: {str(e)}'
+            }
+
+    @staticmethod
+    def finalize(session_id: str, user_id: int) -> Dict[str, Any]:
+        """
+        Complete a resumable upload and create its AudioFile through AudioService
+        Returns dict with success status, message and the new file
+        """
+        db = get_db_session()
+        encoded_file_id = None
+
+        try:
+            upload_session = UploadSessionService._get_locked_session(session_id, user_id)
+
+            if not upload_session:
+                return {
+                    'success': False,
+                    'message': 'Upload session not found',
+                    'not_found': True
+                }
+
+            if upload_session.offset != upload_session.file_size:
+                db.rollback()
+                return {
+                    'success': False,
+                    'message': (f'Upload incomplete: {upload_session.offset} of '
+                                f'{upload_session.file_size} bytes received')
+                }
+
+            # Publish the received data as a regular blob
+            storage = get_storage()
+            storage.complete_part(
+                upload_session.gridfs_file_id,
+                upload_session.file_size,
+                filename=upload_session.filename,
+                content_type=upload_session.content_type
+            )
+
+            if get_upload_codec(upload_session.filename) is not None:
+                # Chunks arrive at client-chosen offsets, so types selected by storage.compression
+                # are encoded (and hashed) from the received blob in one pass, like other uploads;
+                # the received copy is purged once the file is recorded
+                stored = AudioService.store_stream(
+                    ChunkReader(storage.open_range(upload_session.gridfs_file_id)),
+                    upload_session.filename, upload_session.content_type
+                )
+                if not stored['success']:
+                    db.rollback()
+                    return stored
+
+                encoded_file_id = stored['gridfs_file_id']
+
+            else:
+                # The hash can't be carried across requests, so compute it in one streaming pass
+                # (keeping the start and end of the content for its headers on the way)
+                sha256 = hashlib.sha256()
+                capture = HeadTailCapture()
+                for chunk in storage.open_range(upload_session.gridfs_file_id):
+                    sha256.update(chunk)
+                    capture.feed(chunk)
+
+                stored = {
+                    'gridfs_file_id': upload_session.gridfs_file_id,
+                    'file_size': upload_session.file_size,
+                    'sha256': sha256.hexdigest(),
+                    'metadata': AudioService.probe_metadata(
+                        upload_session.gridfs_file_id, None, upload_session.filename, upload_session.file_size,
+                        capture.head, capture.tail
+                    )
+                }
+
+            audio_file = AudioService.add_audio_file(
+                stored,
+                upload_session.filename,
+                upload_session.content_type,
+                user_id
+            )
+
+            usage = UsageService.record(user_id, stored['file_size'], 1)
+            if not usage['success']:
+                # Over quota since the session started: the upload can't be retried, so drop it
+                db.rollback()
+                upload_session = UploadSessionService._get_locked_session(session_id, user_id)
+                if upload_session:
+                    BlobPurgeService.enqueue([upload_session.gridfs_file_id, encoded_file_id])
+                    db.delete(upload_session)
+                    db.commit()
+                return usage
+
+            # Drop the received copy if it was encoded, and the stored one if identical content
+            # was already stored
+            purged_file_ids = [upload_session.gridfs_file_id] if encoded_file_id is not None else []
+            if audio_file.gridfs_file_id != stored['gridfs_file_id']:
+                purged_file_ids.append(stored['gridfs_file_id'])
+            BlobPurgeService.enqueue(purged_file_ids)
+
+            db.delete(upload_session)
+            db.commit()
+            db.refresh(audio_file)
+
+            return {
+                'success': True,
+                'message': 'File uploaded successfully',
+                'file': audio_file
+            }
+
+        except Exception as e:
+            db.rollback()
+
+            # The received blob stays for a retry; the encoded copy would be orphaned
+            if encoded_file_id is not None:
+                AudioService.delete_blob(encoded_file_id)
+
+            return {
+                'success': False,
+                'message': f'An error occurred: {str(e)}'
+            }
+
+    @staticmethod
+    def abort_session(session_id: str, user_id: int) -> Dict[str, Any]:
+        """
+        Cancel a resumable upload and discard the received chunks
+        Returns dict with success status and message
+        """
+        db = get_db_session()
+
+        try:
+            upload_session = UploadSessionService._get_locked_session(session_id, user_id)
+
+            if not upload_session:
+                return {
+                    'success': False,
+                    'message': 'Upload session not found',
+                    'not_found': True
+                }
+
+            get_storage().discard_parts([upload_session.gridfs_file_id])
+            db.delete(upload_session)
+            db.commit()
+
+            return {
+                'success': True,
+                'message': 'Upload cancelled'
+            }
+
+        except Exception as e:
+            db.rollback()
+            return {
+                'success': False,
+                'message': f'An error occurred: {str(e)}'
+            }
+
+    @staticmethod
+    def sweep_expired(batch_size: int = 500) -> int:
+        """
+        Delete expired sessions and their partial data
+        Returns the number of sessions removed
+        """
+        db = get_db_session()
+        swept = 0
+
+        while True:
+            expired = db.query(UploadSession).filter(
+                UploadSession.expires_at < datetime.utcnow()
+            ).order_by(UploadSession.expires_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+            if not expired:
+                break
+
+            get_storage().discard_parts([s.gridfs_file_id for s in expired])
+            for upload_session in expired:
+                db.delete(upload_session)
+            db.commit()
+
+            swept += len(expired)
+
+        return swept
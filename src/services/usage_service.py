@@ -0,0 +1,179 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dbentities.audio_file import AudioFile
+from dbentities.user import User
+from dbentities.user_usage import UserUsage
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+
+
+class UsageService:
+    """
+    Service for per-user storage usage and quotas
+
+    Every write that adds, replaces or deletes AudioFile rows applies its byte and file
+    deltas to the user's user_usage row in the same transaction, so usage is a primary
+    key lookup instead of a SUM over the user's files. Quota checks read that row before
+    any bytes are streamed, and the delta itself is only applied if it keeps the user
+    within quota (checked by the upsert, so concurrent uploads can't overshoot together).
+    """
+
+    @staticmethod
+    def _limits() -> Tuple[Optional[int], Optional[int]]:
+        """(max bytes, max files) per user; None where unlimited"""
+        config = get_config()
+        max_storage_mb = config.get('quota.max_storage_mb')
+        max_bytes = int(max_storage_mb * 1024 * 1024) if max_storage_mb is not None else None
+        return max_bytes, config.get('quota.max_files')
+
+    @staticmethod
+    def get_usage(user_id: int) -> Dict[str, Any]:
+        """Get a user's bytes_used and file_count, with the max_bytes and max_files quotas (None: unlimited)"""
+        db = get_db_session()
+        usage = db.get(UserUsage, user_id)
+        max_bytes, max_files = UsageService._limits()
+
+        return {
+            'bytes_used': usage.bytes_used if usage else 0,
+            'file_count': usage.file_count if usage else 0,
+            'max_bytes': max_bytes,
+            'max_files': max_files
+        }
+
+    @staticmethod
+    def _exceeded(bytes_used: int, file_count: int, bytes_delta: int, files_delta: int) -> Optional[str]:
+        """Message if adding the deltas to this usage would break a quota (only growth is checked)"""
+        max_bytes, max_files = UsageService._limits()
+
+        if max_bytes is not None and bytes_delta > 0 and bytes_used + bytes_delta > max_bytes:
+            return (f'Storage quota exceeded: {bytes_used / (1024 * 1024):.1f} MB of '
+                    f'{max_bytes / (1024 * 1024):.0f} MB used')
+
+        if max_files is not None and files_delta > 0 and file_count + files_delta > max_files:
+            return f'File quota exceeded: {file_count} of {max_files} files'
+
+        return None
+
+    @staticmethod
+    def check_quota(user_id: int, incoming_bytes: int = 0, incoming_files: int = 1) -> Dict[str, Any]:
+        """
+        Check, before anything is stored, that a user can add incoming_files files totalling
+        incoming_bytes (0 when the size isn't known yet)
+        Returns dict with success status and message
+        """
+        usage = UsageService.get_usage(user_id)
+        message = UsageService._exceeded(usage['bytes_used'], usage['file_count'], incoming_bytes, incoming_files)
+
+        if message:
+            return {
+                'success': False,
+                'message': message
+            }
+
+        return {
+            'success': True,
+            'message': 'Within quota'
+        }
+
+    @staticmethod
+    def record(user_id: int, bytes_delta: int, files_delta: int) -> Dict[str, Any]:
+        """
+        Apply a write's deltas to the user's counters in the current transaction (the caller
+        commits), refusing growth beyond quota; on failure the caller must roll back its write
+        Returns dict with success status and message
+        """
+        if not bytes_delta and not files_delta:
+            return {
+                'success': True,
+                'message': 'Usage unchanged'
+            }
+
+        # A user without a row yet starts from zero
+        message = UsageService._exceeded(0, 0, bytes_delta, files_delta)
+        if message:
+            return {
+                'success': False,
+                'message': message
+            }
+
+        db = get_db_session()
+        max_bytes, max_files = UsageService._limits()
+
+        conditions = []
+        if max_bytes is not None and bytes_delta > 0:
+            conditions.append(UserUsage.bytes_used + bytes_delta <= max_bytes)
+        if max_files is not None and files_delta > 0:
+            conditions.append(UserUsage.file_count + files_delta <= max_files)
+
+        # Counters never go below zero, even if they had drifted low before a deletion
+        stmt = pg_insert(UserUsage).values(
+            user_id=user_id, bytes_used=max(bytes_delta, 0), file_count=max(files_delta, 0),
+            updated_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserUsage.user_id],
+            set_={
+                'bytes_used': func.greatest(UserUsage.bytes_used + bytes_delta, 0),
+                'file_count': func.greatest(UserUsage.file_count + files_delta, 0),
+                'updated_at': stmt.excluded.updated_at
+            },
+            where=and_(*conditions) if conditions else None
+        ).returning(UserUsage.user_id)
+
+        if db.execute(stmt).first() is None:
+            usage = db.get(UserUsage, user_id)
+            return {
+                'success': False,
+                'message': UsageService._exceeded(usage.bytes_used, usage.file_count, bytes_delta, files_delta)
+            }
+
+        return {
+            'success': True,
+            'message': 'Usage updated'
+        }
+
+    @staticmethod
+    def recompute() -> int:
+        """
+        Recompute every user's counters from audio_files in one statement (repair-usage)
+        Concurrent writes wait for the table lock, then apply their deltas on top
+        Returns the number of users whose counters were wrong
+        """
+        db = get_db_session()
+
+        try:
+            db.execute(text('LOCK TABLE user_usage IN SHARE ROW EXCLUSIVE MODE'))
+
+            totals = (
+                select(AudioFile.user_id, func.sum(AudioFile.file_size).label('bytes_used'),
+                       func.count(AudioFile.id).label('file_count'))
+                .group_by(AudioFile.user_id)
+                .subquery()
+            )
+            stmt = pg_insert(UserUsage).from_select(
+                ['user_id', 'bytes_used', 'file_count', 'updated_at'],
+                select(User.id, func.coalesce(totals.c.bytes_used, 0), func.coalesce(totals.c.file_count, 0),
+                       func.now())
+                .select_from(User)
+                .outerjoin(totals, totals.c.user_id == User.id)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserUsage.user_id],
+                set_={
+                    'bytes_used': stmt.excluded.bytes_used,
+                    'file_count': stmt.excluded.file_count,
+                    'updated_at': stmt.excluded.updated_at
+                },
+                where=(UserUsage.bytes_used != stmt.excluded.bytes_used)
+                | (UserUsage.file_count != stmt.excluded.file_count)
+            )
+
+            repaired = db.execute(stmt).rowcount
+            db.commit()
+            return repaired
+
+        except Exception:
+            db.rollback()
+            raise
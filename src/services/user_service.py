@@ -1,6 +1,10 @@
-from typing import List, Optional, Dict, Any
+import base64
+import json
+from typing import Optional, Dict, Any
+from sqlalchemy import func, or_, select
 from sqlalchemy.exc import IntegrityError
 from dbentities.user import User, UserRole
+from dbentities.user_usage import UserUsage
 from dependencies.database import get_db_session
 from basemodels.user import UserCreateRequest, UserUpdateRequest
 from services.auth_service import AuthService
@@ -10,10 +14,60 @@ class UserService:
     """Service for user management (CRUD operations)"""
 
     @staticmethod
-    def get_all_users() -> List[User]:
-        """Get all users"""
+    def _encode_cursor(username: str) -> str:
+        """Opaque listing cursor: the (unique) username of the last user on a page"""
+        payload = json.dumps([username], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Optional[str]:
+        """Username of a listing cursor, or None if it is invalid"""
+        try:
+            username, = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            return username if isinstance(username, str) else None
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def list_users(search: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get one page of users by username, with their file count and total bytes
+        The counts come from user_usage in the same query (no per-user queries or scans
+        of audio_files); search matches a substring of the username or email through
+        the trigram indexes; pages follow a username cursor
+        Returns dict with success status, message, users (user, file_count, bytes_used rows) and next_cursor
+        """
         db = get_db_session()
-        return db.query(User).all()
+        stmt = (
+            select(User, func.coalesce(UserUsage.file_count, 0).label('file_count'),
+                   func.coalesce(UserUsage.bytes_used, 0).label('bytes_used'))
+            .outerjoin(UserUsage, UserUsage.user_id == User.id)
+        )
+
+        search = (search or '').strip()
+        if search:
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            stmt = stmt.where(or_(User.username.ilike(pattern), User.email.ilike(pattern)))
+
+        if cursor:
+            after = UserService._decode_cursor(cursor)
+            if after is None:
+                return {
+                    'success': False,
+                    'message': 'Invalid cursor'
+                }
+            stmt = stmt.where(User.username > after)
+
+        # One extra row tells whether there is a next page
+        rows = db.execute(stmt.order_by(User.username).limit(limit + 1)).all()
+        next_cursor = UserService._encode_cursor(rows[limit - 1].User.username) if len(rows) > limit else None
+
+        return {
+            'success': True,
+            'message': 'Users found',
+            'users': rows[:limit],
+            'next_cursor': next_cursor
+        }
 
     @staticmethod
     def get_user_by_id(user_id: int) -> Optional[User]:
@@ -108,6 +162,7 @@ class UserService:
                 user.password_hash = AuthService.hash_password(user_data.password)
 
             db.commit()
+            AuthService.invalidate_cached_user(user_id)
             db.refresh(user)
 
             return {
@@ -155,6 +210,7 @@ class UserService:
 
             db.delete(user)
             db.commit()
+            AuthService.invalidate_cached_user(user_id)
 
             return {
                 'success': True,
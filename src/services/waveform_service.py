@@ -0,0 +1,364 @@
+import io
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dbentities.audio_file import AudioFile
+from dbentities.audio_blob import AudioBlob
+from dbentities.legacy_peaks import LegacyPeaks
+from dbentities.waveform_job import WaveformJob
+from dependencies.app_config import get_config
+from dependencies.database import get_db_session
+from dependencies.metrics import get_metrics
+from dependencies.storage import get_storage, ChunkReader
+from dependencies.storage.codec import open_decoded_range
+from dependencies.waveform import compute_peaks, iter_ffmpeg_blocks, iter_wav_blocks, pack_peaks
+from services.blob_purge_service import BlobPurgeService
+
+PEAKS_MIMETYPE = 'application/octet-stream'
+
+
+class WaveformService:
+    """
+    Service for waveform peaks (min/max envelopes at a few zoom levels, see dependencies.waveform)
+
+    New content is queued in the waveform_jobs table in the upload transaction (keyed
+    by audio blob ID); a worker (generate-peaks command or the in-app thread) decodes
+    the file one block at a time (WAV natively, other formats through ffmpeg when it
+    is installed) and stores the peaks as a small blob next to the audio blob
+    (AudioBlob.peaks_file_id, or LegacyPeaks for files stored before deduplication),
+    so deduplicated files share them and they are purged together with the audio.
+    Requests only ever serve stored peaks.
+    """
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> timedelta:
+        """Backoff before the next attempt after `attempts` failures"""
+        config = get_config()
+        base = config.get('waveform.retry_base_seconds', 60)
+        maximum = config.get('waveform.retry_max_seconds', 3600)
+        return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+    @staticmethod
+    def enqueue(gridfs_file_ids: List[str]) -> None:
+        """Queue peaks generation for audio blobs in the current transaction (the caller commits)"""
+        if not gridfs_file_ids:
+            return
+
+        db = get_db_session()
+        db.execute(
+            pg_insert(WaveformJob)
+            .values([{'gridfs_file_id': file_id} for file_id in sorted(set(gridfs_file_ids))])
+            .on_conflict_do_nothing(index_elements=[WaveformJob.gridfs_file_id])
+        )
+
+    @staticmethod
+    def enqueue_missing() -> int:
+        """
+        Queue every audio blob that has no peaks yet (content stored before peaks were
+        queued at upload, files stored before deduplication), and retry the ones given up
+        on (say, ffmpeg has been installed since)
+        """
+        db = get_db_session()
+        missing = select(AudioBlob.gridfs_file_id).where(AudioBlob.peaks_file_id.is_(None)).union(
+            select(AudioFile.gridfs_file_id)
+            .outerjoin(LegacyPeaks, LegacyPeaks.gridfs_file_id == AudioFile.gridfs_file_id)
+            .where(AudioFile.content_hash.is_(None), LegacyPeaks.gridfs_file_id.is_(None))
+        ).subquery()
+
+        stmt = pg_insert(WaveformJob).from_select(['gridfs_file_id'], select(missing.c.gridfs_file_id))
+        result = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[WaveformJob.gridfs_file_id],
+                set_={'attempts': 0, 'next_attempt_at': func.now()},
+                where=WaveformJob.next_attempt_at.is_(None)
+            )
+        )
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def compute(gridfs_file_id: str, storage_codec: Optional[str],
+                sample_rate: Optional[int] = None) -> Optional[bytes]:
+        """
+        Decode a stored file and build its peaks file
+        sample_rate is the rate ffmpeg decodes to (the file's own rate, if known)
+        Returns None if the file is missing or its format can't be decoded here
+        """
+        config = get_config()
+        levels = config.get('waveform.levels', [256, 1024, 4096, 16384])
+        bits = config.get('waveform.bits', 8)
+        block_frames = config.get('waveform.block_frames', 65536)
+
+        # Straight from storage: a background read shouldn't churn the blob cache
+        storage = get_storage()
+        if storage_codec is None:
+            chunks = storage.open_range(gridfs_file_id)
+        else:
+            chunks = open_decoded_range(storage, gridfs_file_id, storage_codec, 0, None)
+        if chunks is None:
+            return None
+
+        try:
+            first = next(chunks, b'')
+            content = chain([first], chunks)
+
+            if first[:4] == b'RIFF' and first[8:12] == b'WAVE':
+                sample_rate, blocks = iter_wav_blocks(ChunkReader(content), block_frames)
+            else:
+                ffmpeg = shutil.which(config.get('waveform.ffmpeg_path', 'ffmpeg'))
+                if ffmpeg is None:
+                    return None
+                sample_rate = sample_rate or 44100
+                blocks = iter_ffmpeg_blocks(content, ffmpeg, sample_rate, block_frames)
+
+            frames, peaks = compute_peaks(blocks, levels)
+
+        finally:
+            chunks.close()
+
+        return pack_peaks(sample_rate, frames, peaks, bits)
+
+    @staticmethod
+    def _attach(source: Any, peaks: bytes) -> None:
+        """
+        Store a peaks file and attach it to its source in the current transaction: the
+        AudioBlob, or a LegacyPeaks row for a file without one. If the source already got
+        other peaks meanwhile the new copy is queued for purge
+        """
+        db = get_db_session()
+        storage = get_storage()
+        stored = storage.put_stream(io.BytesIO(peaks), filename=f'{source.gridfs_file_id}.peaks',
+                                    content_type=PEAKS_MIMETYPE)
+
+        try:
+            if source.content_hash is not None:
+                # Replaces peaks lost from storage, but never ones attached by someone else
+                current = AudioBlob.peaks_file_id.is_(None) if source.peaks_file_id is None \
+                    else AudioBlob.peaks_file_id == source.peaks_file_id
+                stmt = (
+                    update(AudioBlob)
+                    .where(AudioBlob.content_hash == source.content_hash, current)
+                    .values(peaks_file_id=stored['gridfs_file_id'])
+                    .returning(AudioBlob.content_hash)
+                )
+            else:
+                stmt = pg_insert(LegacyPeaks).values(
+                    gridfs_file_id=source.gridfs_file_id, peaks_file_id=stored['gridfs_file_id']
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[LegacyPeaks.gridfs_file_id],
+                    set_={'peaks_file_id': stmt.excluded.peaks_file_id},
+                    where=LegacyPeaks.peaks_file_id == source.peaks_file_id
+                ).returning(LegacyPeaks.gridfs_file_id)
+
+            if db.execute(stmt).first() is None:
+                BlobPurgeService.enqueue([stored['gridfs_file_id']])
+
+        except Exception:
+            storage.delete(stored['gridfs_file_id'])
+            raise
+
+    @staticmethod
+    def _load_sources(gridfs_file_ids: List[str]) -> Dict[str, Any]:
+        """
+        Look up what audio blob IDs belong to: rows of (gridfs_file_id, content_hash,
+        storage_codec, sample_rate, peaks_file_id), content_hash being None for the blob
+        of a file stored before deduplication. Blobs deleted meanwhile are left out
+        """
+        db = get_db_session()
+
+        # Any file of the blob tells the sample rate to decode at (see AudioService.probe_metadata)
+        sample_rate = select(AudioFile.sample_rate).where(
+            AudioFile.content_hash == AudioBlob.content_hash
+        ).correlate(AudioBlob).limit(1).scalar_subquery()
+
+        blobs = select(
+            AudioBlob.gridfs_file_id, AudioBlob.content_hash, AudioBlob.storage_codec,
+            sample_rate.label('sample_rate'), AudioBlob.peaks_file_id
+        ).where(AudioBlob.gridfs_file_id.in_(gridfs_file_ids))
+
+        # Such a file owns its blob outright (gridfs_file_id was unique before deduplication)
+        legacy_files = select(
+            AudioFile.gridfs_file_id, AudioFile.content_hash, AudioFile.storage_codec,
+            AudioFile.sample_rate, LegacyPeaks.peaks_file_id
+        ).outerjoin(
+            LegacyPeaks, LegacyPeaks.gridfs_file_id == AudioFile.gridfs_file_id
+        ).where(AudioFile.gridfs_file_id.in_(gridfs_file_ids), AudioFile.content_hash.is_(None))
+
+        return {source.gridfs_file_id: source for source in db.execute(blobs.union_all(legacy_files))}
+
+    @staticmethod
+    def process_batch(batch_size: int = 2) -> Dict[str, int]:
+        """
+        Generate peaks for up to batch_size due jobs
+        Jobs are claimed with SKIP LOCKED, so several workers can run side by side, and each
+        one runs in its own savepoint, so a failing job is still rescheduled
+        Returns dict with generated, skipped (blob gone or peaks already stored), unsupported
+        (not decodable here) and failed counts
+        """
+        db = get_db_session()
+        storage = get_storage()
+        metrics = get_metrics()
+        now = datetime.utcnow()
+        max_attempts = get_config().get('waveform.max_attempts', 3)
+        counts = {'generated': 0, 'skipped': 0, 'unsupported': 0, 'failed': 0}
+
+        jobs = db.query(WaveformJob).filter(
+            WaveformJob.next_attempt_at <= now
+        ).order_by(WaveformJob.next_attempt_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not jobs:
+            db.rollback()
+            return counts
+
+        sources = WaveformService._load_sources([job.gridfs_file_id for job in jobs])
+
+        for job in jobs:
+            source = sources.get(job.gridfs_file_id)
+            started = time.perf_counter()
+
+            try:
+                with db.begin_nested():
+                    peaks = None
+                    if source is not None and (source.peaks_file_id is None
+                                               or storage.stat(source.peaks_file_id) is None):
+                        peaks = WaveformService.compute(source.gridfs_file_id, source.storage_codec, source.sample_rate)
+
+                        if peaks is None:
+                            # Kept (not deleted) so that viewing the file doesn't queue it again
+                            job.next_attempt_at = None
+                            job.last_error = 'Waveform not available for this file'
+                            counts['unsupported'] += 1
+                            continue
+
+                    if peaks is not None:
+                        WaveformService._attach(source, peaks)
+                        counts['generated'] += 1
+                        metrics.observe('waveform.generate_seconds', time.perf_counter() - started)
+                    else:
+                        counts['skipped'] += 1
+
+                    db.delete(job)
+
+            except Exception as e:
+                print(f"Error generating waveform of blob {job.gridfs_file_id}: {e}")
+                counts['failed'] += 1
+                job.attempts += 1
+                job.last_error = str(e)
+                job.next_attempt_at = now + WaveformService._retry_delay(job.attempts) \
+                    if job.attempts < max_attempts else None
+
+        db.commit()
+
+        for name, count in counts.items():
+            metrics.increment(f'waveform.{name}', count)
+
+        return counts
+
+    @staticmethod
+    def queue_depth() -> int:
+        """Number of blobs waiting for peaks (also published as a gauge)"""
+        db = get_db_session()
+        depth = db.query(func.count(WaveformJob.gridfs_file_id)).filter(
+            WaveformJob.next_attempt_at.isnot(None)
+        ).scalar()
+        get_metrics().set_gauge('waveform.queue_depth', depth)
+        return depth
+
+    @staticmethod
+    def run_worker(batch_size: int = 2, interval_seconds: float = 10, once: bool = False,
+                   stop_event: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        Process due jobs batch after batch, sleeping `interval_seconds` whenever the queue is drained
+        With once=True, stops as soon as nothing is due. Returns total counts
+        """
+        stop_event = stop_event or threading.Event()
+        totals = {'generated': 0, 'skipped': 0, 'unsupported': 0, 'failed': 0}
+
+        while not stop_event.is_set():
+            result = WaveformService.process_batch(batch_size)
+            for name, count in result.items():
+                totals[name] += count
+
+            if sum(result.values()) < batch_size:
+                WaveformService.queue_depth()
+                get_db_session().rollback()
+
+                if once:
+                    break
+                stop_event.wait(interval_seconds)
+
+        return totals
+
+    @staticmethod
+    def start_background_worker(app) -> threading.Thread:
+        """Run the waveform worker in a daemon thread of this process"""
+        config = get_config()
+        batch_size = config.get('waveform.batch_size', 2)
+        interval_seconds = config.get('waveform.interval_seconds', 10)
+
+        def work():
+            while True:
+                try:
+                    with app.app_context():
+                        WaveformService.run_worker(batch_size, interval_seconds, once=True)
+                except Exception as e:
+                    print(f"Error in waveform worker: {e}")
+                time.sleep(interval_seconds)
+
+        thread = threading.Thread(target=work, name='waveform-worker', daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def get_peaks(audio_file: AudioFile) -> Dict[str, Any]:
+        """
+        Get the stored peaks file of an audio file (never decodes anything itself)
+        Returns dict with success status, message and peaks (bytes); 'pending' is True
+        while they are queued (they are queued here if they never were, or got lost from
+        storage) and 'unsupported' when the worker gave up on the file
+        """
+        db = get_db_session()
+
+        if audio_file.content_hash is not None:
+            peaks_file_id = db.scalar(
+                select(AudioBlob.peaks_file_id).where(AudioBlob.content_hash == audio_file.content_hash)
+            )
+        else:
+            peaks_file_id = db.scalar(
+                select(LegacyPeaks.peaks_file_id).where(LegacyPeaks.gridfs_file_id == audio_file.gridfs_file_id)
+            )
+
+        chunks = get_storage().open_range(peaks_file_id) if peaks_file_id is not None else None
+        if chunks is not None:
+            try:
+                return {
+                    'success': True,
+                    'message': 'Waveform found',
+                    'peaks': b''.join(chunks)
+                }
+            finally:
+                chunks.close()
+
+        job = db.get(WaveformJob, audio_file.gridfs_file_id)
+
+        if job is None:
+            WaveformService.enqueue([audio_file.gridfs_file_id])
+            db.commit()
+        elif job.next_attempt_at is None:
+            return {
+                'success': False,
+                'message': 'Waveform not available for this file',
+                'unsupported': True
+            }
+
+        return {
+            'success': False,
+            'message': 'Waveform is being generated',
+            'pending': True
+        }
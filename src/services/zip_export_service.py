@@ -0,0 +1,178 @@
+import io
+import queue
+import threading
+import zipfile
+from datetime import datetime
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple
+from dbentities.audio_file import AudioFile
+from services.audio_service import AudioService
+
+
+class ExportEntry(NamedTuple):
+    """One file of a ZIP export (plain values, so streaming never touches the DB session)"""
+    gridfs_file_id: str
+    filename: str
+    file_size: int
+    modified: datetime
+    storage_codec: Optional[str]
+
+
+class _ZipOutput(io.RawIOBase):
+    """
+    Unseekable write target for zipfile
+    Written bytes are collected until the response generator drains them. Since
+    seek() is unsupported, zipfile writes sizes and CRCs in data descriptors
+    after each entry instead of going back to patch the local headers.
+    """
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+class ZipExportService:
+    """
+    Service for exporting audio files as one streamed ZIP archive
+
+    Entries are stored (not deflated, audio is already compressed) and written
+    straight from storage chunk iterators. A reader thread fetches chunks into a
+    small bounded queue, so the next blob is already being read while the current
+    one is written and memory stays constant for any archive size.
+    """
+
+    # Chunks buffered ahead of the writer (a few MB with 255 KB GridFS chunks)
+    PREFETCH_CHUNKS = 16
+
+    @staticmethod
+    def export_entries(audio_files: List[AudioFile]) -> List[ExportEntry]:
+        """Build export entries, making archive names unique ("a.mp3", "a (2).mp3", ...)"""
+        entries = []
+        used_names = set()
+
+        for audio_file in audio_files:
+            filename = audio_file.filename.replace('\\', '_').replace('/', '_')
+            stem, dot, extension = filename.rpartition('.')
+            if not dot:
+                stem, extension = filename, ''
+
+            name, counter = filename, 1
+            while name.lower() in used_names:
+                counter += 1
+                name = f'{stem} ({counter}){dot}{extension}'
+            used_names.add(name.lower())
+
+            entries.append(ExportEntry(
+                audio_file.gridfs_file_id, name, audio_file.file_size, audio_file.updated_at, audio_file.storage_codec
+            ))
+
+        return entries
+
+    @staticmethod
+    def _put(chunk_queue: queue.Queue, item: Tuple[str, Any], stop: threading.Event) -> bool:
+        """Queue an item for the writer, giving up once the export was aborted"""
+        while not stop.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _read_blobs(entries: List[ExportEntry], chunk_queue: queue.Queue, stop: threading.Event) -> None:
+        """Reader thread: feed ('file', entry), ('data', chunk)..., ('end', None) per blob into the queue"""
+        put = ZipExportService._put
+
+        try:
+            for entry in entries:
+                # Every blob is read once: don't let a large export evict the cache's hot set
+                chunks = AudioService.open_stream(entry.gridfs_file_id, storage_codec=entry.storage_codec,
+                                                  fill_cache=False)
+                if chunks is None:
+                    print(f"Skipping {entry.filename} in ZIP export: blob {entry.gridfs_file_id} not found")
+                    continue
+
+                try:
+                    if not put(chunk_queue, ('file', entry), stop):
+                        return
+                    for chunk in chunks:
+                        if not put(chunk_queue, ('data', chunk), stop):
+                            return
+                finally:
+                    chunks.close()
+
+                if not put(chunk_queue, ('end', None), stop):
+                    return
+
+            put(chunk_queue, ('done', None), stop)
+
+        except Exception as e:
+            put(chunk_queue, ('error', e), stop)
+
+    @staticmethod
+    def stream_zip(entries: List[ExportEntry]) -> Iterator[bytes]:
+        """
+        Generate a ZIP archive of the given files piece by piece
+        ZIP64 extensions are used for entries (and archives) past 4 GB
+        """
+        chunk_queue: queue.Queue = queue.Queue(maxsize=ZipExportService.PREFETCH_CHUNKS)
+        stop = threading.Event()
+        reader = threading.Thread(
+            target=ZipExportService._read_blobs,
+            args=(entries, chunk_queue, stop),
+            name='zip-export-reader',
+            daemon=True
+        )
+        reader.start()
+
+        output = _ZipOutput()
+        archive = zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_STORED)
+        entry_file = None
+
+        try:
+            while True:
+                kind, value = chunk_queue.get()
+
+                if kind == 'file':
+                    info = zipfile.ZipInfo(value.filename, date_time=value.modified.timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    # Known size up front, so zipfile picks ZIP64 headers when needed
+                    info.file_size = value.file_size
+                    entry_file = archive.open(info, mode='w')
+                elif kind == 'data':
+                    entry_file.write(value)
+                elif kind == 'end':
+                    entry_file.close()
+                    entry_file = None
+                elif kind == 'error':
+                    print(f"Error in ZIP export: {value}")
+                    raise value
+                else:
+                    break
+
+                data = output.drain()
+                if data:
+                    yield data
+
+            archive.close()
+            yield output.drain()
+
+        finally:
+            # Stops the reader when the client disconnects or reading failed
+            stop.set()
@@ -0,0 +1,260 @@
+"""
+Tests for the audio header parsers (dependencies.audio_metadata)
+Files are built in memory, so every expected value is known exactly
+"""
+
+import io
+import struct
+import wave
+
+import pytest
+
+from dependencies.audio_metadata import HEAD_SIZE, TAIL_SIZE, RangeSource, detect_format, probe
+
+
+def source(data: bytes, cached: bool = True) -> RangeSource:
+    """RangeSource over data, with the head/tail an upload would capture (or none)"""
+    head, tail = (data[:HEAD_SIZE], data[-TAIL_SIZE:]) if cached else (b'', b'')
+    return RangeSource(len(data), lambda start, stop: data[start:stop], head, tail)
+
+
+def make_wav(seconds: float = 2.0, sample_rate: int = 8000, channels: int = 2) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(bytes(int(seconds * sample_rate) * channels * 2))
+    return buffer.getvalue()
+
+
+# MPEG-1 layer III, 128 kbit/s, 44.1 kHz, stereo: 417-byte frames of 1152 samples
+MP3_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_LENGTH = 417
+
+
+def make_mp3(frames: int = 100, first_frame: bytes = b'', id3_size: int = 0, id3v1: bool = False) -> bytes:
+    data = b''
+    if id3_size:
+        syncsafe = bytes((id3_size >> shift) & 0x7f for shift in (21, 14, 7, 0))
+        data += b'ID3\x03\x00\x00' + syncsafe + bytes(id3_size)
+
+    frame = MP3_HEADER + first_frame
+    data += frame + bytes(MP3_FRAME_LENGTH - len(frame))
+    data += (MP3_HEADER + bytes(MP3_FRAME_LENGTH - 4)) * (frames - 1)
+
+    if id3v1:
+        data += b'TAG' + bytes(125)
+    return data
+
+
+def make_flac(sample_rate: int = 44100, channels: int = 2, total_samples: int = 441000,
+              audio_bytes: int = 1000) -> bytes:
+    packed = sample_rate << 44 | (channels - 1) << 41 | (16 - 1) << 36 | total_samples
+    streaminfo = bytes(10) + struct.pack('>Q', packed) + bytes(16)
+    return b'fLaC' + b'\x80' + (34).to_bytes(3, 'big') + streaminfo + bytes(audio_bytes)
+
+
+def ogg_page(payload: bytes, granule: int = 0, serial: int = 1234, sequence: int = 0) -> bytes:
+    header = struct.pack('<4sBBqII', b'OggS', 0, 2 if sequence == 0 else 0, granule, serial, sequence)
+    return header + bytes(4) + bytes([1, len(payload)]) + payload
+
+
+def make_ogg(first_packet: bytes, last_granule: int, filler: int = 5000) -> bytes:
+    return ogg_page(first_packet) + ogg_page(bytes(200), granule=last_granule, sequence=1) + bytes(filler) + \
+        ogg_page(bytes(100), granule=last_granule, sequence=2)
+
+
+VORBIS_HEAD = b'\x01vorbis' + struct.pack('<I', 0) + struct.pack('<BIiii', 2, 44100, 0, 128000, 0) + b'\x00\x01'
+OPUS_HEAD = b'OpusHead\x01' + struct.pack('<BHI', 2, 312, 44100) + bytes(3)
+
+
+# ---- WAV ----
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_wav(cached):
+    metadata = probe(source(make_wav(seconds=2.0, sample_rate=8000, channels=2), cached))
+
+    assert metadata.duration_seconds == 2.0
+    assert metadata.bitrate == 8000 * 2 * 16
+    assert metadata.sample_rate == 8000
+    assert metadata.channels == 2
+
+
+def test_wav_streamed_data_size():
+    """A data chunk size left at 0xFFFFFFFF means the data runs to the end of the file"""
+    data = bytearray(make_wav(seconds=1.0, sample_rate=8000, channels=1))
+    data[40:44] = struct.pack('<I', 0xFFFFFFFF)
+
+    assert probe(source(bytes(data))).duration_seconds == 1.0
+
+
+def test_wav_skips_unknown_chunks():
+    data = make_wav(seconds=1.0, sample_rate=8000, channels=1)
+    # A LIST chunk of odd size (padded to even) between fmt and data
+    data = data[:36] + b'LIST' + struct.pack('<I', 5) + b'abcde\x00' + data[36:]
+
+    assert probe(source(data)).duration_seconds == 1.0
+
+
+def test_wav_truncated_after_header():
+    """Data cut off after the header: the format is known, the duration is not"""
+    metadata = probe(source(make_wav()[:44]))
+
+    assert metadata.duration_seconds is None
+    assert metadata.sample_rate == 8000
+    assert metadata.channels == 2
+
+
+def test_wav_truncated_fmt_chunk():
+    with pytest.raises(ValueError):
+        probe(source(make_wav()[:30]))
+
+
+# ---- MP3 ----
+
+def test_mp3_constant_bitrate():
+    data = make_mp3(frames=100)
+    metadata = probe(source(data))
+
+    assert metadata.duration_seconds == round(len(data) * 8 / 128000, 3)
+    assert metadata.bitrate == 128000
+    assert metadata.sample_rate == 44100
+    assert metadata.channels == 2
+
+
+def test_mp3_xing_header():
+    # Side info of MPEG-1 stereo is 32 bytes; flags: frame count and byte count present
+    xing = bytes(32) + b'Xing' + struct.pack('>III', 0x03, 1000, 417000)
+    metadata = probe(source(make_mp3(frames=10, first_frame=xing)))
+
+    assert metadata.duration_seconds == round(1000 * 1152 / 44100, 3)
+    assert metadata.bitrate == round(417000 * 8 / (1000 * 1152 / 44100))
+
+
+def test_mp3_vbri_header():
+    vbri = bytes(32) + b'VBRI' + bytes(6) + struct.pack('>II', 208500, 500)
+    metadata = probe(source(make_mp3(frames=10, first_frame=vbri)))
+
+    assert metadata.duration_seconds == round(500 * 1152 / 44100, 3)
+
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_mp3_after_large_id3v2_tag(cached):
+    """The first frame is found past an ID3v2 tag larger than the captured head"""
+    data = make_mp3(frames=20, id3_size=HEAD_SIZE + 1000, id3v1=True)
+    metadata = probe(source(data, cached))
+
+    audio_bytes = 20 * MP3_FRAME_LENGTH
+    assert metadata.duration_seconds == round(audio_bytes * 8 / 128000, 3)
+    assert metadata.sample_rate == 44100
+
+
+def test_mp3_without_frames():
+    with pytest.raises(ValueError):
+        probe(source(b'\xff' * 1000), 'song.mp3')
+
+
+# ---- FLAC ----
+
+def test_flac():
+    metadata = probe(source(make_flac(sample_rate=44100, channels=2, total_samples=441000, audio_bytes=1000)))
+
+    assert metadata.duration_seconds == 10.0
+    assert metadata.sample_rate == 44100
+    assert metadata.channels == 2
+    assert metadata.bitrate == round((len(make_flac()) * 8) / 10.0)
+
+
+def test_flac_after_id3v2_tag():
+    tag = b'ID3\x03\x00\x00' + bytes([0, 0, 0, 100]) + bytes(100)
+
+    assert detect_format(source(tag + make_flac())) == 'flac'
+    assert probe(source(tag + make_flac())).duration_seconds == 10.0
+
+
+@pytest.mark.parametrize('size', [4, 6, 20])
+def test_flac_truncated(size):
+    with pytest.raises(ValueError):
+        probe(source(make_flac()[:size]))
+
+
+def test_flac_without_streaminfo():
+    data = bytearray(make_flac())
+    data[4] = 0x84  # First block is a VORBIS_COMMENT
+
+    with pytest.raises(ValueError):
+        probe(source(bytes(data)))
+
+
+# ---- Ogg ----
+
+def test_ogg_vorbis():
+    data = make_ogg(VORBIS_HEAD, last_granule=44100 * 10)
+    metadata = probe(source(data))
+
+    assert metadata.duration_seconds == 10.0
+    assert metadata.sample_rate == 44100
+    assert metadata.channels == 2
+    assert metadata.bitrate == round(len(data) * 8 / 10.0)
+
+
+def test_ogg_opus():
+    """Opus granules count 48 kHz samples, including the pre-skip"""
+    metadata = probe(source(make_ogg(OPUS_HEAD, last_granule=48000 * 5 + 312)))
+
+    assert metadata.duration_seconds == 5.0
+    assert metadata.sample_rate == 44100
+    assert metadata.channels == 2
+
+
+def test_ogg_without_final_page():
+    """No page with a granule position in the tail: the duration is unknown"""
+    data = ogg_page(VORBIS_HEAD) + bytes(TAIL_SIZE + 100)
+    metadata = probe(source(data))
+
+    assert metadata.duration_seconds is None
+    assert metadata.bitrate == 128000  # The nominal bitrate from the Vorbis header
+
+
+def test_ogg_unsupported_codec():
+    with pytest.raises(ValueError):
+        probe(source(make_ogg(b'\x80theora' + bytes(30), last_granule=1000)))
+
+
+def test_ogg_truncated():
+    with pytest.raises(ValueError):
+        probe(source(b'OggS\x00\x02'))
+
+
+# ---- Detection ----
+
+@pytest.mark.parametrize('data', [b'', b'hello world, not audio', bytes(1000)])
+def test_unknown_format(data):
+    with pytest.raises(ValueError):
+        probe(source(data))
+
+
+def test_format_from_extension():
+    """Content without a known signature falls back to the file name"""
+    assert detect_format(source(bytes(100)), 'track.FLAC') == 'flac'
+    assert detect_format(source(bytes(100)), 'track.txt') is None
+
+    with pytest.raises(ValueError):
+        probe(source(bytes(100)), 'track.flac')
+
+
+def test_range_source_fetches():
+    data = bytes(range(256)) * 1024
+    range_source = source(data)
+
+    assert range_source.read(10, 4) == data[10:14]
+    assert range_source.read(len(data) - 4, 10) == data[-4:]
+    assert range_source.fetches == 0
+
+    assert range_source.read(HEAD_SIZE + 10, 4) == data[HEAD_SIZE + 10:HEAD_SIZE + 14]
+    assert range_source.read(HEAD_SIZE + 20, 4) == data[HEAD_SIZE + 20:HEAD_SIZE + 24]
+    assert range_source.fetches == 1
+
+    assert range_source.read(-5, 4) == b''
+    assert range_source.read(len(data) + 5, 4) == b''
@@ -0,0 +1,154 @@
+"""
+Tests for the durable blob purge queue (services.blob_purge_service)
+"""
+
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import dependencies.storage as storage_module
+from dbentities import BlobPurge
+from dependencies.constants import UPLOAD_CHUNK_SIZE_BYTES
+from dependencies.storage import LocalBackend
+from services.audio_service import AudioService
+from services.blob_purge_service import BlobPurgeService
+
+
+class RecordingBackend(LocalBackend):
+    """Local storage that records delete_many batches and cannot delete the blobs in `broken`"""
+
+    def __init__(self, root: str):
+        super().__init__(root, UPLOAD_CHUNK_SIZE_BYTES)
+        self.batches = []
+        self.broken = set()
+
+    def delete_many(self, file_ids):
+        self.batches.append(list(file_ids))
+        if self.broken.intersection(file_ids):
+            raise ConnectionError('batch delete failed')
+        super().delete_many(file_ids)
+
+    def delete(self, file_id):
+        if file_id in self.broken:
+            raise ConnectionError(f'cannot delete {file_id}')
+        super().delete(file_id)
+
+
+@pytest.fixture
+def storage(session, tmp_path, monkeypatch):
+    storage = RecordingBackend(str(tmp_path / 'purge'))
+    monkeypatch.setattr(storage_module, '_storage', storage)
+    return storage
+
+
+def store(storage, count: int = 1):
+    return [storage.put_stream(io.BytesIO(b'audio data'))['gridfs_file_id'] for _ in range(count)]
+
+
+def queued(session) -> dict:
+    session.expire_all()
+    return {purge.gridfs_file_id: purge for purge in session.query(BlobPurge)}
+
+
+def test_enqueue_is_durable_and_deduplicated(session, storage):
+    file_ids = store(storage, 2)
+
+    BlobPurgeService.enqueue([file_ids[0], None, file_ids[1]])
+    BlobPurgeService.enqueue([file_ids[0]])
+    session.commit()
+
+    assert set(queued(session)) == set(file_ids)
+    assert BlobPurgeService.queue_depth() == 2
+    assert all(storage.stat(file_id) is not None for file_id in file_ids)  # Nothing deleted yet
+
+
+def test_enqueue_rolls_back_with_the_transaction(session, storage):
+    BlobPurgeService.enqueue(store(storage))
+    session.rollback()
+
+    assert queued(session) == {}
+
+
+def test_purge_batch_deletes_due_blobs_in_one_call(session, storage):
+    file_ids = store(storage, 3)
+    BlobPurgeService.enqueue(file_ids)
+    session.commit()
+
+    result = BlobPurgeService.purge_batch(batch_size=10)
+
+    assert result == {'purged': 3, 'skipped': 0, 'failed': 0}
+    assert len(storage.batches) == 1 and sorted(storage.batches[0]) == sorted(file_ids)
+    assert all(storage.stat(file_id) is None for file_id in file_ids)
+    assert queued(session) == {}
+
+
+def test_purge_batch_respects_batch_size(session, storage):
+    BlobPurgeService.enqueue(store(storage, 3))
+    session.commit()
+
+    assert BlobPurgeService.purge_batch(batch_size=2)['purged'] == 2
+    assert len(queued(session)) == 1
+
+    assert BlobPurgeService.run_worker(batch_size=2, once=True) == {'purged': 1, 'skipped': 0, 'failed': 0}
+    assert queued(session) == {}
+
+
+def test_failed_delete_is_retried_with_backoff(session, storage):
+    good, bad = store(storage, 2)
+    storage.broken.add(bad)
+    BlobPurgeService.enqueue([good, bad])
+    session.commit()
+
+    before = datetime.utcnow()
+    result = BlobPurgeService.purge_batch()
+
+    # The batch failed as a whole, then each blob was retried on its own
+    assert result == {'purged': 1, 'skipped': 0, 'failed': 1}
+    assert storage.stat(good) is None and storage.stat(bad) is not None
+    entry = queued(session)[bad]
+    assert set(queued(session)) == {bad}
+    assert entry.attempts == 1 and 'cannot delete' in entry.last_error
+    assert before + timedelta(seconds=30) <= entry.next_attempt_at <= datetime.utcnow() + timedelta(seconds=30)
+
+    # Not due again until the backoff has passed
+    assert BlobPurgeService.purge_batch() == {'purged': 0, 'skipped': 0, 'failed': 0}
+
+    entry.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    session.commit()
+    before = datetime.utcnow()
+    assert BlobPurgeService.purge_batch()['failed'] == 1
+
+    entry = queued(session)[bad]
+    assert entry.attempts == 2
+    assert entry.next_attempt_at >= before + timedelta(seconds=60)  # Doubled
+
+    storage.broken.clear()
+    entry.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    session.commit()
+    assert BlobPurgeService.purge_batch()['purged'] == 1
+    assert storage.stat(bad) is None and queued(session) == {}
+
+
+@pytest.mark.parametrize('attempts, seconds', [(1, 30), (2, 60), (5, 480), (20, 3600)])
+def test_retry_delay_is_exponential_and_capped(session, attempts, seconds):
+    assert BlobPurgeService._retry_delay(attempts) == timedelta(seconds=seconds)
+
+
+def test_re_referenced_blob_is_kept(session, storage, users):
+    result = AudioService.upload_file(FileStorage(io.BytesIO(b'audio data'), 'track.wav'), users[0].id)
+    assert result['success'], result['message']
+    file_id = result['file'].gridfs_file_id
+    orphan = store(storage)[0]
+
+    # A stale queue entry for a blob that is in use again
+    BlobPurgeService.enqueue([file_id, orphan])
+    session.commit()
+
+    result = BlobPurgeService.purge_batch()
+
+    assert result == {'purged': 1, 'skipped': 1, 'failed': 0}
+    assert storage.batches == [[orphan]]
+    assert storage.stat(file_id) is not None
+    assert queued(session) == {}
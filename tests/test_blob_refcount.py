@@ -0,0 +1,121 @@
+"""
+Tests for content-addressed blob sharing: reference counts, purges and upload by hash (services.audio_service)
+"""
+
+import hashlib
+import io
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from basemodels.audio import UploadByHashRequest
+from dbentities import AudioBlob, AudioFile, BlobPurge
+from dependencies.storage import get_storage
+from services.audio_service import AudioService
+
+CONTENT = os.urandom(5000)
+
+
+def upload(user_id: int, content: bytes = CONTENT, filename: str = 'track.wav') -> AudioFile:
+    result = AudioService.upload_file(FileStorage(io.BytesIO(content), filename, content_type='audio/wav'), user_id)
+    assert result['success'], result['message']
+    return result['file']
+
+
+def blob(session, content: bytes = CONTENT) -> AudioBlob:
+    session.expire_all()
+    return session.get(AudioBlob, hashlib.sha256(content).hexdigest())
+
+
+def purged(session) -> set:
+    return {purge.gridfs_file_id for purge in session.query(BlobPurge)}
+
+
+def test_duplicate_upload_shares_blob(session, users):
+    first = upload(users[0].id)
+    second = upload(users[1].id, filename='copy.wav')
+
+    assert second.gridfs_file_id == first.gridfs_file_id
+    assert blob(session).ref_count == 2
+    assert session.query(AudioBlob).count() == 1
+
+    # The second upload's own copy of the bytes is queued for deletion, the shared blob isn't
+    queued = purged(session)
+    assert len(queued) == 1 and first.gridfs_file_id not in queued
+
+
+def test_delete_purges_blob_only_when_unreferenced(session, users):
+    first = upload(users[0].id)
+    second = upload(users[0].id, filename='copy.wav')
+    blob_file_id = first.gridfs_file_id
+    first_id, second_id = first.id, second.id
+
+    assert AudioService.delete_file(first_id, users[0].id)['success']
+    assert blob(session).ref_count == 1
+    assert blob_file_id not in purged(session)
+
+    assert AudioService.delete_file(second_id, users[0].id)['success']
+    assert blob(session) is None
+    assert blob_file_id in purged(session)
+
+
+def test_replace_with_identical_content_keeps_blob(session, users):
+    audio_file = upload(users[0].id)
+    file_id, blob_file_id = audio_file.id, audio_file.gridfs_file_id
+
+    new_file = FileStorage(io.BytesIO(CONTENT), 'renamed.wav', content_type='audio/wav')
+    result = AudioService.update_file(file_id, users[0].id, new_file)
+
+    assert result['success'], result['message']
+    assert result['file'].gridfs_file_id == blob_file_id
+    assert result['file'].filename == 'renamed.wav'
+    assert blob(session).ref_count == 1
+    assert blob_file_id not in purged(session)
+    assert get_storage().stat(blob_file_id) is not None
+
+
+def test_replace_with_other_content_releases_old_blob(session, users):
+    audio_file = upload(users[0].id)
+    file_id, old_file_id = audio_file.id, audio_file.gridfs_file_id
+    other = os.urandom(3000)
+
+    result = AudioService.update_file(file_id, users[0].id, FileStorage(io.BytesIO(other), 'new.wav'))
+
+    assert result['success'], result['message']
+    assert blob(session) is None
+    assert blob(session, other).ref_count == 1
+    assert old_file_id in purged(session)
+
+
+def by_hash(filename: str = 'again.wav', content: bytes = CONTENT) -> UploadByHashRequest:
+    return UploadByHashRequest(sha256=hashlib.sha256(content).hexdigest(), file_size=len(content), filename=filename)
+
+
+def test_upload_by_hash_of_own_content(session, users):
+    audio_file = upload(users[0].id)
+
+    result = AudioService.upload_by_hash(by_hash(), users[0].id)
+
+    assert result['success'], result['message']
+    assert result['file'].gridfs_file_id == audio_file.gridfs_file_id
+    assert blob(session).ref_count == 2
+
+
+def test_upload_by_hash_refused_for_content_user_does_not_own(session, users):
+    upload(users[0].id)
+
+    result = AudioService.upload_by_hash(by_hash(), users[1].id)
+
+    assert not result['success'] and result['missing']
+    assert blob(session).ref_count == 1
+    assert session.query(AudioFile).filter(AudioFile.user_id == users[1].id).count() == 0
+
+
+def test_upload_by_hash_refused_for_wrong_size(session, users):
+    upload(users[0].id)
+
+    request = UploadByHashRequest(sha256=hashlib.sha256(CONTENT).hexdigest(), file_size=1, filename='a.wav')
+    result = AudioService.upload_by_hash(request, users[0].id)
+
+    assert not result['success'] and result['missing']
+    assert blob(session).ref_count == 1
@@ -0,0 +1,150 @@
+"""
+Tests for bulk uploads of files and zip/tar archives (services.bulk_upload_service)
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from dbentities import AudioFile
+from dependencies.app_config import get_config
+from dependencies.storage import get_storage
+from services.bulk_upload_service import BulkUploadService
+
+
+class Unseekable(io.RawIOBase):
+    """Request body that can only be read front to back"""
+
+    def __init__(self, data: bytes):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
+
+def make_zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def make_tar(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def configure(**sections):
+    get_config()._config.update(sections)
+
+
+def stored_ids() -> list:
+    return list(get_storage().iter_file_ids())
+
+
+def file_count(session) -> int:
+    session.expire_all()
+    return session.query(AudioFile).count()
+
+
+@pytest.fixture
+def client(db_app, users):
+    client = db_app.test_client()
+    client.environ_base['HTTP_X_USER_ID'] = str(users[0].id)
+    return client
+
+
+def test_archive_over_max_size_is_rejected_with_413(session, client):
+    configure(file_upload={'bulk_upload_max_size_mb': 0.01})
+    body = make_tar({'a.wav': os.urandom(20000)})
+
+    response = client.post('/audio/upload/bulk', data=body, content_type='application/x-tar')
+
+    assert response.status_code == 413
+    assert 'too large' in response.get_json()['error']
+    assert file_count(session) == 0 and stored_ids() == []
+
+
+def test_archive_within_max_size_is_uploaded(session, client):
+    configure(file_upload={'bulk_upload_max_size_mb': 1})
+    body = make_tar({'a.wav': os.urandom(2000), 'b.mp3': os.urandom(2000)})
+
+    response = client.post('/audio/upload/bulk', data=body, content_type='application/x-tar')
+
+    assert response.status_code == 200
+    assert response.get_json()['uploaded'] == 2
+    assert file_count(session) == 2
+
+
+@pytest.mark.parametrize('is_zip', [True, False])
+def test_streamed_archive_stops_at_max_size(session, users, is_zip):
+    # A tar member read before the limit is hit is already stored; nothing is kept either way
+    members = {'a.wav': os.urandom(2000), 'b.wav': os.urandom(50000)}
+    body = make_zip(members) if is_zip else make_tar(members)
+
+    entries = BulkUploadService.iter_archive(io.BufferedReader(Unseekable(body)), is_zip, max_size=20000)
+    result = BulkUploadService.bulk_upload(entries, users[0].id)
+
+    assert not result['success'] and result['too_large']
+    assert result['uploaded'] == 0
+    assert file_count(session) == 0 and stored_ids() == []
+
+
+def test_non_audio_entries_are_skipped(session, users):
+    body = make_zip({
+        'music/a.wav': os.urandom(2000),
+        'music/notes.txt': b'liner notes',
+        'music/.hidden.wav': os.urandom(100),
+        '__MACOSX/music/._a.wav': b'resource fork',
+        'music/empty/': b''
+    })
+
+    result = BulkUploadService.bulk_upload(BulkUploadService.iter_archive(io.BytesIO(body), True, 10 ** 6),
+                                           users[0].id)
+
+    assert [(entry['filename'], entry['success']) for entry in result['results']] == [
+        ('a.wav', True), ('notes.txt', False)
+    ]
+    assert result['results'][1]['message'].startswith('Invalid file type')
+    assert (result['uploaded'], result['failed']) == (1, 1)
+    assert file_count(session) == 1 and len(stored_ids()) == 1
+
+
+def test_batch_over_quota_inserts_nothing(session, users):
+    configure(quota={'max_files': 2})
+    body = make_tar({f'{n}.wav': os.urandom(2000) for n in range(3)})
+
+    result = BulkUploadService.bulk_upload(BulkUploadService.iter_archive(io.BytesIO(body), False, 10 ** 6),
+                                           users[0].id)
+
+    assert not result['success'] and result['uploaded'] == 0 and result['failed'] == 3
+    assert all('quota' in entry['message'].lower() for entry in result['results'])
+    assert file_count(session) == 0 and stored_ids() == []
+
+
+def test_failed_commit_deletes_stored_blobs(session, users, monkeypatch):
+    body = make_tar({'a.wav': os.urandom(2000), 'b.wav': os.urandom(2000)})
+    entries = BulkUploadService.iter_archive(io.BytesIO(body), False, 10 ** 6)
+
+    def fail():
+        raise ConnectionError('connection lost')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(session, 'commit', fail)
+        result = BulkUploadService.bulk_upload(entries, users[0].id)
+
+    assert not result['success'] and result['failed'] == 2
+    assert all('connection lost' in entry['message'] for entry in result['results'])
+    assert file_count(session) == 0 and stored_ids() == []
@@ -0,0 +1,165 @@
+"""
+Tests for the compressed blob layout (dependencies.storage.codec)
+"""
+
+import hashlib
+import io
+import os
+import struct
+
+import pytest
+
+from dependencies.storage import ChunkReader
+from dependencies.storage.codec import (
+    Codec, FileTooLargeError, FrameEncoder, MAGIC, TRAILER, ZlibCodec, get_codec, open_decoded_range, read_index
+)
+from dependencies.storage.local_backend import LocalBackend
+
+FRAME_SIZE = 1024
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalBackend(str(tmp_path), chunk_size=4096)
+
+
+def sample_data(size: int) -> bytes:
+    """Partly compressible content (a repeating pattern with random runs)"""
+    pattern = bytes(range(256)) * (size // 256 + 1)
+    noise = os.urandom(size)
+    return bytes(noise[i] if (i // 100) % 3 == 0 else pattern[i] for i in range(size))
+
+
+def store(storage, data: bytes, frame_size: int = FRAME_SIZE):
+    """Encode data with zlib and store it; returns (blob ID, encoder)"""
+    encoder = FrameEncoder(io.BytesIO(data), ZlibCodec(), frame_size)
+    stored = storage.put_stream(ChunkReader(encoder.frames()))
+    return stored['gridfs_file_id'], encoder
+
+
+def read_blob(storage, file_id: str) -> bytes:
+    return b''.join(storage.open_range(file_id))
+
+
+def decode(storage, file_id: str, start: int = 0, stop=None) -> bytes:
+    return b''.join(open_decoded_range(storage, file_id, 'zlib', start, stop))
+
+
+@pytest.mark.parametrize('size', [0, 1, FRAME_SIZE - 1, FRAME_SIZE, FRAME_SIZE + 1, 4 * FRAME_SIZE, 10_000])
+def test_round_trip(storage, size):
+    data = sample_data(size)
+    file_id, encoder = store(storage, data)
+
+    assert decode(storage, file_id) == data
+    assert encoder.file_size == size
+    assert encoder.sha256.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_trailer_and_index(storage):
+    data = sample_data(10_000)
+    file_id, _ = store(storage, data)
+    blob = read_blob(storage, file_id)
+
+    magic, frame_size, frame_count, length = TRAILER.unpack(blob[-TRAILER.size:])
+    assert (magic, frame_size, frame_count, length) == (MAGIC, FRAME_SIZE, 10, 10_000)
+
+    lengths = struct.unpack(f'<{frame_count}I', blob[-TRAILER.size - 4 * frame_count:-TRAILER.size])
+    index = read_index(storage, file_id)
+    assert index.frame_size == FRAME_SIZE
+    assert index.length == 10_000
+    assert len(index.offsets) == frame_count + 1
+    assert [b - a for a, b in zip(index.offsets, index.offsets[1:])] == list(lengths)
+    assert index.offsets[-1] == len(blob) - TRAILER.size - 4 * frame_count
+
+
+def test_index_larger_than_tail_read(storage, monkeypatch):
+    """The frame index is read again when it does not fit in the first tail read"""
+    monkeypatch.setattr('dependencies.storage.codec.TAIL_READ_SIZE', TRAILER.size + 8)
+    data = sample_data(50 * 100)
+    file_id, _ = store(storage, data, frame_size=100)
+
+    assert len(read_index(storage, file_id).offsets) == 51
+    assert decode(storage, file_id, 4321, 4999) == data[4321:4999]
+
+
+def test_empty_blob(storage):
+    file_id, _ = store(storage, b'')
+
+    index = read_index(storage, file_id)
+    assert index.offsets == [0]
+    assert index.length == 0
+    assert decode(storage, file_id) == b''
+    assert decode(storage, file_id, 0, 10) == b''
+
+
+@pytest.mark.parametrize('start, stop', [
+    (0, 1),
+    (0, FRAME_SIZE),  # Exactly one frame
+    (FRAME_SIZE - 1, FRAME_SIZE + 1),  # Across a frame boundary
+    (FRAME_SIZE, 2 * FRAME_SIZE),
+    (1500, 9000),  # Several whole frames in between
+    (9999, None),  # Last byte
+    (5000, 50_000),  # Stop past the end
+    (0, None),
+])
+def test_decoded_range(storage, start, stop):
+    data = sample_data(10_000)
+    file_id, _ = store(storage, data)
+
+    assert decode(storage, file_id, start, stop) == data[start:stop]
+
+
+@pytest.mark.parametrize('start, stop', [(10_000, None), (20_000, None), (500, 500), (600, 500)])
+def test_empty_decoded_range(storage, start, stop):
+    file_id, _ = store(storage, sample_data(10_000))
+
+    assert decode(storage, file_id, start, stop) == b''
+
+
+def test_decoded_range_only_fetches_overlapping_frames(storage, monkeypatch):
+    data = sample_data(10_000)
+    file_id, _ = store(storage, data)
+    index = read_index(storage, file_id)
+    requested = []
+
+    open_range = storage.open_range
+
+    def recording_open_range(blob_id, start=0, stop=None):
+        requested.append((start, stop))
+        return open_range(blob_id, start, stop)
+
+    monkeypatch.setattr(storage, 'open_range', recording_open_range)
+    assert decode(storage, file_id, 2100, 3000) == data[2100:3000]
+    assert requested == [(index.offsets[2], index.offsets[3])]
+
+
+def test_missing_blob(storage):
+    assert read_index(storage, '0123456789abcdef01234567') is None
+    assert open_decoded_range(storage, '0123456789abcdef01234567', 'zlib') is None
+
+
+def test_uncompressed_blob_is_rejected(storage):
+    file_id = storage.put_stream(io.BytesIO(b'RIFF' + bytes(100)))['gridfs_file_id']
+
+    with pytest.raises(ValueError):
+        read_index(storage, file_id)
+
+
+def test_max_size():
+    encoder = FrameEncoder(io.BytesIO(bytes(3000)), ZlibCodec(), FRAME_SIZE, max_size=2500)
+
+    with pytest.raises(FileTooLargeError):
+        list(encoder.frames())
+
+
+def test_get_codec():
+    assert isinstance(get_codec('zlib', 9), ZlibCodec)
+    assert get_codec('zlib', 9).level == 9
+
+    with pytest.raises(ValueError):
+        get_codec('lzma')
+
+
+def test_codec_is_abstract():
+    with pytest.raises(TypeError):
+        Codec()
@@ -0,0 +1,74 @@
+"""
+Tests for the opaque keyset pagination cursors of file and user listings
+"""
+
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from services.audio_service import AudioService
+from services.user_service import UserService
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('sort, value', [
+    ('date', datetime(2024, 5, 6, 7, 8, 9, 123456)),
+    ('name', 'Track 01 – ünïcode.mp3'),
+    ('name', ''),
+    ('size', 0),
+    ('size', 5 * 1024 ** 3),
+    ('search', 0.4375),
+])
+def test_file_cursor_round_trip(sort, value):
+    cursor = AudioService._encode_cursor(sort, value, 42)
+
+    assert '=' not in cursor
+    assert AudioService._decode_cursor(cursor, sort) == (value, 42)
+
+
+def test_file_cursor_for_another_sort():
+    cursor = AudioService._encode_cursor('name', 'a.mp3', 1)
+
+    assert AudioService._decode_cursor(cursor, 'size') is None
+
+
+@pytest.mark.parametrize('cursor, sort', [
+    ('', 'date'),
+    ('!!!not base64', 'date'),
+    (base64.urlsafe_b64encode(b'\xff\xfe').decode(), 'name'),  # Not UTF-8
+    (raw_cursor({'sort': 'name'}), 'name'),
+    (raw_cursor(['name', 'a.mp3']), 'name'),
+    (raw_cursor(['name', 'a.mp3', '7']), 'name'),  # ID must be an integer
+    (raw_cursor(['size', '100', 7]), 'size'),
+    (raw_cursor(['name', 100, 7]), 'name'),
+    (raw_cursor(['date', 'yesterday', 7]), 'date'),
+    (raw_cursor(['date', None, 7]), 'date'),
+    (raw_cursor(['search', 'high', 7]), 'search'),
+])
+def test_invalid_file_cursor(cursor, sort):
+    assert AudioService._decode_cursor(cursor, sort) is None
+
+
+@pytest.mark.parametrize('username', ['Admin', 'user_with-ünïcode', ''])
+def test_user_cursor_round_trip(username):
+    cursor = UserService._encode_cursor(username)
+
+    assert '=' not in cursor
+    assert UserService._decode_cursor(cursor) == username
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    '!!!not base64',
+    raw_cursor([]),
+    raw_cursor(['a', 'b']),
+    raw_cursor([42]),
+    raw_cursor(None),
+])
+def test_invalid_user_cursor(cursor):
+    assert UserService._decode_cursor(cursor) is None
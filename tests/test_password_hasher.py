@@ -0,0 +1,112 @@
+"""
+Tests for bcrypt on a bounded thread pool (dependencies.password_hasher) and rehashing on login
+"""
+
+import threading
+
+import bcrypt
+import pytest
+
+import dependencies.password_hasher as password_hasher_module
+from dbentities.user import User, UserRole
+from dependencies.password_hasher import PasswordHasher, PasswordHasherBusyError
+from services.auth_service import AuthService
+
+PASSWORD = 'correct horse battery'
+
+
+def make_hash(rounds: int) -> str:
+    return bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=5, workers=1, max_pending=0, wait_timeout_seconds=0.05)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    password_hash = hasher.hash(PASSWORD)
+
+    assert password_hash.startswith('$2b$05$')
+    assert hasher.verify(PASSWORD, password_hash)
+    assert not hasher.verify('wrong password', password_hash)
+
+
+@pytest.mark.parametrize('rounds, expected', [(4, True), (5, False), (6, True)])
+def test_needs_rehash_when_cost_changed(hasher, rounds, expected):
+    assert hasher.needs_rehash(make_hash(rounds)) is expected
+
+
+def test_needs_rehash_ignores_other_formats(hasher):
+    assert not hasher.needs_rehash('not a bcrypt hash')
+
+
+def test_rejects_when_pool_is_saturated(hasher):
+    started, release = threading.Event(), threading.Event()
+
+    def occupy():
+        started.set()
+        release.wait(5)
+
+    # The only slot (1 worker, no pending) is taken until release is set
+    busy = threading.Thread(target=hasher._run, args=('hash', occupy))
+    busy.start()
+    started.wait(5)
+
+    try:
+        with pytest.raises(PasswordHasherBusyError):
+            hasher.verify(PASSWORD, make_hash(4))
+    finally:
+        release.set()
+        busy.join(5)
+
+    assert hasher.verify(PASSWORD, make_hash(4))  # The slot is free again
+
+
+def test_invalid_rounds():
+    with pytest.raises(ValueError):
+        PasswordHasher(rounds=3, workers=1, max_pending=0, wait_timeout_seconds=1)
+
+
+@pytest.fixture
+def login_user(session, hasher, monkeypatch):
+    """A user whose password was hashed at a lower cost than the configured one"""
+    monkeypatch.setattr(password_hasher_module, '_password_hasher', hasher)
+    user = User(username='alice', email='alice@example.com', password_hash=make_hash(4), role=UserRole.USER)
+    session.add(user)
+    session.commit()
+    return user
+
+
+def stored_hash(session, user_id: int) -> str:
+    session.expire_all()
+    return session.get(User, user_id).password_hash
+
+
+def test_login_rehashes_at_configured_cost(session, login_user):
+    old_hash = login_user.password_hash
+
+    assert AuthService.authenticate_user('alice', PASSWORD) is not None
+
+    new_hash = stored_hash(session, login_user.id)
+    assert new_hash != old_hash and new_hash.startswith('$2b$05$')
+    assert AuthService.authenticate_user('alice', PASSWORD) is not None
+
+
+def test_failed_login_keeps_old_hash(session, login_user):
+    old_hash = login_user.password_hash
+
+    assert AuthService.authenticate_user('alice', 'wrong password') is None
+
+    assert stored_hash(session, login_user.id) == old_hash
+
+
+def test_login_at_configured_cost_keeps_hash(session, login_user, hasher):
+    login_user.password_hash = current_hash = hasher.hash(PASSWORD)
+    session.commit()
+
+    assert AuthService.authenticate_user('alice', PASSWORD) is not None
+
+    assert stored_hash(session, login_user.id) == current_hash
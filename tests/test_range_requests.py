@@ -0,0 +1,78 @@
+"""
+Tests for Range/If-Range handling of audio streaming (routers.audio_routes)
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+from routers.audio_routes import _if_range_matches, _resolve_range
+
+LENGTH = 1000
+ETAG = 'abc123'
+LAST_MODIFIED = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def resolve(app, headers):
+    with app.test_request_context(headers=headers):
+        return _resolve_range(LENGTH, ETAG, LAST_MODIFIED)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (206, 0, 100)),
+    ('bytes=0-0', (206, 0, 1)),
+    ('bytes=500-', (206, 500, LENGTH)),
+    ('bytes=999-', (206, 999, LENGTH)),
+    ('bytes=900-5000', (206, 900, LENGTH)),  # End past the file is clamped
+    ('bytes=-100', (206, 900, LENGTH)),  # Suffix range: the last 100 bytes
+    ('bytes=-1', (206, 999, LENGTH)),
+    ('bytes=-5000', (206, 0, LENGTH)),  # Suffix longer than the file: all of it
+])
+def test_satisfiable_range(app, header, expected):
+    assert resolve(app, {'Range': header}) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=1000-1999', 'bytes=5000-'])
+def test_start_past_end(app, header):
+    assert resolve(app, {'Range': header}) == (416, None, None)
+
+
+@pytest.mark.parametrize('header', [
+    None,
+    'bytes=0-9,20-29',  # Multipart ranges are answered with the whole file
+    'items=0-9',
+    'bytes=9-0',
+    'bytes=abc',
+    'garbage',
+])
+def test_whole_file(app, header):
+    assert resolve(app, {'Range': header} if header else {}) == (200, 0, LENGTH)
+
+
+def test_empty_file(app):
+    with app.test_request_context(headers={'Range': 'bytes=0-'}):
+        assert _resolve_range(0, ETAG, LAST_MODIFIED) == (416, None, None)
+
+
+@pytest.mark.parametrize('if_range, matches', [
+    (None, True),
+    (f'"{ETAG}"', True),
+    ('"other"', False),
+    (f'W/"{ETAG}"', False),  # Weak validators never match (strong comparison)
+    (http_date(LAST_MODIFIED), True),
+    (http_date(datetime(2023, 1, 1, tzinfo=timezone.utc)), False),
+])
+def test_if_range(app, if_range, matches):
+    headers = {'If-Range': if_range} if if_range else {}
+    with app.test_request_context(headers=headers):
+        assert _if_range_matches(ETAG, LAST_MODIFIED) is matches
+
+    headers['Range'] = 'bytes=10-19'
+    assert resolve(app, headers) == ((206, 10, 20) if matches else (200, 0, LENGTH))
@@ -0,0 +1,138 @@
+"""
+Tests for resumable (chunked) uploads (services.upload_session_service)
+"""
+
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import dependencies.storage as storage_module
+from basemodels.audio import UploadSessionCreateRequest
+from dbentities import UploadSession
+from dependencies.app_config import get_config
+from dependencies.storage import LocalBackend
+from services.audio_service import AudioService
+from services.upload_session_service import UploadSessionService
+
+CHUNK_SIZE = 1024
+CONTENT = os.urandom(3 * CHUNK_SIZE + 100)
+
+
+@pytest.fixture
+def storage(session, tmp_path, monkeypatch):
+    """Local storage with small chunks, so a few KB make a multi-chunk upload"""
+    storage = LocalBackend(str(tmp_path / 'chunked'), CHUNK_SIZE)
+    monkeypatch.setattr(storage_module, '_storage', storage)
+    return storage
+
+
+def create(user_id: int, filename: str = 'track.wav', content: bytes = CONTENT) -> UploadSession:
+    request = UploadSessionCreateRequest(filename=filename, file_size=len(content), content_type='audio/wav')
+    result = UploadSessionService.create_session(request, user_id)
+    assert result['success'], result['message']
+    return result['session']
+
+
+def append(upload_session: UploadSession, user_id: int, offset: int, data: bytes) -> dict:
+    return UploadSessionService.append_chunk(upload_session.id, user_id, offset, io.BytesIO(data))
+
+
+def test_session_uses_storage_chunk_size(session, storage, users):
+    upload_session = create(users[0].id)
+
+    assert (upload_session.chunk_size, upload_session.offset) == (CHUNK_SIZE, 0)
+
+
+def test_out_of_order_chunk_is_rejected(session, storage, users):
+    upload_session = create(users[0].id)
+
+    result = append(upload_session, users[0].id, CHUNK_SIZE, CONTENT[CHUNK_SIZE:2 * CHUNK_SIZE])
+
+    assert not result['success'] and result['conflict'] and result['offset'] == 0
+    assert list(storage.iter_part_ids()) == []
+
+
+def test_retried_chunk_is_idempotent(session, storage, users):
+    upload_session = create(users[0].id)
+    first = CONTENT[:CHUNK_SIZE]
+
+    assert append(upload_session, users[0].id, 0, first)['offset'] == CHUNK_SIZE
+
+    # The client missed the response and sends the same chunk again: nothing is written twice
+    result = append(upload_session, users[0].id, 0, first)
+    assert result['conflict'] and result['offset'] == CHUNK_SIZE
+
+    assert append(upload_session, users[0].id, CHUNK_SIZE, CONTENT[CHUNK_SIZE:])['offset'] == len(CONTENT)
+    assert UploadSessionService.finalize(upload_session.id, users[0].id)['file'].file_size == len(CONTENT)
+
+
+def test_body_ending_mid_chunk_resumes_at_last_full_chunk(session, storage, users):
+    upload_session = create(users[0].id)
+
+    result = append(upload_session, users[0].id, 0, CONTENT[:CHUNK_SIZE + 300])
+    assert result['success'] and result['offset'] == CHUNK_SIZE
+
+    # The dropped 300 bytes are sent again with the rest; the received data has no gap or overlap
+    assert append(upload_session, users[0].id, CHUNK_SIZE, CONTENT[CHUNK_SIZE:])['offset'] == len(CONTENT)
+    assert storage.stat(upload_session.gridfs_file_id) is None  # Not published before finalize
+
+    audio_file = UploadSessionService.finalize(upload_session.id, users[0].id)['file']
+    assert audio_file.content_hash == hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib'])
+def test_finalize_records_hash_and_size(session, storage, users, codec):
+    get_config()._config['storage'] = {'compression': {'codec': codec}}
+    upload_session = create(users[0].id)
+    session_id, user_id = upload_session.id, users[0].id
+
+    for offset in range(0, len(CONTENT), 2 * CHUNK_SIZE):
+        assert append(upload_session, user_id, offset, CONTENT[offset:offset + 2 * CHUNK_SIZE])['success']
+
+    result = UploadSessionService.finalize(session_id, user_id)
+
+    assert result['success'], result['message']
+    audio_file = result['file']
+    assert audio_file.file_size == len(CONTENT)
+    assert audio_file.content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert audio_file.storage_codec == (None if codec == 'none' else codec)
+
+    content = AudioService.open_stream(audio_file.gridfs_file_id, storage_codec=audio_file.storage_codec)
+    assert b''.join(content) == CONTENT
+    assert UploadSessionService.get_session(session_id, user_id) is None
+
+
+def test_finalize_refuses_incomplete_upload(session, storage, users):
+    upload_session = create(users[0].id)
+    append(upload_session, users[0].id, 0, CONTENT[:CHUNK_SIZE])
+
+    result = UploadSessionService.finalize(upload_session.id, users[0].id)
+
+    assert not result['success'] and 'incomplete' in result['message']
+    assert storage.stat(upload_session.gridfs_file_id) is None
+
+
+def test_sessions_are_private(session, storage, users):
+    upload_session = create(users[0].id)
+
+    assert append(upload_session, users[1].id, 0, CONTENT)['not_found']
+    assert UploadSessionService.finalize(upload_session.id, users[1].id)['not_found']
+
+
+def test_sweep_expired_discards_parts(session, storage, users):
+    expired, active = create(users[0].id), create(users[0].id, 'other.wav')
+    append(expired, users[0].id, 0, CONTENT[:CHUNK_SIZE])
+    append(active, users[0].id, 0, CONTENT[:CHUNK_SIZE])
+    active_id, active_file_id = active.id, active.gridfs_file_id
+
+    expired.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    session.commit()
+
+    assert UploadSessionService.sweep_expired(batch_size=1) == 1
+
+    assert list(storage.iter_part_ids()) == [active_file_id]  # The expired session's data is gone
+    session.expire_all()
+    assert [upload_session.id for upload_session in session.query(UploadSession)] == [active_id]
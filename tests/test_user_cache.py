@@ -0,0 +1,133 @@
+"""
+Tests for the cache of logged-in users (dependencies.user_cache)
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import dependencies.user_cache as user_cache_module
+from basemodels.user import UserUpdateRequest
+from dependencies.metrics import get_metrics
+from dependencies.user_cache import MemoryStore, SharedStore, UserCache
+from services.auth_service import AuthService
+from services.user_service import UserService
+
+VALUES = {
+    'id': 7, 'username': 'alice', 'email': 'alice@example.com', 'role': 'USER', 'full_name': 'Alice',
+    'created_at': datetime(2024, 1, 2, 3, 4, 5, 600000), 'updated_at': datetime(2024, 2, 3, 4, 5, 6)
+}
+
+
+class FailingStore(SharedStore):
+    """Shared store that is down"""
+
+    def get(self, key):
+        raise ConnectionError('store unreachable')
+
+    def set(self, key, value, ttl_seconds):
+        raise ConnectionError('store unreachable')
+
+    def delete(self, key):
+        raise ConnectionError('store unreachable')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() of the cache and the memory store"""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(user_cache_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def shared_errors() -> int:
+    return get_metrics().snapshot()['counters'].get('user_cache.shared_errors', 0)
+
+
+def test_hit_until_ttl_expires(clock):
+    cache = UserCache(max_entries=10, ttl_seconds=30)
+    cache.put(7, VALUES)
+
+    clock.now += 29
+    assert cache.get(7) == VALUES
+
+    clock.now += 2
+    assert cache.get(7) is None
+
+
+def test_lru_bound_evicts_least_recently_used(clock):
+    cache = UserCache(max_entries=2, ttl_seconds=30)
+    cache.put(1, dict(VALUES, id=1))
+    cache.put(2, dict(VALUES, id=2))
+    cache.get(1)  # 2 is now the least recently used
+    cache.put(3, dict(VALUES, id=3))
+
+    assert cache.get(1)['id'] == 1
+    assert cache.get(2) is None
+    assert cache.get(3)['id'] == 3
+
+
+def test_shared_store_serves_other_processes(clock):
+    store = MemoryStore()
+    UserCache(max_entries=10, ttl_seconds=30, shared_store=store).put(7, VALUES)
+
+    other = UserCache(max_entries=10, ttl_seconds=30, shared_store=store, shared_ttl_seconds=60)
+    assert other.get(7) == VALUES  # Datetimes survive the round trip
+
+    clock.now += 61
+    assert UserCache(max_entries=10, ttl_seconds=30, shared_store=store).get(7) is None
+
+
+def test_invalidate_clears_local_and_shared_entries(clock):
+    store = MemoryStore()
+    cache = UserCache(max_entries=10, ttl_seconds=30, shared_store=store)
+    cache.put(7, VALUES)
+
+    cache.invalidate(7)
+
+    assert cache.get(7) is None
+    assert store.get('user:7') is None
+
+
+def test_failing_shared_store_falls_back_to_local_cache(clock):
+    cache = UserCache(max_entries=10, ttl_seconds=30, shared_store=FailingStore())
+    errors = shared_errors()
+
+    cache.put(7, VALUES)
+    assert cache.get(7) == VALUES
+    assert cache.get(8) is None
+    cache.invalidate(7)
+    assert cache.get(7) is None
+
+    assert shared_errors() == errors + 4  # put, the miss on 8, invalidate, the miss on 7
+
+
+@pytest.fixture
+def cache(session, monkeypatch):
+    cache = UserCache(max_entries=10, ttl_seconds=30, shared_store=MemoryStore())
+    monkeypatch.setattr(user_cache_module, '_user_cache', cache)
+    return cache
+
+
+def test_user_update_invalidates_cached_user(users, cache):
+    user_id = users[0].id
+    assert AuthService.load_user(user_id).full_name is None
+    assert cache.get(user_id) is not None
+
+    result = UserService.update_user(user_id, UserUpdateRequest(full_name='Renamed', role='ADMIN'))
+
+    assert result['success']
+    assert cache.get(user_id) is None
+    user = AuthService.load_user(user_id)
+    assert (user.full_name, user.role.value) == ('Renamed', 'ADMIN')
+
+
+def test_user_delete_invalidates_cached_user(users, cache):
+    user_id = users[0].id
+    AuthService.load_user(user_id)
+
+    assert UserService.delete_user(user_id)['success']
+
+    assert cache.get(user_id) is None
+    assert AuthService.load_user(user_id) is None